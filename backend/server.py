@@ -1,27 +1,66 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from gridfs.errors import NoFile
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import tempfile
 import re
 import math
 import zipfile
 import rarfile
 import io
+import json
+import time
+import hashlib
+import base64
+import random
+import threading
+import socket
+import functools
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 # PDF manipulation
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, IndirectObject, NameObject, NumberObject
 
-# Import Emergent LLM integration
-from emergentintegrations.llm.chat import LlmChat, UserMessage, FileContentWithMimeType
+# Traitement des images
+from PIL import Image, ImageSequence
+
+# OCR local (optionnel: nécessite pytesseract et le binaire tesseract)
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Import Emergent LLM integration (facultatif avec LLM_PROVIDER=stub, p. ex. pour les tests de charge)
+try:
+    from emergentintegrations.llm.chat import LlmChat, UserMessage, FileContentWithMimeType
+except ImportError:
+    LlmChat = None
+    
+    class UserMessage:
+        def __init__(self, text: str, file_contents=None):
+            self.text = text
+            self.file_contents = file_contents
+    
+    class FileContentWithMimeType:
+        def __init__(self, file_path: str, mime_type: str):
+            self.file_path = file_path
+            self.mime_type = mime_type
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -50,11 +89,30 @@ api_router = APIRouter(prefix="/api")
 
 # Système d'analyse asynchrone
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 # Dictionnaire pour stocker les tâches d'analyse en cours
 active_analyses = {}
 analysis_executor = ThreadPoolExecutor(max_workers=2)
+# Pool de processus pour le travail CPU sur les images (OCR, recompression), créé au démarrage
+# de l'API ou du worker (executeur_cpu) et non à l'import: les outils qui importent server n'en lancent pas
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', '2'))
+cpu_executor: Optional[ProcessPoolExecutor] = None
+cpu_executor_lock = threading.Lock()
+
+def executeur_cpu() -> ProcessPoolExecutor:
+    global cpu_executor
+    with cpu_executor_lock:
+        if cpu_executor is None:
+            cpu_executor = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+        return cpu_executor
+
+def arreter_executeur_cpu():
+    global cpu_executor
+    with cpu_executor_lock:
+        if cpu_executor is not None:
+            cpu_executor.shutdown(wait=False, cancel_futures=True)
+            cpu_executor = None
 
 # Configure logging
 logging.basicConfig(
@@ -63,6 +121,197 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ===== MÉTRIQUES (FORMAT PROMETHEUS) =====
+# Histogrammes de durée par étape, compteurs et jauges, exposés sur /metrics.
+# Les durées sont inclusives: une étape qui en appelle une autre les compte toutes deux.
+DUREES_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def echapper_label(valeur) -> str:
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrique:
+    type = "untyped"
+    
+    def __init__(self, nom: str, aide: str, labels=()):
+        self.nom = nom
+        self.aide = aide
+        self.labels = tuple(labels)
+        self.valeurs = {}
+        self.lock = threading.Lock()
+    
+    def cle(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+    
+    def etiquettes(self, cle: tuple, extra=()) -> str:
+        paires = list(zip(self.labels, cle)) + list(extra)
+        if not paires:
+            return ""
+        return "{" + ",".join(f'{nom}="{echapper_label(valeur)}"' for nom, valeur in paires) + "}"
+    
+    def echantillons(self, cle: tuple, valeur) -> List[str]:
+        return [f"{self.nom}{self.etiquettes(cle)} {valeur}"]
+    
+    def rendre(self) -> List[str]:
+        with self.lock:
+            valeurs = sorted(self.valeurs.items())
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} {self.type}"]
+        for cle, valeur in valeurs:
+            lignes.extend(self.echantillons(cle, valeur))
+        return lignes
+
+class Compteur(Metrique):
+    type = "counter"
+    
+    def inc(self, montant: float = 1, **labels):
+        cle = self.cle(labels)
+        with self.lock:
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + montant
+
+class Jauge(Metrique):
+    """Jauge; si fonction est fournie, elle est appelée à chaque lecture et retourne {cle: valeur}
+    (les clés absentes disparaissent de l'export)."""
+    type = "gauge"
+    
+    def __init__(self, nom: str, aide: str, labels=(), fonction=None):
+        super().__init__(nom, aide, labels)
+        self.fonction = fonction
+    
+    def inc(self, montant: float = 1, **labels):
+        cle = self.cle(labels)
+        with self.lock:
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + montant
+    
+    def dec(self, montant: float = 1, **labels):
+        self.inc(-montant, **labels)
+    
+    @contextmanager
+    def suivre(self, **labels):
+        """Incrémente la jauge le temps du bloc (ex. analyses en cours)."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+    
+    def rendre(self) -> List[str]:
+        if self.fonction:
+            try:
+                valeurs = self.fonction()
+            except Exception:
+                valeurs = {}
+            with self.lock:
+                self.valeurs = dict(valeurs)
+        return super().rendre()
+
+class Histogramme(Metrique):
+    type = "histogram"
+    
+    def __init__(self, nom: str, aide: str, labels=(), buckets=DUREES_BUCKETS):
+        super().__init__(nom, aide, labels)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, valeur: float, **labels):
+        cle = self.cle(labels)
+        with self.lock:
+            etat = self.valeurs.get(cle)
+            if etat is None:
+                etat = self.valeurs[cle] = [[0] * len(self.buckets), 0.0, 0]
+            for i, borne in enumerate(self.buckets):
+                if valeur <= borne:
+                    etat[0][i] += 1
+            etat[1] += valeur
+            etat[2] += 1
+    
+    @contextmanager
+    def mesurer(self, **labels):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - debut, **labels)
+    
+    def echantillons(self, cle: tuple, etat) -> List[str]:
+        compteurs, somme, total = etat
+        lignes = [
+            f"{self.nom}_bucket{self.etiquettes(cle, [('le', borne)])} {n}"
+            for borne, n in zip(self.buckets, compteurs)
+        ]
+        lignes.append(f"{self.nom}_bucket{self.etiquettes(cle, [('le', '+Inf')])} {total}")
+        lignes.append(f"{self.nom}_sum{self.etiquettes(cle)} {somme}")
+        lignes.append(f"{self.nom}_count{self.etiquettes(cle)} {total}")
+        return lignes
+
+class RegistreMetriques:
+    def __init__(self):
+        self.metriques = []
+    
+    def ajouter(self, metrique: Metrique) -> Metrique:
+        self.metriques.append(metrique)
+        return metrique
+    
+    def rendre(self) -> str:
+        return "\n".join(ligne for metrique in self.metriques for ligne in metrique.rendre()) + "\n"
+
+def profondeur_executeurs() -> dict:
+    """Tâches soumises aux pools et pas encore terminées."""
+    return {
+        ("analysis",): analysis_executor._work_queue.qsize(),
+        ("cpu",): len(getattr(cpu_executor, "_pending_work_items", None) or {}),
+    }
+
+metriques = RegistreMetriques()
+DUREE_ETAPES = metriques.ajouter(Histogramme(
+    "eclaireur_stage_duration_seconds", "Durée des étapes du pipeline d'analyse", ["stage"]))
+DUREE_LLM = metriques.ajouter(Histogramme(
+    "eclaireur_llm_call_duration_seconds",
+    "Appels LLM: attente avant l'appel (wait), temps du modèle (model) et premier morceau reçu (first_chunk)",
+    ["kind", "phase"]))
+APPELS_LLM = metriques.ajouter(Compteur("eclaireur_llm_calls_total", "Appels LLM par issue", ["kind", "outcome"]))
+RETRIES_LLM = metriques.ajouter(Compteur("eclaireur_llm_retries_total", "Nouvelles tentatives d'appel LLM", ["kind"]))
+STREAMING_LLM = metriques.ajouter(Compteur(
+    "eclaireur_llm_stream_total", "Appels LLM en streaming (streamed) ou réponse complète (fallback)",
+    ["provider", "mode", "reason"]))
+JETONS_LLM = metriques.ajouter(Compteur(
+    "eclaireur_llm_input_tokens_total", "Jetons d'entrée texte, servis par le cache du fournisseur (cached) ou non",
+    ["kind", "cache", "source"]))
+SEGMENTS = metriques.ajouter(Compteur("eclaireur_segments_total", "Segments analysés par issue", ["outcome"]))
+REQUETES_CACHE = metriques.ajouter(Compteur(
+    "eclaireur_cache_requests_total", "Lectures des caches (hit/miss)", ["cache", "result"]))
+ECHECS = metriques.ajouter(Compteur("eclaireur_failures_total", "Échecs par étape", ["stage"]))
+JOBS_ACTIFS = metriques.ajouter(Jauge("eclaireur_active_jobs", "Analyses en cours", ["kind"]))
+FILE_EXECUTEURS = metriques.ajouter(Jauge(
+    "eclaireur_executor_queue_depth", "Tâches en attente ou en cours par pool", ["executor"],
+    fonction=profondeur_executeurs))
+ADMISSION = metriques.ajouter(Jauge(
+    "eclaireur_admission_slots", "Analyses admises (active) et en file d'attente (queued)", ["state"],
+    fonction=lambda: {("active",): admission_analyses.actives, ("queued",): len(admission_analyses.file)}))
+ADMISSIONS_REFUSEES = metriques.ajouter(Compteur(
+    "eclaireur_admission_rejected_total", "Analyses refusées (429) faute de place dans la file", ["kind"]))
+SEGMENTS_CLIENTS = metriques.ajouter(Jauge(
+    "eclaireur_tenant_segments", "Segments en file (queued) et en cours (running) par client", ["tenant", "state"],
+    fonction=lambda: ordonnanceur_segments.etat_clients()))
+ATTENTE_SEGMENTS = metriques.ajouter(Histogramme(
+    "eclaireur_segment_wait_seconds", "Attente d'un segment avant son appel LLM, par taille de job", ["job_size"]))
+NETTOYAGE_SUPPRIMES = metriques.ajouter(Compteur(
+    "eclaireur_janitor_removed_total", "Artéfacts orphelins supprimés par le ménage", ["kind"]))
+NETTOYAGE_OCTETS = metriques.ajouter(Compteur(
+    "eclaireur_janitor_reclaimed_bytes_total", "Octets libérés par le ménage", ["kind"]))
+EXTRACTIONS_MEDECINS = metriques.ajouter(Compteur(
+    "eclaireur_medecins_extractions_total", "Rapports traités par la file d'extraction des médecins", ["outcome"]))
+
+def mesurer_etape(stage: str):
+    return DUREE_ETAPES.mesurer(stage=stage)
+
+def chronometre(stage: str):
+    """Décorateur: enregistre la durée de la fonction sous l'étape donnée."""
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            with mesurer_etape(stage):
+                return fonction(*args, **kwargs)
+        return enveloppe
+    return decorateur
+
 # Models
 class AnalysisResult(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -81,8 +330,11 @@ class AnalysisResponse(BaseModel):
     anonymized_for_ai: str  # Version anonymisée pour l'apprentissage IA
     message: str
     segments_analyzed: int = 1
+    duplicate_pages_removed: int = 0  # Pages en double ignorées avant l'analyse
+    image_bytes_saved: int = 0  # Octets économisés par la recompression des images
     destruction_confirmed: bool = True
     report_id: Optional[str] = None  # ID pour récupérer le rapport pendant 15 min
+    structured_data: Optional[dict] = None  # médecins, dates, blessures, contradictions
 
 # Modèle pour l'analyse asynchrone
 class AsyncAnalysisResponse(BaseModel):
@@ -90,6 +342,7 @@ class AsyncAnalysisResponse(BaseModel):
     job_id: str
     message: str
     status_url: str
+    queue_position: Optional[int] = None  # position dans la file d'attente, None si l'analyse démarre
 
 class AnalysisStatusResponse(BaseModel):
     job_id: str
@@ -101,6 +354,10 @@ class AnalysisStatusResponse(BaseModel):
     analysis: Optional[str] = None
     message: str
     report_id: Optional[str] = None
+    duplicate_pages_removed: int = 0
+    image_bytes_saved: int = 0
+    queue_position: Optional[int] = None
+    structured_data: Optional[dict] = None
 
 # Modèles pour les fiches médecins
 class MedecinCreate(BaseModel):
@@ -136,26 +393,155 @@ class ContributionCreate(BaseModel):
     description: str = Field(..., min_length=20, max_length=2000)
     source_reference: Optional[str] = None
 
-# Liste de mots interdits pour la modération
-MOTS_INTERDITS = [
-    "con", "connard", "connasse", "merde", "putain", "salaud", "salope", "enculé",
-    "fuck", "shit", "bitch", "asshole", "bastard",
-    "nègre", "négro", "arabe", "sale", "terroriste", "islamiste",
-    "pédé", "tapette", "gouine", "travelo",
-    "tuer", "mort", "crever", "buter", "assassin", "violence",
-    "frapper", "tabasser", "lyncher",
-    "menace", "revenge", "vengeance", "payer cher",
-]
+# ===== MODÉRATION =====
+# Listes de termes interdits (fichiers texte, séparés par des virgules)
+MODERATION_WORD_LISTS = os.environ.get('MODERATION_WORD_LISTS', str(ROOT_DIR / 'mots_interdits.txt'))
+
+class TablePliage(dict):
+    """Table pour str.translate, remplie à la demande: minuscule sans accent, et tout
+    ce qui n'est ni lettre ni chiffre devient une espace."""
+    
+    def __missing__(self, code: int) -> str:
+        c = chr(code)
+        if not c.isalnum():
+            plie = " "
+        else:
+            base = "".join(b for b in unicodedata.normalize("NFKD", c.lower()) if not unicodedata.combining(b))
+            plie = base[:1] or c.lower()[:1]
+        self[code] = plie
+        return plie
+
+TABLE_PLIAGE = TablePliage()
+
+def plier_texte(texte: str) -> str:
+    """Pliage caractère par caractère: les positions restent celles du texte d'origine."""
+    return texte.translate(TABLE_PLIAGE)
+
+def charger_mots_interdits(chemins: str) -> List[str]:
+    termes = []
+    for chemin in chemins.split(","):
+        chemin = chemin.strip()
+        if not chemin:
+            continue
+        with open(chemin, encoding="utf-8") as f:
+            for ligne in f:
+                ligne = ligne.strip()
+                if ligne and not ligne.startswith("#"):
+                    termes.append(ligne)
+    if not termes:
+        raise RuntimeError(f"Aucun terme de modération chargé depuis {chemins}")
+    return termes
+
+class MoteurModeration:
+    """Automate d'Aho-Corasick sur le texte plié (casse et accents ignorés).
+
+    Un seul passage linéaire sur le texte; une correspondance n'est retenue que si
+    elle commence et se termine sur une frontière de mot (sauf terme suivi de *,
+    qui accepte toutes les terminaisons). Les séparateurs consécutifs comptent
+    pour une seule espace, ce qui permet les expressions de plusieurs mots.
+    """
+    
+    def __init__(self, termes: List[str]):
+        self.transitions = [{}]
+        self.echec = [0]
+        self.sorties = [[]]
+        self.termes = []  # (terme d'origine, longueur pliée, accepte une terminaison)
+        for terme in termes:
+            self._ajouter(terme)
+        self._construire_echecs()
+    
+    def _ajouter(self, terme: str):
+        prefixe = terme.endswith("*")
+        plie = " ".join(plier_texte(terme.rstrip("*")).split())
+        if not plie:
+            return
+        etat = 0
+        for c in plie:
+            suivant = self.transitions[etat].get(c)
+            if suivant is None:
+                suivant = len(self.transitions)
+                self.transitions[etat][c] = suivant
+                self.transitions.append({})
+                self.echec.append(0)
+                self.sorties.append([])
+            etat = suivant
+        self.sorties[etat].append(len(self.termes))
+        self.termes.append((terme.rstrip("*"), len(plie), prefixe))
+    
+    def _construire_echecs(self):
+        # Parcours en largeur: le lien d'échec d'un état pointe vers son plus long suffixe connu
+        file_etats = deque(self.transitions[0].values())
+        while file_etats:
+            etat = file_etats.popleft()
+            for c, suivant in self.transitions[etat].items():
+                file_etats.append(suivant)
+                repli = self.echec[etat]
+                while repli and c not in self.transitions[repli]:
+                    repli = self.echec[repli]
+                cible = self.transitions[repli].get(c, 0)
+                self.echec[suivant] = cible if cible != suivant else 0
+                self.sorties[suivant] = self.sorties[suivant] + self.sorties[self.echec[suivant]]
+    
+    def rechercher(self, texte: str, premier_seulement: bool = False) -> List[dict]:
+        """Retourne les termes trouvés avec leur position dans le texte d'origine ([debut, fin[)."""
+        plie = plier_texte(texte)
+        transitions, echec, sorties = self.transitions, self.echec, self.sorties
+        racine = transitions[0]
+        resultats = []
+        etat = 0
+        precedent = " "
+        for i, c in enumerate(plie):
+            if c == " " and precedent == " ":
+                continue
+            precedent = c
+            while etat and c not in transitions[etat]:
+                etat = echec[etat]
+            etat = transitions[etat].get(c, 0) if etat else racine.get(c, 0)
+            if not sorties[etat]:
+                continue
+            for index in sorties[etat]:
+                terme, longueur, prefixe = self.termes[index]
+                debut = self._debut(plie, i, longueur)
+                if debut > 0 and plie[debut - 1] != " ":
+                    continue
+                fin = i + 1
+                if fin < len(plie) and plie[fin] != " ":
+                    if not prefixe:
+                        continue
+                    # Terme avec terminaison libre: l'extrait couvre le mot entier
+                    while fin < len(plie) and plie[fin] != " ":
+                        fin += 1
+                resultats.append({"terme": terme, "debut": debut, "fin": fin, "extrait": texte[debut:fin]})
+                if premier_seulement:
+                    return resultats
+        return resultats
+    
+    @staticmethod
+    def _debut(plie: str, fin: int, longueur: int) -> int:
+        """Position de départ d'une correspondance de longueur pliée donnée finissant en fin."""
+        debut = fin
+        restant = longueur - 1
+        while restant:
+            debut -= 1
+            if not (plie[debut] == " " and plie[debut - 1] == " "):
+                restant -= 1
+        return debut
+
+MOTS_INTERDITS = charger_mots_interdits(MODERATION_WORD_LISTS)
+moteur_moderation = MoteurModeration(MOTS_INTERDITS)
 
 def moderer_contenu(texte: str) -> tuple[bool, str]:
-    """Vérifie si le contenu contient des termes interdits."""
-    texte_lower = texte.lower()
-    for mot in MOTS_INTERDITS:
-        if mot in texte_lower:
-            return False, f"Contenu inapproprié détecté. Merci de reformuler de manière factuelle et respectueuse."
+    """Vérifie si le contenu contient des termes interdits (mots entiers, casse et accents ignorés)."""
+    correspondances = moteur_moderation.rechercher(texte, premier_seulement=True)
+    if correspondances:
+        # Le terme n'est journalisé que côté serveur: le renvoyer aiderait à contourner la liste
+        trouve = correspondances[0]
+        logger.info(f"Contenu refusé par la modération: terme « {trouve['terme']} », caractère {trouve['debut'] + 1}")
+        return False, "Contenu inapproprié détecté. Merci de reformuler de manière factuelle et respectueuse."
     return True, ""
 
 # ===== DESTRUCTION SÉCURISÉE DOD 5220.22-M =====
+@chronometre("destruction")
 def destruction_securisee(chemin_fichier: str) -> bool:
     """
     Destruction sécurisée du fichier selon les standards DOD 5220.22-M
@@ -185,13 +571,258 @@ def destruction_securisee(chemin_fichier: str) -> bool:
             return True
         return False
     except Exception as e:
+        ECHECS.inc(stage="destruction")
         logger.error(f"Erreur lors de la destruction sécurisée: {str(e)}")
         # En cas d'erreur, tenter une suppression simple
         if os.path.exists(chemin_fichier):
             os.remove(chemin_fichier)
         return False
 
+# ===== STOCKAGE ÉPHÉMÈRE CHIFFRÉ =====
+# Les fichiers d'un job (téléversement, PDF extraits, segments) sont conservés chiffrés avec
+# une clé AES-256-GCM propre au job, gardée en mémoire. Détruire le job revient à oublier sa
+# clé (crypto-effacement): les chiffrés restants sont supprimés sans réécriture.
+# Les bibliothèques qui exigent un chemin (PyPDF2, tesseract, envoi au LLM) travaillent dans
+# un répertoire privé par job, vidé dès la fin de chaque étape.
+BLOB_STORE = os.environ.get('BLOB_STORE', 'volume')  # "volume" (disque local ou tmpfs) ou "gridfs"
+BLOB_VOLUME_DIR = os.environ.get('BLOB_VOLUME_DIR', os.path.join(UPLOAD_DIR, 'eclaireur-blobs'))
+EPHEMERAL_DIR = os.environ.get('EPHEMERAL_DIR', UPLOAD_DIR)  # p. ex. /dev/shm pour garder le clair en mémoire
+
+def est_en_memoire(chemin: str) -> bool:
+    """Vrai si le chemin est sur un tmpfs/ramfs: un simple unlink suffit, rien à réécrire."""
+    try:
+        with open("/proc/mounts") as f:
+            montages = [ligne.split() for ligne in f]
+    except OSError:
+        return False
+    chemin = os.path.realpath(chemin)
+    point, type_fs = "", ""
+    for montage in montages:
+        if len(montage) < 3:
+            continue
+        if (chemin == montage[1] or chemin.startswith(montage[1].rstrip("/") + "/")) and len(montage[1]) >= len(point):
+            point, type_fs = montage[1], montage[2]
+    return type_fs in ("tmpfs", "ramfs")
+
+class ManifesteTemporaires:
+    """Artéfacts temporaires encore utilisés par ce processus: espaces de travail et jobs
+    dont il détient la clé. Le ménage ne touche jamais à ce qui y figure."""
+
+    def __init__(self):
+        self.espaces = {}
+        self.jobs = {}
+
+    def ajouter_espace(self, chemin: str):
+        self.espaces[chemin] = time.time()
+
+    def retirer_espace(self, chemin: str):
+        self.espaces.pop(chemin, None)
+
+    def ajouter_job(self, job_id: str):
+        self.jobs[job_id] = time.time()
+
+    def retirer_job(self, job_id: str):
+        self.jobs.pop(job_id, None)
+
+    def etat(self) -> dict:
+        return {"workspaces": len(self.espaces), "jobs": len(self.jobs)}
+
+manifeste_temporaires = ManifesteTemporaires()
+
+class EspaceTravail:
+    """Répertoire privé (0700, nom aléatoire) pour les fichiers en clair d'une étape d'un job."""
+
+    def __init__(self):
+        os.makedirs(EPHEMERAL_DIR, exist_ok=True)
+        # Le pid dans le nom protège l'espace du ménage lancé par un autre worker tant que ce processus vit
+        self.chemin = tempfile.mkdtemp(prefix=f"eclaireur-{os.getpid()}-", dir=EPHEMERAL_DIR)
+        self.en_memoire = est_en_memoire(self.chemin)
+        manifeste_temporaires.ajouter_espace(self.chemin)
+
+    def fichier(self, ext: str = "") -> str:
+        return os.path.join(self.chemin, f"{uuid.uuid4().hex}{ext}")
+
+    def detruire_fichier(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return True
+        if self.en_memoire:
+            os.remove(path)
+            return True
+        return destruction_securisee(path)
+
+    def vider(self) -> bool:
+        """Détruit les fichiers en clair de l'étape terminée."""
+        succes = True
+        for nom in os.listdir(self.chemin):
+            succes = self.detruire_fichier(os.path.join(self.chemin, nom)) and succes
+        return succes
+
+    def fermer(self) -> bool:
+        if not os.path.isdir(self.chemin):
+            manifeste_temporaires.retirer_espace(self.chemin)
+            return True
+        succes = self.vider()
+        os.rmdir(self.chemin)
+        manifeste_temporaires.retirer_espace(self.chemin)
+        return succes
+
+class StockageVolume:
+    """Blobs chiffrés dans un répertoire (disque local, tmpfs ou volume partagé entre nœuds)."""
+
+    def __init__(self, repertoire: str):
+        self.repertoire = repertoire
+        os.makedirs(repertoire, mode=0o700, exist_ok=True)
+
+    def chemin(self, blob_id: str) -> str:
+        return os.path.join(self.repertoire, f"{blob_id}.bin")
+
+    async def ecrire(self, blob_id: str, data: bytes):
+        # Écriture puis renommage: un autre nœud ne lit jamais un blob incomplet
+        temporaire = self.chemin(blob_id) + ".tmp"
+        with open(temporaire, 'wb') as f:
+            f.write(data)
+        os.replace(temporaire, self.chemin(blob_id))
+
+    async def lire(self, blob_id: str) -> bytes:
+        with open(self.chemin(blob_id), 'rb') as f:
+            return f.read()
+
+    async def supprimer(self, blob_id: str):
+        # Contenu chiffré: la suppression simple suffit, la clé du job est oubliée
+        for chemin in (self.chemin(blob_id), self.chemin(blob_id) + ".tmp"):
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+
+    def _lister(self, avant: float) -> list:
+        blobs = []
+        with os.scandir(self.repertoire) as entrees:
+            for entree in entrees:
+                nom = entree.name.removesuffix(".tmp")
+                if not nom.endswith(".bin") or not entree.is_file():
+                    continue
+                info = entree.stat()
+                if info.st_mtime < avant:
+                    blobs.append((nom.removesuffix(".bin"), info.st_size))
+        return blobs
+
+    async def inventaire(self, avant: float):
+        """Blobs (et écritures interrompues) modifiés avant l'instant donné."""
+        loop = asyncio.get_running_loop()
+        for blob in await loop.run_in_executor(None, self._lister, avant):
+            yield blob
+
+class StockageGridFS:
+    """Blobs chiffrés dans MongoDB GridFS (partagé entre l'API et les workers)."""
+
+    def __init__(self):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="analysis_blobs")
+
+    async def ecrire(self, blob_id: str, data: bytes):
+        await self.bucket.upload_from_stream_with_id(blob_id, blob_id, data)
+
+    async def lire(self, blob_id: str) -> bytes:
+        flux = await self.bucket.open_download_stream(blob_id)
+        return await flux.read()
+
+    async def supprimer(self, blob_id: str):
+        try:
+            await self.bucket.delete(blob_id)
+        except NoFile:
+            pass
+
+    async def inventaire(self, avant: float):
+        limite = datetime.fromtimestamp(avant, timezone.utc)
+        async for fichier in db["analysis_blobs.files"].find({"uploadDate": {"$lt": limite}}, {"length": 1}):
+            yield fichier["_id"], fichier.get("length", 0)
+
+stockage_blobs = None
+
+def obtenir_stockage_blobs():
+    global stockage_blobs
+    if stockage_blobs is None:
+        stockage_blobs = StockageGridFS() if BLOB_STORE == "gridfs" else StockageVolume(BLOB_VOLUME_DIR)
+    return stockage_blobs
+
+class CoffreJob:
+    """Clé propre à un job et blobs chiffrés avec elle.
+
+    L'identifiant du job et du blob servent de données associées: un blob recopié sous un
+    autre identifiant, ou dans un autre job, ne se déchiffre pas. Les identifiants de blob
+    commencent par celui du job, ce qui permet au ménage de retrouver leur propriétaire.
+    """
+
+    def __init__(self, job_id: str, cle: Optional[bytes] = None):
+        self.job_id = job_id
+        self.proprietaire = cle is None
+        if self.proprietaire:
+            # Ce processus crée la clé: il est propriétaire du job jusqu'à detruire()
+            cle = AESGCM.generate_key(bit_length=256)
+            manifeste_temporaires.ajouter_job(job_id)
+        self.cle = cle
+        self.aead = AESGCM(self.cle)
+        self.blobs = set()
+
+    def _donnees_associees(self, blob_id: str) -> bytes:
+        return f"{self.job_id}:{blob_id}".encode()
+
+    def _chiffrer(self, blob_id: str, data: bytes) -> bytes:
+        nonce = os.urandom(12)
+        return nonce + self.aead.encrypt(nonce, data, self._donnees_associees(blob_id))
+
+    def _dechiffrer(self, blob_id: str, data: bytes) -> bytes:
+        return self.aead.decrypt(data[:12], data[12:], self._donnees_associees(blob_id))
+
+    async def put(self, data: bytes) -> str:
+        if self.aead is None:
+            raise RuntimeError(f"Job {self.job_id} détruit")
+        blob_id = f"{self.job_id}.{uuid.uuid4().hex}"
+        loop = asyncio.get_running_loop()
+        chiffre = await loop.run_in_executor(analysis_executor, self._chiffrer, blob_id, data)
+        with mesurer_etape("blob_write"):
+            await obtenir_stockage_blobs().ecrire(blob_id, chiffre)
+        self.blobs.add(blob_id)
+        return blob_id
+
+    async def get(self, blob_id: str) -> bytes:
+        if self.aead is None:
+            raise RuntimeError(f"Job {self.job_id} détruit")
+        with mesurer_etape("blob_read"):
+            chiffre = await obtenir_stockage_blobs().lire(blob_id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(analysis_executor, self._dechiffrer, blob_id, chiffre)
+
+    async def put_file(self, path: str) -> str:
+        with open(path, 'rb') as f:
+            return await self.put(f.read())
+
+    async def get_file(self, blob_id: str, path: str):
+        data = await self.get(blob_id)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    async def supprimer(self, blob_id: str):
+        self.blobs.discard(blob_id)
+        await obtenir_stockage_blobs().supprimer(blob_id)
+
+    async def detruire(self):
+        """Crypto-effacement: la clé est oubliée, puis les chiffrés restants sont supprimés."""
+        if self.aead is None:
+            return
+        self.aead = None
+        self.cle = None
+        manifeste_temporaires.retirer_job(self.job_id)
+        for blob_id in list(self.blobs):
+            try:
+                await self.supprimer(blob_id)
+            except Exception as e:
+                # Illisible sans la clé: le ménage périodique finira le travail
+                logger.warning(f"Blob {blob_id} non supprimé: {str(e)[:100]}")
+        logger.info(f"Job {self.job_id}: clé détruite (crypto-effacement)")
+
 # ===== ANONYMISATION =====
+@chronometre("anonymization")
 def anonymize_for_report(text: str) -> str:
     """
     Anonymise uniquement les données ultra-sensibles pour le rapport téléchargeable.
@@ -216,6 +847,7 @@ def anonymize_for_report(text: str) -> str:
     
     return text
 
+@chronometre("anonymization_ai_learning")
 def anonymize_for_ai_learning(text: str) -> str:
     """
     Anonymisation COMPLÈTE pour l'apprentissage IA.
@@ -244,6 +876,436 @@ def anonymize_for_ai_learning(text: str) -> str:
     
     return text
 
+# ===== COUCHE TEXTE DES PDF =====
+# Les pages dont la couche texte est exploitable sont envoyées au modèle en texte brut;
+# seules les pages numérisées (images) sont envoyées en PDF.
+TEXT_LAYER_FAST_PATH = os.environ.get('TEXT_LAYER_FAST_PATH', 'true').lower() == 'true'
+TEXT_LAYER_MIN_CHARS = int(os.environ.get('TEXT_LAYER_MIN_CHARS', '200'))  # caractères minimum par page
+MAX_TEXT_PAGES_PER_CHUNK = int(os.environ.get('MAX_TEXT_PAGES_PER_CHUNK', '40'))
+
+def extraire_texte_page(page) -> str:
+    """Texte de la couche texte d'une page PDF (vide si absente ou illisible)."""
+    try:
+        return (page.extract_text() or "").strip()
+    except Exception:
+        return ""
+
+def page_a_couche_texte(texte: str) -> bool:
+    return len(texte) >= TEXT_LAYER_MIN_CHARS
+
+# Numéros des pages dans le document d'origine, conservés dans les métadonnées des PDF
+# intermédiaires (dédupliqués, segments) pour que les citations pointent vers les vraies pages
+META_PAGES_ORIGINALES = "/EclaireurPages"
+
+def lire_pages_originales(reader) -> List[int]:
+    try:
+        valeur = (reader.metadata or {}).get(META_PAGES_ORIGINALES)
+        if valeur:
+            pages = [int(n) for n in str(valeur).split(",")]
+            if len(pages) == len(reader.pages):
+                return pages
+    except Exception:
+        pass
+    return list(range(1, len(reader.pages) + 1))
+
+def ecrire_pages_originales(writer, pages: List[int]):
+    if pages != list(range(1, len(pages) + 1)):
+        writer.add_metadata({META_PAGES_ORIGINALES: ",".join(str(n) for n in pages)})
+
+@chronometre("text_layer")
+def lire_couche_texte(pdf_path: str) -> tuple:
+    """Première passe d'un segment: texte de chaque page, images des pages numérisées.
+
+    Retourne (reader, numéros d'origine des pages, texte par page ou None si la page
+    est numérisée, images à passer à l'OCR par index de page numérisée).
+    """
+    reader = PdfReader(pdf_path)
+    pages_originales = lire_pages_originales(reader)
+    textes = []
+    images = {}
+    for index, page in enumerate(reader.pages):
+        texte = extraire_texte_page(page)
+        if page_a_couche_texte(texte):
+            textes.append(texte)
+            continue
+        textes.append(None)
+        if ocr_disponible():
+            images[index] = images_page_pdf(page)
+    return reader, pages_originales, textes, images
+
+def ecrire_pages_numerisees(reader, pages_scannees: List[int], pdf_path: str) -> str:
+    writer = PdfWriter()
+    for index in pages_scannees:
+        writer.add_page(reader.pages[index])
+    scan_path = f"{pdf_path}_scan.pdf"
+    with open(scan_path, 'wb') as scan_file:
+        writer.write(scan_file)
+    return scan_path
+
+async def preparer_contenu_segment(pdf_path: str) -> tuple[str, Optional[str], List[int], int]:
+    """Sépare un segment en pages texte et pages numérisées.
+
+    La lecture du PDF se fait dans analysis_executor; l'OCR des pages numérisées est
+    attendu depuis la boucle (cpu_executor). Retourne (texte des pages texte, PDF des
+    pages numérisées ou None, numéros d'origine des pages numérisées, nombre total de pages).
+    """
+    loop = asyncio.get_running_loop()
+    reader, pages_originales, textes, images = await loop.run_in_executor(
+        analysis_executor, lire_couche_texte, pdf_path
+    )
+    textes_ocr = dict(zip(images, await asyncio.gather(*(ocr_images(liste) for liste in images.values()))))
+    parties = []
+    pages_scannees = []
+    for index, texte in enumerate(textes):
+        if texte is not None:
+            parties.append(f"=== PAGE {pages_originales[index]} ===\n{texte}")
+        elif textes_ocr.get(index):
+            parties.append(f"=== PAGE {pages_originales[index]} (OCR) ===\n{textes_ocr[index]}")
+        else:
+            pages_scannees.append(index)
+    
+    scan_path = None
+    if pages_scannees and len(pages_scannees) == len(textes):
+        scan_path = pdf_path  # Document entièrement numérisé: envoyé tel quel
+    elif pages_scannees:
+        scan_path = await loop.run_in_executor(analysis_executor, ecrire_pages_numerisees, reader, pages_scannees, pdf_path)
+    return "\n\n".join(parties), scan_path, [pages_originales[i] for i in pages_scannees], len(textes)
+
+# ===== OCR LOCAL DES PAGES NUMÉRISÉES =====
+# Les images numérisées (fax TIFF, JPEG, pages scannées des PDF) passent par tesseract dans un
+# pool de processus; si la confiance moyenne est suffisante, seul le texte est envoyé au modèle.
+OCR_ENABLED = os.environ.get('OCR_ENABLED', 'true').lower() == 'true'
+OCR_LANG = os.environ.get('OCR_LANG', 'fra+eng')
+OCR_MIN_CONFIDENCE = float(os.environ.get('OCR_MIN_CONFIDENCE', '80'))  # confiance moyenne tesseract (0-100)
+OCR_CACHE_MAX = 256  # entrées
+OCR_CACHE_TTL = 900  # secondes, comme les rapports temporaires
+
+IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'}
+
+ocr_cache = OrderedDict()  # empreinte de l'image -> (expiration, texte, confiance)
+ocr_cache_lock = threading.Lock()
+_ocr_disponible = None
+
+def ocr_disponible() -> bool:
+    """Vérifie une seule fois que pytesseract et le binaire tesseract sont présents."""
+    global _ocr_disponible
+    if _ocr_disponible is None:
+        _ocr_disponible = False
+        if OCR_ENABLED and pytesseract is not None:
+            try:
+                pytesseract.get_tesseract_version()
+                _ocr_disponible = True
+            except Exception as e:
+                logger.warning(f"OCR local désactivé (tesseract introuvable): {str(e)[:100]}")
+    return _ocr_disponible
+
+def ocr_image_bytes(data: bytes) -> tuple[str, float]:
+    """OCR de toutes les pages d'une image (TIFF multipage inclus). Exécuté dans cpu_executor."""
+    image = Image.open(io.BytesIO(data))
+    pages = []
+    confiances = []
+    for frame in ImageSequence.Iterator(image):
+        donnees = pytesseract.image_to_data(frame.convert("L"), lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+        lignes = OrderedDict()
+        for i, mot in enumerate(donnees["text"]):
+            confiance = float(donnees["conf"][i])
+            if not mot.strip() or confiance < 0:
+                continue
+            confiances.append(confiance)
+            cle = (donnees["block_num"][i], donnees["par_num"][i], donnees["line_num"][i])
+            lignes.setdefault(cle, []).append(mot)
+        pages.append("\n".join(" ".join(mots) for mots in lignes.values()))
+    confiance_moyenne = sum(confiances) / len(confiances) if confiances else 0.0
+    return "\n\n".join(pages), confiance_moyenne
+
+async def ocr_texte_fiable(data: bytes) -> Optional[str]:
+    """Texte OCR d'une image, ou None si l'OCR est indisponible ou pas assez fiable.
+
+    L'OCR tourne dans cpu_executor sans bloquer de thread. Le résultat est mis en
+    cache par empreinte SHA-256 de l'image (en mémoire, OCR_CACHE_TTL).
+    """
+    if not data or not ocr_disponible():
+        return None
+    cle = hashlib.sha256(data).hexdigest()
+    with ocr_cache_lock:
+        entree = ocr_cache.get(cle)
+        if entree and entree[0] > time.monotonic():
+            ocr_cache.move_to_end(cle)
+            texte, confiance = entree[1], entree[2]
+        else:
+            entree = None
+    
+    REQUETES_CACHE.inc(cache="ocr", result="miss" if entree is None else "hit")
+    if entree is None:
+        try:
+            with mesurer_etape("ocr"):
+                texte, confiance = await asyncio.get_running_loop().run_in_executor(
+                    executeur_cpu(), ocr_image_bytes, data
+                )
+        except Exception as e:
+            ECHECS.inc(stage="ocr")
+            logger.warning(f"Erreur OCR: {str(e)[:100]}")
+            return None
+        with ocr_cache_lock:
+            ocr_cache[cle] = (time.monotonic() + OCR_CACHE_TTL, texte, confiance)
+            while len(ocr_cache) > OCR_CACHE_MAX:
+                ocr_cache.popitem(last=False)
+    
+    if confiance >= OCR_MIN_CONFIDENCE and page_a_couche_texte(texte):
+        return texte
+    logger.info(f"OCR insuffisant (confiance {confiance:.0f}), image envoyée au modèle")
+    return None
+
+def images_page_pdf(page) -> Optional[List[bytes]]:
+    """Images intégrées d'une page PDF numérisée, ou None si elles sont illisibles."""
+    try:
+        return [image.data for image in page.images]
+    except Exception:
+        return None
+
+async def ocr_images(images: Optional[List[bytes]]) -> Optional[str]:
+    """OCR des images d'une page numérisée; None si une image est illisible (page envoyée telle quelle)."""
+    if not images:
+        return None
+    textes = await asyncio.gather(*(ocr_texte_fiable(data) for data in images))
+    if any(texte is None for texte in textes):
+        return None
+    return "\n\n".join(textes)
+
+async def ocr_fichier_image(file_path: str) -> Optional[str]:
+    """OCR d'un fichier image téléversé, hors de la boucle d'événements."""
+    if not ocr_disponible():
+        return None
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return await ocr_texte_fiable(data)
+
+# ===== RECOMPRESSION DES IMAGES NUMÉRISÉES =====
+# Les scans couleur à 600 dpi pèsent plusieurs Mo par page: les images intégrées sont
+# ramenées à IMAGE_TARGET_DPI et réencodées en JPEG avant la segmentation.
+IMAGE_RECOMPRESSION = os.environ.get('IMAGE_RECOMPRESSION', 'true').lower() == 'true'
+IMAGE_TARGET_DPI = int(os.environ.get('IMAGE_TARGET_DPI', '150'))
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', '70'))
+IMAGE_GRAYSCALE = os.environ.get('IMAGE_GRAYSCALE', 'false').lower() == 'true'  # perd les annotations en couleur
+# Filtres déjà compacts ou que Pillow ne sait pas relire
+FILTRES_NON_RECOMPRESSES = {"/JBIG2Decode", "/CCITTFaxDecode", "/JPXDecode"}
+
+def recompresser_image(data: bytes, echelle: float, niveaux_de_gris: bool, qualite: int) -> tuple[bytes, int, int, str]:
+    """Réduit et réencode une image en JPEG. Exécuté dans cpu_executor."""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if niveaux_de_gris:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if echelle < 1:
+        taille = (max(1, int(image.width * echelle)), max(1, int(image.height * echelle)))
+        image = image.resize(taille, Image.LANCZOS)
+    sortie = io.BytesIO()
+    image.save(sortie, "JPEG", quality=qualite, optimize=True)
+    return sortie.getvalue(), image.width, image.height, image.mode
+
+@chronometre("recompression")
+def compresser_images_pdf(pdf_path: str) -> tuple[str, int]:
+    """Réduit la résolution des images intégrées d'un PDF.
+
+    Retourne (chemin du PDF recompressé, octets économisés). Le PDF d'origine est
+    retourné tel quel si la recompression ne fait rien gagner.
+    """
+    reader = PdfReader(pdf_path)
+    travaux = []
+    references = {}  # image -> dictionnaires /XObject qui la citent, pour les images partagées entre pages
+    for page in reader.pages:
+        try:
+            xobjects = page["/Resources"]["/XObject"].get_object()
+        except (KeyError, TypeError):
+            continue
+        # Les images pleine page sont au plus grandes que la page: la résolution estimée est un minimum
+        largeur_page = float(page.mediabox.width) / 72
+        hauteur_page = float(page.mediabox.height) / 72
+        candidates = {}
+        for nom in xobjects:
+            xobj = xobjects[nom].get_object()
+            if xobj.get("/Subtype") != "/Image":
+                continue
+            if id(xobj) in references:
+                references[id(xobj)].append((xobjects, nom))
+                continue
+            references[id(xobj)] = [(xobjects, nom)]
+            filtres = xobj.get("/Filter")
+            filtres = list(filtres) if isinstance(filtres, list) else [filtres]
+            if (
+                "/SMask" in xobj or xobj.get("/ImageMask") or xobj.get("/BitsPerComponent", 8) == 1
+                or any(f in FILTRES_NON_RECOMPRESSES for f in filtres)
+            ):
+                continue
+            dpi = max(int(xobj["/Width"]) / largeur_page, int(xobj["/Height"]) / hauteur_page)
+            candidates[nom] = (xobj, min(1.0, IMAGE_TARGET_DPI / dpi) if dpi > 0 else 1.0)
+        if not candidates:
+            continue
+        try:
+            images = {f"/{os.path.splitext(image.name)[0]}": image.data for image in page.images}
+        except Exception:
+            continue
+        for nom, (xobj, echelle) in candidates.items():
+            data = images.get(nom)
+            if data:
+                future = executeur_cpu().submit(recompresser_image, data, echelle, IMAGE_GRAYSCALE, IMAGE_JPEG_QUALITY)
+                travaux.append((xobj, len(data), future))
+    
+    remplacees = 0
+    for xobj, taille, future in travaux:
+        try:
+            jpeg, largeur, hauteur, mode = future.result()
+        except Exception as e:
+            logger.warning(f"Recompression d'image impossible: {str(e)[:100]}")
+            continue
+        if len(jpeg) >= taille:
+            continue
+        image = DecodedStreamObject()
+        for cle, valeur in xobj.items():
+            if cle not in ("/DecodeParms", "/Decode", "/Interpolate", "/Filter", "/Length"):
+                image[NameObject(cle)] = valeur
+        image[NameObject("/Width")] = NumberObject(largeur)
+        image[NameObject("/Height")] = NumberObject(hauteur)
+        image[NameObject("/ColorSpace")] = NameObject("/DeviceGray" if mode == "L" else "/DeviceRGB")
+        image[NameObject("/BitsPerComponent")] = NumberObject(8)
+        image[NameObject("/Filter")] = NameObject("/DCTDecode")
+        image.set_data(jpeg)
+        for xobjects, nom in references[id(xobj)]:
+            reference = xobjects.raw_get(nom)
+            if isinstance(reference, IndirectObject):
+                # Image partagée entre pages: la référence désigne désormais la nouvelle image, écrite une seule fois
+                image.indirect_reference = reference
+                reader.resolved_objects[(reference.generation, reference.idnum)] = image
+            else:
+                xobjects[NameObject(nom)] = image
+        remplacees += 1
+    
+    if remplacees == 0:
+        return pdf_path, 0
+    
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    ecrire_pages_originales(writer, lire_pages_originales(reader))
+    compressed_path = f"{pdf_path}_compressed.pdf"
+    with open(compressed_path, 'wb') as compressed_file:
+        writer.write(compressed_file)
+    
+    economie = os.path.getsize(pdf_path) - os.path.getsize(compressed_path)
+    if economie <= 0:
+        destruction_securisee(compressed_path)
+        return pdf_path, 0
+    logger.info(f"Recompression: {remplacees} image(s), {economie / (1024*1024):.1f} Mo économisés")
+    return compressed_path, economie
+
+# ===== DÉDUPLICATION DES PAGES =====
+# Pages en double (pages de garde de fax, même rapport d'IRM joint à plusieurs lettres, avis types):
+# doublons exacts par empreinte du contenu ou par texte identique aux espaces près (mêmes images).
+# Les quasi-doublons (MinHash sur des bardeaux de mots) ne sont retirés que sur demande: deux versions
+# d'un rapport qui diffèrent d'une date ou d'un pourcentage d'atteinte sont toutes deux des preuves.
+PAGE_DEDUP = os.environ.get('PAGE_DEDUP', 'true').lower() == 'true'
+NEAR_DUPLICATE_DEDUP = os.environ.get('NEAR_DUPLICATE_DEDUP', 'false').lower() == 'true'
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', '0.9'))  # similarité de Jaccard estimée
+SHINGLE_SIZE = 5  # mots par bardeau
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+_MINHASH_PRIME = (1 << 61) - 1
+_minhash_rng = random.Random(5220)
+MINHASH_PARAMS = [
+    (_minhash_rng.randrange(1, _MINHASH_PRIME), _minhash_rng.randrange(0, _MINHASH_PRIME))
+    for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+def empreinte_page(page, texte: Optional[str] = None) -> str:
+    """Empreinte exacte d'une page: flux de contenu (ou texte aux espaces près) et données des images/XObjects référencés."""
+    h = hashlib.sha256()
+    if texte is not None:
+        h.update(b"texte:" + " ".join(texte.split()).encode("utf-8"))
+    else:
+        contenu = page.get_contents()
+        if contenu is not None:
+            h.update(contenu.get_data())
+    try:
+        xobjects = page["/Resources"]["/XObject"]
+        for nom in sorted(xobjects):
+            h.update(str(nom).encode())
+            h.update(xobjects[nom].get_object().get_data())
+    except (KeyError, TypeError):
+        pass
+    return h.hexdigest()
+
+def signature_minhash(texte: str) -> Optional[tuple]:
+    mots = re.findall(r"\w+", texte.lower())
+    if len(mots) < SHINGLE_SIZE:
+        return None
+    bardeaux = {
+        int.from_bytes(hashlib.blake2b(" ".join(mots[i:i + SHINGLE_SIZE]).encode(), digest_size=8).digest(), "big")
+        for i in range(len(mots) - SHINGLE_SIZE + 1)
+    }
+    return tuple(min((a * b_ + b) % _MINHASH_PRIME for b_ in bardeaux) for a, b in MINHASH_PARAMS)
+
+def similarite_minhash(sig_a: tuple, sig_b: tuple) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+@chronometre("dedup")
+def dedupliquer_pdf(pdf_path: str) -> tuple[str, int]:
+    """Retire les pages en double d'un PDF (et les quasi-doublons si NEAR_DUPLICATE_DEDUP).
+
+    Retourne (chemin du PDF dédupliqué, nombre de pages retirées). Le PDF d'origine
+    est retourné tel quel s'il n'y a aucun doublon; sinon le nouveau PDF garde les
+    numéros de pages d'origine dans ses métadonnées.
+    """
+    reader = PdfReader(pdf_path)
+    pages_originales = lire_pages_originales(reader)
+    empreintes = set()
+    buckets = {}
+    signatures = []
+    gardees = []
+    
+    for index, page in enumerate(reader.pages):
+        empreinte = empreinte_page(page)
+        if empreinte in empreintes:
+            continue
+        texte = extraire_texte_page(page)
+        if not page_a_couche_texte(texte):
+            empreintes.add(empreinte)
+            gardees.append(index)
+            continue
+        # Même texte et mêmes images, contenu encodé différemment (réimpression, autre logiciel)
+        empreinte_texte = empreinte_page(page, texte)
+        if empreinte_texte in empreintes:
+            continue
+        empreintes.add(empreinte_texte)
+        signature = signature_minhash(texte) if NEAR_DUPLICATE_DEDUP else None
+        if signature is not None:
+            # LSH: seules les pages partageant une bande sont comparées
+            cles = [(b, signature[b * MINHASH_ROWS:(b + 1) * MINHASH_ROWS]) for b in range(MINHASH_BANDS)]
+            candidats = {c for cle in cles for c in buckets.get(cle, ())}
+            if any(similarite_minhash(signature, signatures[c]) >= NEAR_DUPLICATE_THRESHOLD for c in candidats):
+                continue
+            for cle in cles:
+                buckets.setdefault(cle, []).append(len(signatures))
+            signatures.append(signature)
+        empreintes.add(empreinte)
+        gardees.append(index)
+    
+    retirees = len(reader.pages) - len(gardees)
+    if retirees == 0:
+        return pdf_path, 0
+    
+    writer = PdfWriter()
+    for index in gardees:
+        writer.add_page(reader.pages[index])
+    ecrire_pages_originales(writer, [pages_originales[i] for i in gardees])
+    dedup_path = f"{pdf_path}_dedup.pdf"
+    with open(dedup_path, 'wb') as dedup_file:
+        writer.write(dedup_file)
+    logger.info(f"Déduplication: {retirees} page(s) en double retirée(s) sur {len(reader.pages)}")
+    return dedup_path, retirees
+
+@chronometre("split")
 def split_pdf_into_chunks(pdf_path: str, max_size_bytes: int = MAX_CHUNK_SIZE) -> List[str]:
     """Divise un PDF volumineux en plusieurs fichiers plus petits pour éviter les timeouts Gemini."""
     chunk_paths = []
@@ -258,22 +1320,46 @@ def split_pdf_into_chunks(pdf_path: str, max_size_bytes: int = MAX_CHUNK_SIZE) -
         file_size = os.path.getsize(pdf_path)
         avg_page_size = file_size / total_pages
         
-        # Calculer pages par chunk basé sur la taille
-        pages_per_chunk = max(1, int(max_size_bytes / avg_page_size))
-        # Limiter strictement à MAX_PAGES_PER_CHUNK pour éviter timeouts Gemini
-        pages_per_chunk = min(pages_per_chunk, MAX_PAGES_PER_CHUNK)
+        if TEXT_LAYER_FAST_PATH:
+            # Une page texte ne pèse que son texte: les segments peuvent contenir bien plus de pages
+            bornes = []
+            start_page, taille, scans = 0, 0, 0
+            for page_num, page in enumerate(reader.pages):
+                texte = extraire_texte_page(page)
+                scannee = not page_a_couche_texte(texte)
+                poids = avg_page_size if scannee else len(texte.encode("utf-8"))
+                nb_pages = page_num - start_page
+                if nb_pages > 0 and (
+                    taille + poids > max_size_bytes
+                    or scans + scannee > MAX_PAGES_PER_CHUNK
+                    or nb_pages >= MAX_TEXT_PAGES_PER_CHUNK
+                ):
+                    bornes.append((start_page, page_num))
+                    start_page, taille, scans = page_num, 0, 0
+                taille += poids
+                scans += scannee
+            bornes.append((start_page, total_pages))
+        else:
+            # Calculer pages par chunk basé sur la taille
+            pages_per_chunk = max(1, int(max_size_bytes / avg_page_size))
+            # Limiter strictement à MAX_PAGES_PER_CHUNK pour éviter timeouts Gemini
+            pages_per_chunk = min(pages_per_chunk, MAX_PAGES_PER_CHUNK)
+            bornes = [
+                (start, min(start + pages_per_chunk, total_pages))
+                for start in range(0, total_pages, pages_per_chunk)
+            ]
         
-        num_chunks = math.ceil(total_pages / pages_per_chunk)
+        num_chunks = len(bornes)
         
-        logger.info(f"PDF de {total_pages} pages ({file_size/(1024*1024):.1f} Mo), divisé en {num_chunks} segments de ~{pages_per_chunk} pages")
+        logger.info(f"PDF de {total_pages} pages ({file_size/(1024*1024):.1f} Mo), divisé en {num_chunks} segments de ~{math.ceil(total_pages / num_chunks)} pages")
         
-        for i in range(num_chunks):
+        pages_originales = lire_pages_originales(reader)
+        for i, (start_page, end_page) in enumerate(bornes):
             writer = PdfWriter()
-            start_page = i * pages_per_chunk
-            end_page = min((i + 1) * pages_per_chunk, total_pages)
             
             for page_num in range(start_page, end_page):
                 writer.add_page(reader.pages[page_num])
+            ecrire_pages_originales(writer, pages_originales[start_page:end_page])
             
             chunk_path = f"{pdf_path}_segment_{i+1}.pdf"
             with open(chunk_path, 'wb') as chunk_file:
@@ -288,9 +1374,55 @@ def split_pdf_into_chunks(pdf_path: str, max_size_bytes: int = MAX_CHUNK_SIZE) -
         logger.error(f"Erreur lors de la segmentation du PDF: {str(e)}")
         return [pdf_path]
 
+def preparer_pdf_pour_analyse(pdf_path: str) -> tuple[List[str], int, int]:
+    """Déduplique les pages, recompresse les images puis segmente un PDF.
+
+    Retourne (segments à analyser, pages en double retirées, octets économisés par
+    la recompression). Les fichiers intermédiaires qui ne sont pas des segments sont
+    détruits ici.
+    """
+    intermediaires = []
+    source = pdf_path
+    pages_retirees = 0
+    octets_economises = 0
+    
+    if PAGE_DEDUP:
+        try:
+            nouveau, pages_retirees = dedupliquer_pdf(source)
+            if nouveau != source:
+                intermediaires.append(nouveau)
+                source = nouveau
+        except Exception as e:
+            logger.warning(f"Déduplication impossible, PDF analysé tel quel: {str(e)[:100]}")
+    
+    if IMAGE_RECOMPRESSION:
+        try:
+            nouveau, octets_economises = compresser_images_pdf(source)
+            if nouveau != source:
+                intermediaires.append(nouveau)
+                source = nouveau
+        except Exception as e:
+            logger.warning(f"Recompression des images impossible: {str(e)[:100]}")
+    
+    if os.path.getsize(source) <= MAX_CHUNK_SIZE:
+        chunks = [source]
+    else:
+        chunks = split_pdf_into_chunks(source, MAX_CHUNK_SIZE)
+    for path in intermediaires:
+        if path not in chunks and os.path.exists(path):
+            destruction_securisee(path)
+    return chunks, pages_retirees, octets_economises
+
+async def segmenter_pdf(pdf_path: str) -> tuple[List[str], int, int]:
+    """Version asynchrone de preparer_pdf_pour_analyse (exécutée hors de la boucle d'événements)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analysis_executor, preparer_pdf_pour_analyse, pdf_path)
+
 # ===== SYSTEM MESSAGE ENRICHI =====
 SYSTEM_MESSAGE_ANALYSE = """Tu es un expert en analyse de documents de la CNESST et du TAT pour les travailleurs québécois accidentés.
 
+Les informations propres à chaque analyse (segment, date, contenu du document) se trouvent à la fin de la demande.
+
 ## RÈGLES D'ANONYMISATION (RAPPORT FINAL)
 Tu dois MASQUER uniquement:
 - **NAS**: Remplacer par `[NAS masqué]`
@@ -331,6 +1463,16 @@ Exemples:
 - **Réclamation initiale CNESST**: 6 mois après l'accident
 - **Récidive, rechute ou aggravation**: Aucun délai (mais agir rapidement)
 
+## DONNÉES STRUCTURÉES (APRÈS LE RAPPORT)
+Après la dernière ligne du rapport, écrire la ligne <!-- DONNEES_STRUCTUREES --> puis UN SEUL objet JSON valide
+(sans texte autour, sans ```), qui reprend ce que le rapport contient:
+{"medecins": [{"nom": "NOM_MAJUSCULES", "prenom": "Prénom", "specialite": "spécialité ou null",
+  "mandataire": "employeur|employe|CNESST|TAT|BEM|inconnu", "conclusion_favorable_a": "employeur|employe|neutre"}],
+ "dates": [{"date": "JJ/MM/AAAA", "evenement": "...", "page": 12}],
+ "blessures": [{"blessure": "...", "siege": "...", "page": 12}],
+ "contradictions": [{"expert": "Dr Nom", "affirmation": "...", "preuve": "...", "page": 12}]}
+Listes vides si rien n'est trouvé. Ne jamais inclure de NAS, numéro RAMQ, adresse ou téléphone.
+
 ## FORMAT DU RAPPORT
 
 # 📋 RAPPORT D'ANALYSE DÉFENSE - L'ÉCLAIREUR
@@ -412,36 +1554,12 @@ Pour chaque incohérence:
 
 ---
 *Rapport généré par L'Éclaireur - Propulsé par E1 (Emergent) et Google Gemini*
-*Date d'analyse: {date_analyse}*
+*Date d'analyse: [date indiquée à la fin de la demande]*
 """
 
-async def analyze_pdf_segment(pdf_path: str, segment_num: int, total_segments: int, max_retries: int = 3) -> str:
-    """Analyse un segment de PDF avec Gemini avec retry automatique optimisé."""
-    import asyncio
-    
-    date_analyse = datetime.now(timezone.utc).strftime("%d/%m/%Y à %H:%M UTC")
-    
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Analyse segment {segment_num}/{total_segments} - tentative {attempt+1}/{max_retries}")
-            
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"analysis-{uuid.uuid4()}",
-                system_message=SYSTEM_MESSAGE_ANALYSE.replace("{date_analyse}", date_analyse)
-            ).with_model("gemini", "gemini-2.5-flash")
-            
-            pdf_file = FileContentWithMimeType(
-                file_path=pdf_path,
-                mime_type="application/pdf"
-            )
-            
-            segment_info = ""
-            if total_segments > 1:
-                segment_info = f"\n\n[SEGMENT {segment_num}/{total_segments}]"
-            
-            user_message = UserMessage(
-                text=f"""Analyse ce document{segment_info} et produis un RAPPORT COMPLET DE DÉFENSE.
+# Début fixe de la demande d'analyse: avec le message système, il forme le préfixe commun
+# à tous les segments; les parties variables sont ajoutées après (suffixe_demande_analyse).
+DEMANDE_ANALYSE = """Analyse ce document et produis un RAPPORT COMPLET DE DÉFENSE.
 
 RAPPELS CRITIQUES:
 1. EXPLIQUE CHAQUE TERME MÉDICAL/TECHNIQUE entre parenthèses (ex: "sténose (rétrécissement)")
@@ -458,145 +1576,922 @@ ANONYMISATION - MASQUER uniquement:
 
 GARDER EN CLAIR: noms, téléphones, adresses (rapport destiné au TAT/avocats)
 
-Le travailleur compte sur toi pour l'aider à comprendre son dossier et se défendre.""",
-                file_contents=[pdf_file]
-            )
-            
-            response = await chat.send_message(user_message)
-            return response if response else f"[Segment {segment_num} - Réponse vide]"
-            
-        except Exception as e:
-            error_str = str(e)
-            logger.error(f"Erreur segment {segment_num}: {error_str[:200]}")
-            if "502" in error_str or "503" in error_str or "timeout" in error_str.lower() or "500" in error_str:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 5  # 5s, 10s, 15s - délais réduits
-                    logger.warning(f"Erreur temporaire segment {segment_num}, retry {attempt+2}/{max_retries} dans {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-                    continue
-            # Au lieu de lever une exception, retourner un message d'erreur
-            return f"[Segment {segment_num} - Erreur lors de l'analyse: serveurs temporairement indisponibles. Ce segment pourra être réanalysé ultérieurement.]"
+Le travailleur compte sur toi pour l'aider à comprendre son dossier et se défendre."""
+
+# Les tableaux des segments sont fusionnés ensuite (synthese_segments)
+CONSIGNE_FUSION = """
+
+FUSION: ce segment sera fusionné avec les autres en un seul rapport.
+Garde EXACTEMENT les titres de sections et les colonnes des tableaux du format, sois concis,
+et ne répète pas l'avertissement légal ni les ressources."""
+
+def suffixe_demande_analyse(segment_num: int, total_segments: int, date_analyse: str,
+                            texte_pages: str, pages_scannees: List[int]) -> str:
+    """Partie variable de la demande, toujours placée après le préfixe commun."""
+    suffixe = CONSIGNE_FUSION if total_segments > 1 else ""
+    suffixe += f"\n\nDate d'analyse (pied du rapport): {date_analyse}"
+    if total_segments > 1:
+        suffixe += f"\n\n[SEGMENT {segment_num}/{total_segments}]"
+    if texte_pages:
+        suffixe += f"""
+
+CONTENU DU DOCUMENT (couche texte du PDF, page par page):
+{texte_pages}"""
+    if pages_scannees and (texte_pages or pages_scannees != list(range(1, len(pages_scannees) + 1))):
+        suffixe += f"""
+
+Le PDF joint contient, dans cet ordre, les pages {', '.join(str(n) for n in pages_scannees)} du dossier d'origine.
+Cite ces numéros de pages d'origine."""
+    return suffixe
+
+
+# ===== FOURNISSEURS LLM =====
+# LLM_PROVIDER=emergent (Gemini via Emergent, par défaut) ou stub (rapports synthétiques locaux,
+# sans réseau ni jetons, pour les tests de charge et la planification de capacité)
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'emergent').lower()
+LLM_MODEL_PROVIDER = os.environ.get('LLM_MODEL_PROVIDER', 'gemini')
+LLM_MODEL_NAME = os.environ.get('LLM_MODEL_NAME', 'gemini-2.5-flash')
+LLM_STUB_LATENCY = float(os.environ.get('LLM_STUB_LATENCY', '2.0'))  # secondes par appel
+LLM_STUB_LATENCY_JITTER = float(os.environ.get('LLM_STUB_LATENCY_JITTER', '0.25'))  # ± fraction
+LLM_STUB_ERROR_RATE = float(os.environ.get('LLM_STUB_ERROR_RATE', '0'))  # probabilité d'erreur 503
+LLM_STUB_OUTPUT_CHARS = int(os.environ.get('LLM_STUB_OUTPUT_CHARS', '6000'))
+LLM_STUB_SEED = int(os.environ.get('LLM_STUB_SEED', '42'))
+# Cache de préfixe: Gemini 2.5 réutilise automatiquement un début de prompt identique octet pour
+# octet (cache implicite), à partir d'une taille minimale et pendant quelques minutes.
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get('PROMPT_CACHE_MIN_TOKENS', '1024'))
+PROMPT_CACHE_TTL = int(os.environ.get('PROMPT_CACHE_TTL', '300'))  # secondes
+
+class CachePrefixes:
+    """Préfixes de prompt envoyés récemment (empreinte -> dernier envoi)."""
+
+    def __init__(self, ttl: float = PROMPT_CACHE_TTL):
+        self.ttl = ttl
+        self.vus = {}
+        self.lock = threading.Lock()
+
+    def consulter(self, prefixe: str) -> bool:
+        """Vrai si le préfixe a été envoyé il y a moins de ttl secondes; l'envoi courant est noté."""
+        empreinte = hashlib.sha256(prefixe.encode("utf-8")).digest()
+        maintenant = time.monotonic()
+        with self.lock:
+            precedent = self.vus.get(empreinte)
+            self.vus[empreinte] = maintenant
+            if len(self.vus) > 1000:
+                self.vus = {cle: vu for cle, vu in self.vus.items() if maintenant - vu < self.ttl}
+        return precedent is not None and maintenant - precedent < self.ttl
+
+cache_prefixes = CachePrefixes()
+
+def estimer_jetons(texte: str) -> int:
+    return (len(texte) + 3) // 4  # environ 4 caractères par jeton en français
+
+class LLMProvider:
+    """Interface des fournisseurs LLM.
+
+    create_chat retourne une conversation exposant send_message(UserMessage) -> str
+    et, si le fournisseur le permet, stream_message(UserMessage) (générateur asynchrone).
+    Après un appel, la conversation peut exposer usage = {"input_tokens", "cached_tokens"};
+    sinon les jetons sont estimés (compter_jetons_entree).
+    """
+    name = "base"
     
-    # Si toutes les tentatives échouent, retourner un message au lieu de lever une exception
-    return f"[Segment {segment_num} - Échec après {max_retries} tentatives. Les serveurs sont très sollicités.]"
+    def create_chat(self, session_id: str, system_message: str):
+        raise NotImplementedError
 
-async def extract_and_update_medecins(analysis_text: str, source_filename: str):
-    """Extrait automatiquement les médecins de l'analyse et met à jour la base de données."""
-    try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"extract-medecins-{uuid.uuid4()}",
-            system_message="""Tu es un extracteur de données. Analyse le texte et extrais les informations sur les médecins.
-Réponds UNIQUEMENT en JSON valide. Si aucun médecin trouvé, retourne {"medecins": []}"""
-        ).with_model("gemini", "gemini-2.5-flash")
+class EmergentProvider(LLMProvider):
+    """Modèle distant via l'intégration Emergent (Gemini par défaut)."""
+    name = "emergent"
+    
+    def __init__(self, api_key: Optional[str], model_provider: str, model_name: str):
+        self.api_key = api_key
+        self.model_provider = model_provider
+        self.model_name = model_name
+    
+    def create_chat(self, session_id: str, system_message: str):
+        if LlmChat is None:
+            raise RuntimeError("emergentintegrations n'est pas installé (utiliser LLM_PROVIDER=stub)")
+        return LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(self.model_provider, self.model_name)
+
+class StubChat:
+    """Conversation du fournisseur local: latence et erreurs simulées, contenu déterministe."""
+    
+    def __init__(self, provider: "StubProvider", system_message: str):
+        self.provider = provider
+        self.system_message = system_message
+        self.usage = None
+    
+    async def _preparer(self, user_message) -> str:
+        await asyncio.sleep(self.provider.tirer_latence())
+        if self.provider.tirer_erreur():
+            raise Exception("503 Service Unavailable (stub)")
+        self.usage = self.provider.usage(self.system_message + user_message.text)
+        return self.provider.generer_reponse(self.system_message, user_message)
+    
+    async def send_message(self, user_message) -> str:
+        return await self._preparer(user_message)
+    
+    async def stream_message(self, user_message):
+        reponse = await self._preparer(user_message)
+        for debut in range(0, len(reponse), 400):
+            await asyncio.sleep(0)
+            yield reponse[debut:debut + 400]
+
+class StubProvider(LLMProvider):
+    """Rapports synthétiques au format du prompt d'analyse, sans appel réseau.
+
+    Le contenu ne dépend que du message (texte et fichiers joints) et de la graine;
+    la latence et les erreurs suivent une séquence pseudo-aléatoire reproductible.
+    """
+    name = "stub"
+    MEDECINS = [
+        ("TREMBLAY", "Louise", "orthopédiste", "employeur", "employeur"),
+        ("GAGNON", "Marc", "physiatre", "employe", "employe"),
+        ("ROY", "Sophie", "neurologue", "BEM", "neutre"),
+        ("CÔTÉ", "Pierre", "omnipraticien", "employe", "employe"),
+        ("BOUCHARD", "Julie", "radiologiste", "CNESST", "neutre"),
+    ]
+    
+    def __init__(self, latency: float, jitter: float, error_rate: float, output_chars: int, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.output_chars = output_chars
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.dernier_prompt = ("", 0.0)
+    
+    def create_chat(self, session_id: str, system_message: str):
+        return StubChat(self, system_message)
+    
+    def usage(self, prompt: str) -> dict:
+        """Cache implicite simulé: début commun avec le prompt précédent, s'il est récent et assez long."""
+        precedent, envoye = self.dernier_prompt
+        self.dernier_prompt = (prompt, time.monotonic())
+        commun = len(os.path.commonprefix([precedent, prompt])) if time.monotonic() - envoye < PROMPT_CACHE_TTL else 0
+        en_cache = estimer_jetons(prompt[:commun])
+        return {"input_tokens": estimer_jetons(prompt),
+                "cached_tokens": en_cache if en_cache >= PROMPT_CACHE_MIN_TOKENS else 0}
+    
+    def tirer_latence(self) -> float:
+        return max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+    
+    def tirer_erreur(self) -> bool:
+        return self.rng.random() < self.error_rate
+    
+    def generer_reponse(self, system_message: str, user_message) -> str:
+        empreinte = hashlib.sha256(f"{self.seed}|{user_message.text}".encode("utf-8"))
+        for fichier in user_message.file_contents or []:
+            empreinte.update(fichier.file_path.encode("utf-8"))
+            if os.path.exists(fichier.file_path):
+                empreinte.update(str(os.path.getsize(fichier.file_path)).encode("utf-8"))
+        rng = random.Random(empreinte.hexdigest())
+        medecins = rng.sample(self.MEDECINS, rng.randint(2, 4))
         
-        extract_message = UserMessage(
-            text=f"""Analyse ce texte et extrait les médecins mentionnés.
-
-TEXTE:
-{analysis_text[:15000]}
-
-Retourne ce JSON:
-{{
-  "medecins": [
-    {{
-      "nom": "NOM_MAJUSCULES",
-      "prenom": "Prénom",
-      "specialite": "spécialité ou null",
-      "mandataire": "employeur" ou "employe" ou "CNESST" ou "TAT" ou "BEM" ou "inconnu",
-      "conclusion_favorable_a": "employeur" ou "employe" ou "neutre"
-    }}
-  ]
-}}"""
-        )
-        
-        response = await chat.send_message(extract_message)
-        
-        import json
-        json_str = response.strip()
-        if json_str.startswith("```json"):
-            json_str = json_str[7:]
-        if json_str.startswith("```"):
-            json_str = json_str[3:]
-        if json_str.endswith("```"):
-            json_str = json_str[:-3]
+        return self.rapport_synthetique(rng, medecins)
+    
+    def rapport_synthetique(self, rng: random.Random, medecins: list) -> str:
+        def date() -> str:
+            return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2019, 2024)}"
         
+        tete = [
+            "# 📋 RAPPORT D'ANALYSE DÉFENSE - L'ÉCLAIREUR", "",
+            TITRES_SECTIONS["resume"],
+            "Rapport synthétique (fournisseur stub): lésion lombaire (bas du dos) suite à un effort au travail.", "",
+            TITRES_SECTIONS["chronologie"],
+            "| Date | Événement | Document/Page | Importance |",
+            "|------|-----------|---------------|------------|",
+        ]
+        suite = [
+            "", TITRES_SECTIONS["preuves"],
+            "| Date | Type d'examen | Résultats | Page du dossier |",
+            "|------|---------------|-----------|-----------------|",
+            f"| {date()} | IRM lombaire | hernie discale (disque déplacé) L4-L5 | p.{rng.randint(1, 40)} |",
+            "", TITRES_SECTIONS["medecins"],
+            "| Médecin | Spécialité/Qualifications | Mandaté par | Conclusion | Cohérence avec imagerie |",
+            "|---------|---------------------------|-------------|------------|------------------------|",
+        ]
+        for nom, prenom, specialite, mandataire, favorable in medecins:
+            suite.append(f"| Dr {prenom} {nom} | {specialite} | {mandataire} | favorable: {favorable} | à vérifier |")
+        nom, prenom = medecins[0][0], medecins[0][1]
+        suite += [
+            "", TITRES_SECTIONS["contradictions"], "",
+            "| # | Expert | Ce qu'il affirme | Preuve objective contradictoire | Page | Impact |",
+            "|---|--------|------------------|--------------------------------|------|--------|",
+            f"| 1 | Dr {prenom} {nom} | Aucune lésion | IRM du {date()} | p.{rng.randint(1, 40)} | ❌ Minimisation |",
+        ]
+        # Chronologie remplie jusqu'à la taille de sortie visée
+        chronologie = []
+        taille = sum(len(ligne) + 1 for ligne in tete + suite)
+        while taille < self.output_chars:
+            ligne = f"| {date()} | Consultation de suivi n°{rng.randint(1, 999)} | p.{rng.randint(1, 400)} | Moyenne |"
+            chronologie.append(ligne)
+            taille += len(ligne) + 1
+        lignes = tete + chronologie + suite
+        # Données structurées après le rapport, comme le demande le prompt d'analyse
+        donnees = {
+            "medecins": [
+                {"nom": nom, "prenom": prenom, "specialite": specialite,
+                 "mandataire": mandataire, "conclusion_favorable_a": favorable}
+                for nom, prenom, specialite, mandataire, favorable in medecins
+            ],
+            "dates": [{"date": date(), "evenement": "IRM lombaire", "page": rng.randint(1, 40)}],
+            "blessures": [{"blessure": "hernie discale L4-L5", "siege": "lombaire", "page": rng.randint(1, 40)}],
+            "contradictions": [{"expert": f"Dr {prenom} {nom}", "affirmation": "Aucune lésion",
+                                "preuve": "IRM lombaire", "page": rng.randint(1, 40)}],
+        }
+        lignes += ["", MARQUEUR_DONNEES, json.dumps(donnees, ensure_ascii=False)]
+        return "\n".join(lignes)
+
+def charger_fournisseur_llm() -> LLMProvider:
+    if LLM_PROVIDER == "stub":
+        logger.warning(
+            f"Fournisseur LLM stub actif: latence {LLM_STUB_LATENCY}s, erreurs {LLM_STUB_ERROR_RATE:.0%}, "
+            f"{LLM_STUB_OUTPUT_CHARS} caractères - aucun rapport réel ne sera produit"
+        )
+        return StubProvider(LLM_STUB_LATENCY, LLM_STUB_LATENCY_JITTER, LLM_STUB_ERROR_RATE,
+                            LLM_STUB_OUTPUT_CHARS, LLM_STUB_SEED)
+    return EmergentProvider(EMERGENT_LLM_KEY, LLM_MODEL_PROVIDER, LLM_MODEL_NAME)
+
+llm_provider = charger_fournisseur_llm()
+
+# Streaming de la réponse du modèle (désactivable si l'intégration ne le supporte pas bien).
+# Le fournisseur stub streame toujours. L'intégration Emergent épinglée (emergentintegrations==0.1.0)
+# n'expose que send_message: sans stream_message, la réponse arrive en un seul morceau, ce qui est
+# journalisé une fois et compté dans eclaireur_llm_stream_total{mode="fallback"}.
+LLM_STREAMING = os.environ.get('LLM_STREAMING', 'true').lower() == 'true'
+# Délai max d'un appel d'analyse (0 = aucun). Un segment qui dépasse ce délai, ou que le
+# fournisseur refuse pour sa taille, est coupé en deux par pages, jusqu'à SEGMENT_SPLIT_MAX_DEPTH fois;
+# chaque moitié a la moitié du délai et une tentative de moins que son parent.
+SEGMENT_CALL_TIMEOUT = float(os.environ.get('SEGMENT_CALL_TIMEOUT', '600'))  # secondes
+SEGMENT_SPLIT_MAX_DEPTH = int(os.environ.get('SEGMENT_SPLIT_MAX_DEPTH', '3'))
+# Messages de dépassement de taille (Gemini, OpenAI, passerelles); les quotas (429) n'en font pas partie
+ERREURS_TROP_GRAND = re.compile(
+    r"request entity too large|context (?:length|window)|maximum (?:context length|number of tokens)"
+    r"|too many (?:input )?tokens|input token count \(\d+\) exceeds|payload (?:size )?exceeds the maximum",
+    re.IGNORECASE
+)
+ERREURS_DELAI = re.compile(r"\btimed? ?out\b|deadline exceeded", re.IGNORECASE)
+ERREURS_QUOTA = re.compile(r"\bquota\b|rate.?limit|resource (?:has been )?exhausted|too many requests", re.IGNORECASE)
+STATUTS_TEMPORAIRES = {429, 500, 502, 503}
+
+class SegmentTropLourd(Exception):
+    """Échec lié à la taille du segment (requête trop grande, délai dépassé): le couper peut réussir."""
+
+def statut_http(e: Exception) -> Optional[int]:
+    """Code HTTP d'une erreur du fournisseur: attribut de l'exception ou de sa réponse, sinon en tête du message."""
+    for source in (e, getattr(e, "response", None)):
+        for attribut in ("status_code", "status", "code"):
+            valeur = getattr(source, attribut, None)
+            if isinstance(valeur, int) and 100 <= valeur < 600:
+                return valeur
+    m = re.match(r"\s*(?:error\s*)?(\d{3})\b", str(e), re.IGNORECASE)
+    return int(m.group(1)) if m else None
+
+def nature_erreur(e: Exception) -> str:
+    """"taille" (trop gros pour un appel), "delai", "temporaire" (réessayer tel quel) ou "autre"."""
+    statut = statut_http(e)
+    if statut == 429 or ERREURS_QUOTA.search(str(e)):
+        return "temporaire"  # quota ou débit: attendre, ne pas multiplier les appels
+    if statut == 413 or ERREURS_TROP_GRAND.search(str(e)):
+        return "taille"
+    if isinstance(e, TimeoutError) or statut in (408, 504) or ERREURS_DELAI.search(str(e)):
+        return "delai"
+    if statut in STATUTS_TEMPORAIRES:
+        return "temporaire"
+    return "autre"
+
+async def appel_llm(kind: str, appel):
+    """Attend un appel au modèle en mesurant sa durée (phase model) et son issue."""
+    debut = time.perf_counter()
+    try:
+        resultat = await appel
+    except Exception:
+        DUREE_LLM.observe(time.perf_counter() - debut, kind=kind, phase="model")
+        APPELS_LLM.inc(kind=kind, outcome="error")
+        raise
+    DUREE_LLM.observe(time.perf_counter() - debut, kind=kind, phase="model")
+    APPELS_LLM.inc(kind=kind, outcome="success")
+    return resultat
+
+def compter_jetons_entree(kind: str, chat, prefixe: str, suffixe: str):
+    """Jetons d'entrée d'un appel réussi: ceux du fournisseur s'il les donne, sinon une estimation
+    (le préfixe compte comme servi par le cache s'il est assez long et a été envoyé récemment)."""
+    usage = getattr(chat, "usage", None)
+    if isinstance(usage, dict) and usage.get("input_tokens") is not None:
+        total, en_cache, source = usage["input_tokens"], usage.get("cached_tokens") or 0, "provider"
+    else:
+        total = estimer_jetons(prefixe) + estimer_jetons(suffixe)
+        jetons_prefixe = estimer_jetons(prefixe)
+        chaud = cache_prefixes.consulter(prefixe)
+        en_cache = jetons_prefixe if chaud and jetons_prefixe >= PROMPT_CACHE_MIN_TOKENS else 0
+        source = "estimate"
+    JETONS_LLM.inc(en_cache, kind=kind, cache="cached", source=source)
+    JETONS_LLM.inc(total - en_cache, kind=kind, cache="uncached", source=source)
+
+async def attendre_avant_retry(kind: str, secondes: float):
+    """Pause avant une nouvelle tentative, comptée comme attente (phase wait)."""
+    RETRIES_LLM.inc(kind=kind)
+    with DUREE_LLM.mesurer(kind=kind, phase="wait"):
+        await asyncio.sleep(secondes)
+
+_replis_streaming_signales = set()
+
+def signaler_sans_streaming(chat, raison: str):
+    """Compte un appel sans streaming et l'annonce une fois par type de conversation et raison."""
+    STREAMING_LLM.inc(provider=llm_provider.name, mode="fallback", reason=raison)
+    cle = (type(chat).__name__, raison)
+    if cle not in _replis_streaming_signales:
+        _replis_streaming_signales.add(cle)
+        if raison == "unsupported":
+            logger.warning(f"{cle[0]} n'expose pas stream_message: réponses du modèle reçues en un seul morceau "
+                           f"(pas de progression segment_delta)")
+        else:
+            logger.info("LLM_STREAMING=false: réponses du modèle reçues en un seul morceau")
+
+async def iter_llm_chunks(chat, user_message):
+    """Produit la réponse du modèle morceau par morceau.
+
+    Utilise le streaming de l'intégration LLM lorsqu'il est disponible, sinon
+    retombe sur send_message et produit la réponse complète en un seul morceau
+    (signalé par signaler_sans_streaming).
+    """
+    stream_message = getattr(chat, "stream_message", None) if LLM_STREAMING else None
+    if stream_message is None:
+        signaler_sans_streaming(chat, "disabled" if not LLM_STREAMING else "unsupported")
+        response = await chat.send_message(user_message)
+        if response:
+            yield response
+        return
+    STREAMING_LLM.inc(provider=llm_provider.name, mode="streamed", reason="")
+    async for chunk in stream_message(user_message):
+        if chunk:
+            yield chunk
+
+async def analyze_pdf_segment(pdf_path: str, segment_num: int, total_segments: int, max_retries: int = 3,
+                              on_chunk=None, profondeur: int = 0, delai: float = SEGMENT_CALL_TIMEOUT,
+                              tour: Optional["TourSegment"] = None) -> str:
+    """Analyse un segment de PDF avec Gemini avec retry automatique optimisé.
+
+    Si on_chunk est fourni, la réponse est consommée en streaming et chaque morceau
+    est transmis via on_chunk(delta, attempt) dès sa réception. Un segment trop lourd
+    pour un appel est analysé par moitiés (analyser_moities). Avec tour, chaque appel
+    attend sa place dans l'ordonnanceur des segments et la rend pendant les pauses.
+    """
+    import asyncio
+    
+    date_analyse = datetime.now(timezone.utc).strftime("%d/%m/%Y à %H:%M UTC")
+    
+    # Voie rapide: les pages avec couche texte partent en texte, seules les pages numérisées en PDF
+    texte_pages, scan_path, pages_scannees, nb_pages = "", pdf_path, [], 0
+    ext = get_file_extension(pdf_path)
+    if ext in IMAGE_FORMATS:
+        # Image téléversée directement: OCR local, sinon envoi de l'image
+        texte_ocr = await ocr_fichier_image(pdf_path)
+        if texte_ocr:
+            logger.info(f"Segment {segment_num}: image remplacée par son texte OCR")
+            texte_pages, scan_path = f"=== TEXTE OCR ===\n{texte_ocr}", None
+    elif TEXT_LAYER_FAST_PATH and ext == '.pdf':
         try:
-            data = json.loads(json_str.strip())
-        except json.JSONDecodeError:
-            logger.warning(f"Impossible de parser le JSON des médecins")
-            return
-        
-        if not data.get("medecins"):
-            return
-        
-        for med in data["medecins"]:
-            nom = med.get("nom", "").strip().upper()
-            prenom = med.get("prenom", "").strip().title()
-            
-            if not nom or len(nom) < 2:
-                continue
+            texte_pages, scan_path, pages_scannees, nb_pages = await preparer_contenu_segment(pdf_path)
+            if texte_pages:
+                taille_envoyee = len(texte_pages.encode("utf-8")) + (os.path.getsize(scan_path) if scan_path else 0)
+                logger.info(
+                    f"Segment {segment_num}: {nb_pages - len(pages_scannees)}/{nb_pages} pages envoyées en texte "
+                    f"({os.path.getsize(pdf_path)} -> {taille_envoyee} octets)"
+                )
+        except Exception as e:
+            logger.warning(f"Couche texte illisible pour le segment {segment_num}, envoi du PDF complet: {str(e)[:100]}")
+            texte_pages, scan_path, pages_scannees = "", pdf_path, []
+    
+    # Un délai dépassé ne se réessaie pas tel quel si le segment peut être coupé
+    divisible = False
+    if ext == '.pdf' and profondeur < SEGMENT_SPLIT_MAX_DEPTH:
+        if not nb_pages:
+            try:
+                nb_pages = await asyncio.get_running_loop().run_in_executor(analysis_executor, compter_pages, pdf_path)
+            except Exception:
+                nb_pages = 0
+        divisible = nb_pages > 1
+    
+    try:
+        return await _analyze_segment_content(
+            segment_num, total_segments, max_retries, on_chunk,
+            date_analyse, texte_pages, scan_path, pages_scannees, delai, divisible, tour
+        )
+    except SegmentTropLourd as e:
+        echec = str(e)
+    finally:
+        if scan_path and scan_path != pdf_path and os.path.exists(scan_path):
+            destruction_securisee(scan_path)
+    return await analyser_moities(pdf_path, segment_num, total_segments, max_retries, on_chunk, profondeur, echec,
+                                  delai, tour)
+
+def compter_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+def couper_segment(pdf_path: str) -> Optional[tuple]:
+    """Coupe un segment PDF en deux moitiés qui gardent les numéros de pages d'origine; None s'il n'a qu'une page."""
+    reader = PdfReader(pdf_path)
+    total = len(reader.pages)
+    if total < 2:
+        return None
+    pages_originales = lire_pages_originales(reader)
+    moities = []
+    for numero, (debut, fin) in enumerate(((0, total // 2), (total // 2, total)), 1):
+        writer = PdfWriter()
+        for index in range(debut, fin):
+            writer.add_page(reader.pages[index])
+        ecrire_pages_originales(writer, pages_originales[debut:fin])
+        chemin = f"{pdf_path}_moitie_{numero}.pdf"
+        with open(chemin, 'wb') as moitie:
+            writer.write(moitie)
+        moities.append(chemin)
+    return tuple(moities)
+
+async def recoller_moities(analyses: List[str]) -> str:
+    """Un rapport de segment à partir des rapports de ses moitiés, dans l'ordre des pages."""
+    rapports, donnees = zip(*(separer_donnees(analyse) for analyse in analyses))
+    rapport = await synthese_segments(list(rapports))
+    return f"{rapport}\n\n{MARQUEUR_DONNEES}\n{json.dumps(fusionner_donnees(list(donnees)), ensure_ascii=False)}"
+
+async def relayer_flux(on_chunk, moitie: tuple, delta: str, attempt):
+    await on_chunk(delta, (moitie, attempt))
+
+async def analyser_moities(pdf_path: str, segment_num: int, total_segments: int, max_retries: int,
+                           on_chunk, profondeur: int, echec: str, delai: float,
+                           tour: Optional["TourSegment"] = None) -> str:
+    """Segment trop lourd pour un appel: chaque moitié est analysée avec un budget réduit (moitié du
+    délai, une tentative de moins), recoupée au besoin, puis les rapports sont recollés."""
+    if tour is not None:
+        tour.rendre()  # chaque moitié attendra son propre tour
+    moities = None
+    if profondeur < SEGMENT_SPLIT_MAX_DEPTH and get_file_extension(pdf_path) == '.pdf':
+        try:
+            loop = asyncio.get_running_loop()
+            moities = await loop.run_in_executor(analysis_executor, couper_segment, pdf_path)
+        except Exception as e:
+            logger.warning(f"Segment {segment_num}: découpage impossible: {str(e)[:100]}")
+    if not moities:
+        SEGMENTS.inc(outcome="error")
+        return f"[Segment {segment_num} - Erreur lors de l'analyse: serveurs temporairement indisponibles. Ce segment pourra être réanalysé ultérieurement.]"
+    
+    SEGMENTS.inc(outcome="split")
+    logger.warning(f"Segment {segment_num} trop lourd ({echec[:100]}): analyse en deux moitiés (niveau {profondeur + 1})")
+    analyses = []
+    try:
+        for numero, moitie in enumerate(moities, 1):
+            # Chaque moitié compte comme une nouvelle tentative pour le flux en direct
+            relais = functools.partial(relayer_flux, on_chunk, (profondeur, numero)) if on_chunk else None
+            analyses.append(await analyze_pdf_segment(moitie, segment_num, total_segments, max(1, max_retries - 1),
+                                                      relais, profondeur + 1, delai / 2, tour))
+    finally:
+        for moitie in moities:
+            if os.path.exists(moitie):
+                destruction_securisee(moitie)
+    return await recoller_moities(analyses)
+
+async def _analyze_segment_content(segment_num: int, total_segments: int, max_retries: int, on_chunk,
+                                   date_analyse: str, texte_pages: str, scan_path: Optional[str],
+                                   pages_scannees: List[int], delai: float = SEGMENT_CALL_TIMEOUT,
+                                   divisible: bool = False, tour: Optional["TourSegment"] = None) -> str:
+    for attempt in range(max_retries):
+        try:
+            if tour is not None:
+                await tour.prendre()
+            logger.info(f"Analyse segment {segment_num}/{total_segments} - tentative {attempt+1}/{max_retries}")
             
-            existing = await db.medecins.find_one({
-                "nom": nom,
-                "prenom": {"$regex": f"^{prenom}$", "$options": "i"} if prenom else {"$exists": True}
-            })
+            chat = llm_provider.create_chat(
+                session_id=f"analysis-{uuid.uuid4()}",
+                system_message=SYSTEM_MESSAGE_ANALYSE
+            )
             
-            if existing:
-                medecin_id = existing["id"]
-                update_data = {"derniere_maj": datetime.now(timezone.utc).isoformat()}
-                if med.get("specialite") and not existing.get("specialite"):
-                    update_data["specialite"] = med["specialite"]
-                await db.medecins.update_one({"id": medecin_id}, {"$set": update_data})
-            else:
-                medecin_id = str(uuid.uuid4())
-                new_medecin = {
-                    "id": medecin_id,
-                    "nom": nom,
-                    "prenom": prenom,
-                    "specialite": med.get("specialite"),
-                    "adresse": None,
-                    "ville": None,
-                    "diplomes": None,
-                    "decisions_pro_employeur": 0,
-                    "decisions_pro_employe": 0,
-                    "total_decisions": 0,
-                    "pourcentage_pro_employeur": 0.0,
-                    "pourcentage_pro_employe": 0.0,
-                    "sources": [],
-                    "derniere_maj": datetime.now(timezone.utc).isoformat()
-                }
-                await db.medecins.insert_one(new_medecin)
+            file_contents = None
+            if scan_path:
+                ext = get_file_extension(scan_path)
+                file_contents = [FileContentWithMimeType(
+                    file_path=scan_path,
+                    mime_type=ACCEPTED_FORMATS.get(ext, "application/pdf")
+                )]
             
-            conclusion = med.get("conclusion_favorable_a", "neutre")
-            inc_fields = {"total_decisions": 1}
-            if conclusion == "employeur":
-                inc_fields["decisions_pro_employeur"] = 1
-            elif conclusion == "employe":
-                inc_fields["decisions_pro_employe"] = 1
+            # Préfixe commun d'abord (mis en cache), partie propre au segment ensuite
+            suffixe = suffixe_demande_analyse(segment_num, total_segments, date_analyse, texte_pages, pages_scannees)
+            user_message = UserMessage(text=DEMANDE_ANALYSE + suffixe, file_contents=file_contents)
             
-            await db.medecins.update_one(
-                {"id": medecin_id},
-                {"$inc": inc_fields, "$addToSet": {"sources": source_filename}}
-            )
+            if on_chunk is None:
+                appel = chat.send_message(user_message)
+            else:
+                async def consommer_flux():
+                    chunks = []
+                    debut = time.perf_counter()
+                    async for chunk in iter_llm_chunks(chat, user_message):
+                        if not chunks:
+                            DUREE_LLM.observe(time.perf_counter() - debut, kind="segment", phase="first_chunk")
+                        chunks.append(chunk)
+                        await on_chunk(chunk, attempt)
+                    return "".join(chunks)
+                appel = consommer_flux()
+            if delai > 0:
+                appel = asyncio.wait_for(appel, delai)
+            response = await appel_llm("segment", appel)
+            compter_jetons_entree("segment", chat, SYSTEM_MESSAGE_ANALYSE + DEMANDE_ANALYSE, suffixe)
+            SEGMENTS.inc(outcome="success" if response else "empty")
+            return response if response else f"[Segment {segment_num} - Réponse vide]"
             
-            medecin_updated = await db.medecins.find_one({"id": medecin_id})
-            if medecin_updated and medecin_updated["total_decisions"] > 0:
-                total = medecin_updated["total_decisions"]
-                pct_employeur = (medecin_updated["decisions_pro_employeur"] / total) * 100
-                pct_employe = (medecin_updated["decisions_pro_employe"] / total) * 100
-                await db.medecins.update_one(
-                    {"id": medecin_id},
-                    {"$set": {
-                        "pourcentage_pro_employeur": round(pct_employeur, 1),
-                        "pourcentage_pro_employe": round(pct_employe, 1)
-                    }}
-                )
+        except Exception as e:
+            error_str = str(e) or type(e).__name__
+            nature = nature_erreur(e)
+            logger.error(f"Erreur segment {segment_num}: {error_str[:200]}")
+            if nature == "taille" or (nature == "delai" and divisible):
+                raise SegmentTropLourd(error_str)  # les mêmes octets échoueraient de nouveau: couper
+            if nature in ("delai", "temporaire"):
+                if attempt < max_retries - 1:
+                    wait_time = (attempt + 1) * 5  # 5s, 10s, 15s - délais réduits
+                    logger.warning(f"Erreur temporaire segment {segment_num}, retry {attempt+2}/{max_retries} dans {wait_time}s...")
+                    if tour is not None:
+                        tour.rendre()  # la place LLM sert aux autres pendant la pause
+                    await attendre_avant_retry("segment", wait_time)
+                    continue
+            # Au lieu de lever une exception, retourner un message d'erreur
+            SEGMENTS.inc(outcome="error")
+            return f"[Segment {segment_num} - Erreur lors de l'analyse: serveurs temporairement indisponibles. Ce segment pourra être réanalysé ultérieurement.]"
+    
+    # Si toutes les tentatives échouent, retourner un message au lieu de lever une exception
+    SEGMENTS.inc(outcome="error")
+    return f"[Segment {segment_num} - Échec après {max_retries} tentatives. Les serveurs sont très sollicités.]"
+
+# ===== DONNÉES STRUCTURÉES (JSON APRÈS LE RAPPORT) =====
+# L'appel d'analyse renvoie, après le Markdown, un objet JSON (médecins, dates, blessures,
+# contradictions) précédé de MARQUEUR_DONNEES. Il est retiré du rapport affiché et lu par un
+# analyseur tolérant; sans lui, les médecins sont relus dans le tableau Markdown du rapport.
+MARQUEUR_DONNEES = "<!-- DONNEES_STRUCTUREES -->"
+CHAMPS_DONNEES = ("medecins", "dates", "blessures", "contradictions")
+
+def lire_json_tolerant(texte: str) -> Optional[dict]:
+    """Premier objet JSON du texte, même entouré de ``` ou de prose, avec virgules finales ou guillemets typographiques."""
+    debut = texte.find("{")
+    if debut == -1:
+        return None
+    candidat = texte[debut:]
+    decodeur = json.JSONDecoder()
+    for essai in range(2):
+        try:
+            objet, _ = decodeur.raw_decode(candidat)
+            return objet if isinstance(objet, dict) else None
+        except ValueError:
+            if essai == 0:
+                candidat = re.sub(r",\s*([}\]])", r"\1", candidat.replace("“", '"').replace("”", '"'))
+    return None
+
+def normaliser_donnees(donnees: Optional[dict]) -> dict:
+    """Garde les listes attendues, et seulement leurs entrées de type objet."""
+    donnees = donnees or {}
+    return {
+        champ: [entree for entree in donnees.get(champ) or [] if isinstance(entree, dict)]
+        if isinstance(donnees.get(champ), list) else []
+        for champ in CHAMPS_DONNEES
+    }
+
+def separer_nom(cellule: str) -> tuple[str, str]:
+    """"Dr Louise TREMBLAY" ou "Dre TREMBLAY, Louise" -> ("TREMBLAY", "Louise")."""
+    texte = re.sub(r"^(dre?|docteure?|pr)\.?\s+", "", cellule.replace("*", "").strip(), flags=re.IGNORECASE)
+    mots = [mot for mot in re.split(r"[\s,]+", texte) if mot]
+    if not mots:
+        return "", ""
+    majuscules = [mot for mot in mots if len(mot) > 1 and mot.isupper()]
+    if majuscules:
+        return " ".join(majuscules), " ".join(mot for mot in mots if mot not in majuscules)
+    return mots[-1].upper(), " ".join(mots[:-1])
+
+def normaliser_partie(texte: str) -> str:
+    texte = plier_texte(texte.lower())
+    for cle, mots in (("employeur", ("employeur",)), ("employe", ("employe", "travailleur")),
+                      ("CNESST", ("cnesst",)), ("TAT", ("tat",)), ("BEM", ("bem",))):
+        if any(re.search(rf"\b{mot}", texte) for mot in mots):
+            return cle
+    return "inconnu"
+
+def medecins_du_tableau(rapport: str) -> List[dict]:
+    """Repli sans JSON: lignes du tableau « MÉDECINS ET EXPERTS IDENTIFIÉS » du rapport."""
+    bloc = extraire_constats(rapport, 1).get("medecins")
+    if not bloc or not bloc["rows"]:
+        return []
+    entete = [normaliser_texte(c) for c in bloc["header"] or []]
+    
+    def colonne(*mots) -> Optional[int]:
+        return next((i for i, titre in enumerate(entete) if any(mot in titre for mot in mots)), None)
+    
+    i_medecin = colonne("médecin", "expert")
+    i_specialite = colonne("spécialité")
+    i_mandat = colonne("mandat")
+    i_conclusion = colonne("conclusion")
+    medecins = []
+    for ligne in bloc["rows"]:
+        def cellule(i: Optional[int]) -> str:
+            return ligne[i] if i is not None and i < len(ligne) else ""
+        nom, prenom = separer_nom(cellule(0 if i_medecin is None else i_medecin))
+        if len(nom) < 2:
+            continue
+        favorable = normaliser_partie(cellule(i_conclusion))
+        medecins.append({
+            "nom": nom,
+            "prenom": prenom,
+            "specialite": cellule(i_specialite) or None,
+            "mandataire": normaliser_partie(cellule(i_mandat)),
+            "conclusion_favorable_a": favorable if favorable in ("employeur", "employe") else "neutre",
+        })
+    return medecins
+
+def separer_donnees(reponse: str) -> tuple[str, dict]:
+    """Sépare la réponse d'analyse en (rapport Markdown, données structurées normalisées)."""
+    position = reponse.rfind(MARQUEUR_DONNEES)
+    donnees = None
+    if position != -1:
+        donnees = lire_json_tolerant(reponse[position + len(MARQUEUR_DONNEES):])
+        reponse = reponse[:position].rstrip()
+    else:
+        # Marqueur oublié: bloc ```json final qui contient les médecins
+        bloc = re.search(r"```(?:json)?\s*(\{[^`]*\"medecins\"[^`]*\})\s*```\s*$", reponse)
+        if bloc:
+            donnees = lire_json_tolerant(bloc.group(1))
+            reponse = reponse[:bloc.start()].rstrip()
+    donnees = normaliser_donnees(donnees)
+    if not donnees["medecins"]:
+        donnees["medecins"] = medecins_du_tableau(reponse)
+    return reponse, donnees
+
+def anonymiser_donnees(donnees: dict) -> dict:
+    """Même masquage que le rapport, valeur par valeur (le JSON reste valide)."""
+    return {
+        champ: [{cle: anonymize_for_report(valeur) if isinstance(valeur, str) else valeur
+                 for cle, valeur in entree.items()} for entree in entrees]
+        for champ, entrees in donnees.items()
+    }
+
+def fusionner_donnees(liste: List[Optional[dict]]) -> dict:
+    """Réunit les données des segments; chaque médecin une seule fois, chaque entrée identique une fois."""
+    fusion = {champ: [] for champ in CHAMPS_DONNEES}
+    vus = set()
+    for donnees in liste:
+        for champ in CHAMPS_DONNEES:
+            for entree in (donnees or {}).get(champ, []):
+                if champ == "medecins":
+                    cle = (champ, str(entree.get("nom", "")).strip().upper(), str(entree.get("prenom", "")).strip().lower())
+                else:
+                    cle = (champ, json.dumps(entree, sort_keys=True, ensure_ascii=False))
+                if cle not in vus:
+                    vus.add(cle)
+                    fusion[champ].append(entree)
+    return fusion
+
+# ===== EXTRACTION DES MÉDECINS (FILE D'ATTENTE) =====
+# Les médecins arrivent avec le rapport (données structurées): plus d'appel au LLM dédié.
+# L'enregistrement ne retarde pas le rapport: chaque rapport terminé est mis en file
+# (medecins_extractions) et appliqué en arrière-plan, avec nouvelles tentatives. Le hachage
+# du rapport sert de clé d'idempotence: un même rapport n'est compté qu'une fois par médecin
+# (medecins_decisions). Quand la file s'allonge, plusieurs rapports sont appliqués par lot.
+MEDECINS_BATCH_SIZE = int(os.environ.get('MEDECINS_BATCH_SIZE', '4'))  # rapports max par lot
+MEDECINS_MAX_ATTEMPTS = int(os.environ.get('MEDECINS_MAX_ATTEMPTS', '4'))
+MEDECINS_RETRY_DELAY = int(os.environ.get('MEDECINS_RETRY_DELAY', '30'))  # doublé à chaque échec
+MEDECINS_LEASE_SECONDS = int(os.environ.get('MEDECINS_LEASE_SECONDS', '300'))
+MEDECINS_POLL_INTERVAL = float(os.environ.get('MEDECINS_POLL_INTERVAL', '5'))
+MEDECINS_RETENTION_DAYS = int(os.environ.get('MEDECINS_RETENTION_DAYS', '30'))  # mémoire des rapports déjà traités
+
+async def creer_index_medecins():
+    await db.medecins_extractions.create_index("report_hash", unique=True)
+    await db.medecins_extractions.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.medecins_extractions.create_index("expire_at", expireAfterSeconds=0)
+    await db.medecins_decisions.create_index([("medecin_id", 1), ("report_hash", 1)], unique=True)
+    # Un seul médecin par nom normalisé, même avec plusieurs extracteurs en parallèle
+    await db.medecins.create_index("cle", unique=True, partialFilterExpression={"cle": {"$exists": True}})
+    async for doc in db.medecins.find({"cle": {"$exists": False}}, {"_id": 1, "nom": 1, "prenom": 1}):
+        try:
+            await db.medecins.update_one({"_id": doc["_id"]}, {"$set": {"cle": cle_medecin(doc.get("nom"), doc.get("prenom"))}})
+        except DuplicateKeyError:
+            logger.warning(f"Médecin en double non fusionné: {doc.get('nom')} {doc.get('prenom') or ''}".rstrip())
+
+def cle_medecin(nom: Optional[str], prenom: Optional[str]) -> str:
+    """Clé d'unicité d'un médecin: nom et prénom sans casse, accents ni ponctuation."""
+    return " ".join(plier_texte(nom or "").split()) + "|" + " ".join(plier_texte(prenom or "").split())
+
+async def obtenir_medecin(nom: str, prenom: str, specialite: Optional[str] = None) -> dict:
+    """Fiche du médecin, créée au besoin par upsert sur sa clé (sans doublon entre processus)."""
+    if not prenom:
+        # Prénom absent du rapport: le médecin déjà connu sous ce nom
+        existant = await db.medecins.find_one({"nom": nom}, {"_id": 0, "id": 1, "specialite": 1})
+        if existant:
+            return existant
+    cle = cle_medecin(nom, prenom)
+    maintenant = datetime.now(timezone.utc).isoformat()
+    try:
+        medecin = await db.medecins.find_one_and_update(
+            {"cle": cle},
+            {"$set": {"derniere_maj": maintenant},
+             "$setOnInsert": {
+                 "id": str(uuid.uuid4()), "cle": cle, "nom": nom, "prenom": prenom,
+                 "specialite": specialite, "adresse": None, "ville": None, "diplomes": None,
+                 "decisions_pro_employeur": 0, "decisions_pro_employe": 0, "total_decisions": 0,
+                 "pourcentage_pro_employeur": 0.0, "pourcentage_pro_employe": 0.0, "sources": [],
+             }},
+            projection={"_id": 0, "id": 1, "specialite": 1},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Upsert concurrent sur la même clé: l'autre a créé la fiche
+        medecin = await db.medecins.find_one({"cle": cle}, {"_id": 0, "id": 1, "specialite": 1})
+    if specialite and not medecin.get("specialite"):
+        await db.medecins.update_one({"id": medecin["id"], "specialite": {"$in": [None, ""]}},
+                                     {"$set": {"specialite": specialite}})
+    return medecin
+
+async def compter_decision(medecin_id: str, inc_fields: dict, marqueur: str, source: Optional[str]):
+    """Ajoute une décision aux compteurs, une seule fois par marqueur, puis recalcule les pourcentages.
+
+    Le marqueur (hachage du rapport) est ajouté à rapports_comptes dans la même écriture que
+    le $inc: une nouvelle tentative après une panne ne compte ni deux fois ni zéro fois.
+    """
+    ajouts = {"rapports_comptes": marqueur}
+    if source:
+        ajouts["sources"] = source
+    await db.medecins.update_one(
+        {"id": medecin_id, "rapports_comptes": {"$ne": marqueur}},
+        {"$inc": inc_fields, "$addToSet": ajouts}
+    )
+    medecin = await db.medecins.find_one(
+        {"id": medecin_id}, {"_id": 0, "total_decisions": 1, "decisions_pro_employeur": 1, "decisions_pro_employe": 1}
+    )
+    if medecin and medecin.get("total_decisions", 0) > 0:
+        total = medecin["total_decisions"]
+        await db.medecins.update_one(
+            {"id": medecin_id},
+            {"$set": {
+                "pourcentage_pro_employeur": round(medecin.get("decisions_pro_employeur", 0) / total * 100, 1),
+                "pourcentage_pro_employe": round(medecin.get("decisions_pro_employe", 0) / total * 100, 1)
+            }}
+        )
+
+async def planifier_extraction_medecins(medecins: List[dict], analysis_text: str, source_filename: str) -> bool:
+    """Met les médecins d'un rapport en file; faux si aucun médecin ou rapport déjà en file (ou traité)."""
+    if not medecins:
+        return False
+    maintenant = datetime.now(timezone.utc)
+    empreinte = hashlib.sha256(analysis_text.encode("utf-8")).hexdigest()
+    try:
+        await db.medecins_extractions.insert_one({
+            "report_hash": empreinte,
+            "filename": source_filename,
+            "medecins": medecins,
+            "status": "queued",
+            "attempts": 0,
+            "next_attempt_at": maintenant,
+            "created_at": maintenant,
+            "expire_at": maintenant + timedelta(days=MEDECINS_RETENTION_DAYS)
+        })
+    except DuplicateKeyError:
+        return False
+    extracteur_medecins.reveiller()
+    return True
+
+async def appliquer_medecins(medecins: List[dict], source_filename: str, report_hash: str):
+    """Crée ou met à jour les médecins d'un rapport; une décision par médecin et par rapport."""
+    for med in medecins:
+        nom = (med.get("nom") or "").strip().upper()
+        prenom = (med.get("prenom") or "").strip().title()
         
-        logger.info(f"Extraction terminée: {len(data['medecins'])} médecin(s)")
+        if not nom or len(nom) < 2:
+            continue
         
-    except Exception as e:
-        logger.error(f"Erreur extraction médecins: {str(e)}")
+        medecin_id = (await obtenir_medecin(nom, prenom, med.get("specialite")))["id"]
+        
+        conclusion = med.get("conclusion_favorable_a", "neutre")
+        try:
+            await db.medecins_decisions.insert_one({
+                "medecin_id": medecin_id,
+                "report_hash": report_hash,
+                "conclusion": conclusion,
+                "created_at": datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            pass  # Nouvelle tentative: compter_decision ne compte le rapport qu'une fois
+        
+        inc_fields = {"total_decisions": 1}
+        if conclusion == "employeur":
+            inc_fields["decisions_pro_employeur"] = 1
+        elif conclusion == "employe":
+            inc_fields["decisions_pro_employe"] = 1
+        await compter_decision(medecin_id, inc_fields, report_hash, source_filename)
+
+class ExtracteurMedecins:
+    """Consomme medecins_extractions; plusieurs processus (API, workers) peuvent tourner en même temps."""
+
+    def __init__(self, taille_lot: int, intervalle: float):
+        self.taille_lot = max(1, taille_lot)
+        self.intervalle = intervalle
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._task = None
+        self._reveil = None
+
+    async def reclamer_lot(self) -> List[dict]:
+        """Réclame un rapport, puis d'autres tant que la file en contient et que le lot a de la place."""
+        lot = []
+        while len(lot) < self.taille_lot:
+            maintenant = datetime.now(timezone.utc)
+            document = await db.medecins_extractions.find_one_and_update(
+                {"$or": [
+                    {"status": "queued", "next_attempt_at": {"$lte": maintenant}},
+                    {"status": "running", "lease_until": {"$lt": maintenant}}
+                ]},
+                {"$set": {
+                    "status": "running",
+                    "worker": self.worker_id,
+                    "lease_until": maintenant + timedelta(seconds=MEDECINS_LEASE_SECONDS)
+                }},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not document:
+                break
+            lot.append(document)
+        return lot
+
+    async def reessayer(self, document: dict, raison: str):
+        tentatives = document.get("attempts", 0) + 1
+        if tentatives >= MEDECINS_MAX_ATTEMPTS:
+            ECHECS.inc(stage="medecins_extraction")
+            EXTRACTIONS_MEDECINS.inc(outcome="failed")
+            logger.error(f"Extraction médecins abandonnée ({document['filename']}) après {tentatives} tentative(s): {raison}")
+            await db.medecins_extractions.update_one(
+                {"_id": document["_id"]},
+                {"$set": {"status": "failed", "attempts": tentatives, "error": raison, "lease_until": None},
+                 "$unset": {"medecins": ""}}
+            )
+            return
+        delai = MEDECINS_RETRY_DELAY * 2 ** (tentatives - 1)
+        EXTRACTIONS_MEDECINS.inc(outcome="retry")
+        logger.warning(f"Extraction médecins ({document['filename']}) reportée de {delai} s: {raison}")
+        await db.medecins_extractions.update_one(
+            {"_id": document["_id"]},
+            {"$set": {
+                "status": "queued",
+                "attempts": tentatives,
+                "error": raison,
+                "lease_until": None,
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delai)
+            }}
+        )
+
+    async def traiter_lot(self, lot: List[dict]):
+        total = 0
+        for document in lot:
+            medecins = document.get("medecins") or []
+            try:
+                await appliquer_medecins(medecins, document["filename"], document["report_hash"])
+            except Exception as e:
+                await self.reessayer(document, str(e)[:200] or type(e).__name__)
+                continue
+            await db.medecins_extractions.update_one(
+                {"_id": document["_id"]},
+                {"$set": {"status": "done", "lease_until": None, "done_at": datetime.now(timezone.utc)},
+                 "$unset": {"medecins": "", "error": ""}}
+            )
+            EXTRACTIONS_MEDECINS.inc(outcome="done")
+            total += len(medecins)
+        await medecins_cache.invalidate()
+        logger.info(f"Extraction terminée: {total} médecin(s) dans {len(lot)} rapport(s)")
+
+    def reveiller(self):
+        if self._reveil is not None:
+            self._reveil.set()
+
+    async def _run(self):
+        while True:
+            try:
+                lot = await self.reclamer_lot()
+                if lot:
+                    await self.traiter_lot(lot)
+                    continue
+            except Exception as e:
+                logger.warning(f"Erreur de la file d'extraction des médecins: {str(e)}")
+            self._reveil.clear()
+            try:
+                await asyncio.wait_for(self._reveil.wait(), self.intervalle)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._reveil = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+extracteur_medecins = ExtracteurMedecins(MEDECINS_BATCH_SIZE, MEDECINS_POLL_INTERVAL)
 
 class MultiAnalysisResponse(BaseModel):
     success: bool
@@ -606,9 +2501,11 @@ class MultiAnalysisResponse(BaseModel):
     message: str
     files_analyzed: List[str]
     destruction_confirmed: bool = True
+    report_id: Optional[str] = None
+    structured_data: Optional[dict] = None
 
 @api_router.post("/analyze-multiple", response_model=MultiAnalysisResponse)
-async def analyze_multiple_documents(files: List[UploadFile] = File(...), consent_ai_learning: bool = False):
+async def analyze_multiple_documents(request: Request, files: List[UploadFile] = File(...), consent_ai_learning: bool = False):
     """Analyse plusieurs documents et retourne un rapport combiné."""
     
     if len(files) > 10:
@@ -620,123 +2517,377 @@ async def analyze_multiple_documents(files: List[UploadFile] = File(...), consen
             accepted = ", ".join(ACCEPTED_FORMATS.keys())
             raise HTTPException(status_code=400, detail=f"Format non accepté pour {f.filename}. Formats acceptés: {accepted}")
     
-    all_analyses = []
-    files_analyzed = []
-    tmp_paths = []
-    
-    try:
-        for idx, file in enumerate(files, 1):
-            contents = await file.read()
-            file_size = len(contents)
-            
-            if file_size > 100 * 1024 * 1024:
+    # Attendre une place d'analyse (429 immédiat si la file d'attente est pleine)
+    async with reserver_analyse("multiple"):
+        analysis_id = str(uuid.uuid4())
+        televersements = []
+        for file in files:
+            with mesurer_etape("upload"):
+                contents = await file.read()
+            if len(contents) > 100 * 1024 * 1024:
                 continue  # Skip files over 100 Mo
-            
-            ext = get_file_extension(file.filename)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp_file:
-                tmp_file.write(contents)
-                tmp_path = tmp_file.name
-                tmp_paths.append(tmp_path)
-            
-            logger.info(f"Analyse du fichier {idx}/{len(files)}: {file.filename}")
-            
-            # Analyser le document
-            mime_type = ACCEPTED_FORMATS.get(ext, 'application/octet-stream')
-            analysis = await analyze_single_file(tmp_path, mime_type, file.filename, idx, len(files))
-            # S'assurer que analysis n'est jamais None
-            if analysis is None:
-                analysis = "[Analyse non disponible pour ce document]"
-            all_analyses.append(f"## 📄 Document {idx}: {file.filename}\n\n{analysis}")
-            files_analyzed.append(file.filename)
-        
-        # Combiner toutes les analyses avec protection contre None
-        combined = "# 📋 RAPPORT D'ANALYSE COMBINÉ - L'ÉCLAIREUR\n\n"
-        combined += f"**{len(files_analyzed)} document(s) analysé(s)**\n\n"
-        # S'assurer que tous les éléments sont des chaînes
-        safe_analyses = [str(a) if a is not None else "[Analyse non disponible]" for a in all_analyses]
-        combined += "---\n\n".join(safe_analyses)
-        
-        # Anonymisation
-        report_analysis = anonymize_for_report(combined)
-        ai_analysis = anonymize_for_ai_learning(combined) if consent_ai_learning else ""
+            televersements.append((file.filename, contents))
+        files_analyzed = [nom for nom, _ in televersements]
         
-        # Destruction sécurisée
-        for path in tmp_paths:
-            if os.path.exists(path):
-                destruction_securisee(path)
+        ctx = ContexteAnalyse(analysis_id, CoffreJob(analysis_id), ", ".join(files_analyzed), identifiant_client(request),
+                              consent_ai_learning, rapport_combine=True)
+        ctx.televersements = televersements
+        try:
+            await PIPELINE_ANALYSE.executer(ctx)
+        except AnalyseImpossible as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
         
         return MultiAnalysisResponse(
             success=True,
             total_files=len(files_analyzed),
-            combined_analysis=report_analysis,
-            anonymized_for_ai=ai_analysis,
+            combined_analysis=ctx.report_analysis,
+            anonymized_for_ai=ctx.ai_analysis,
             message=f"{len(files_analyzed)} document(s) analysé(s). Tous les fichiers ont été détruits de manière sécurisée.",
             files_analyzed=files_analyzed,
-            destruction_confirmed=True
+            destruction_confirmed=ctx.destruction_success,
+            report_id=ctx.report_id,
+            structured_data=ctx.report_data
         )
-        
-    except Exception as e:
-        # Destruction en cas d'erreur
-        for path in tmp_paths:
-            if os.path.exists(path):
-                destruction_securisee(path)
-        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
 
-async def analyze_single_file(file_path: str, mime_type: str, filename: str, idx: int, total: int) -> str:
-    """Analyse un seul fichier avec Gemini."""
-    import asyncio
-    
-    date_analyse = datetime.now(timezone.utc).strftime("%d/%m/%Y à %H:%M UTC")
-    
-    for attempt in range(3):
+# ===== ADMISSION DES ANALYSES =====
+# Nombre d'analyses en cours (fichiers temporaires, mémoire) et taille de la file d'attente;
+# au-delà, les demandes sont refusées tout de suite (429). Le budget du fournisseur LLM est
+# réparti entre les analyses admises par l'ordonnanceur des segments (SEGMENT_MAX_CONCURRENT).
+ANALYSIS_MAX_CONCURRENT = max(1, int(os.environ.get('ANALYSIS_MAX_CONCURRENT', '6')))
+ANALYSIS_MAX_QUEUE = max(0, int(os.environ.get('ANALYSIS_MAX_QUEUE', '10')))
+ANALYSIS_RETRY_AFTER = int(os.environ.get('ANALYSIS_RETRY_AFTER', '30'))  # secondes, avant toute mesure
+ANALYSIS_RETRY_AFTER_MAX = 900
+
+class AdmissionRefusee(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"File d'attente pleine, réessayer dans {retry_after} s")
+        self.retry_after = retry_after
+
+class TicketAdmission:
+    """Place réservée pour une analyse, à utiliser avec `async with`.
+
+    L'entrée attend que la place soit accordée; la sortie la cède à la demande suivante.
+    Un ticket jamais utilisé doit être rendu avec annuler().
+    """
+
+    def __init__(self, controleur: "ControleurAdmission", kind: str, on_position=None):
+        self.controleur = controleur
+        self.kind = kind
+        self.on_position = on_position  # coroutine appelée avec la nouvelle position dans la file
+        self.future = None
+        self.accorde = False
+        self.libere = False
+        self.derniere_position = None
+        self.debut = None
+
+    def position(self) -> int:
+        """Position dans la file d'attente (0 si la place est accordée)."""
+        return self.controleur.position(self)
+
+    def annuler(self):
+        if not self.libere:
+            self.libere = True
+            self.controleur.abandonner(self)
+
+    async def __aenter__(self):
+        if not self.accorde:
+            try:
+                with mesurer_etape("admission_wait"):
+                    await self.future
+            except BaseException:
+                self.annuler()
+                raise
+        self.debut = time.monotonic()
+        JOBS_ACTIFS.inc(kind=self.kind)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        JOBS_ACTIFS.dec(kind=self.kind)
+        if not self.libere:
+            self.libere = True
+            self.controleur.liberer(time.monotonic() - self.debut)
+        return False
+
+class ControleurAdmission:
+    """Limite le nombre d'analyses simultanées avec une file d'attente bornée (FIFO).
+
+    Remplace l'ancien verrou global: jusqu'à max_concurrent analyses tournent en
+    parallèle, les suivantes attendent leur tour et les positions sont notifiées.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.actives = 0
+        self.file = deque()
+        self.duree_moyenne = None  # moyenne mobile exponentielle de la durée d'une analyse
+
+    def reserver(self, kind: str, on_position=None) -> TicketAdmission:
+        """Accorde une place ou inscrit la demande en file; lève AdmissionRefusee si la file est pleine."""
+        ticket = TicketAdmission(self, kind, on_position)
+        if self.actives < self.max_concurrent and not self.file:
+            self.actives += 1
+            ticket.accorde = True
+            return ticket
+        if len(self.file) >= self.max_queue:
+            ADMISSIONS_REFUSEES.inc(kind=kind)
+            raise AdmissionRefusee(self.retry_after())
+        ticket.future = asyncio.get_running_loop().create_future()
+        self.file.append(ticket)
+        ticket.derniere_position = len(self.file)
+        return ticket
+
+    def position(self, ticket: TicketAdmission) -> int:
         try:
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"analysis-{uuid.uuid4()}",
-                system_message=SYSTEM_MESSAGE_ANALYSE.replace("{date_analyse}", date_analyse)
-            ).with_model("gemini", "gemini-2.5-flash")
-            
-            file_content = FileContentWithMimeType(
-                file_path=file_path,
-                mime_type=mime_type
-            )
-            
-            user_message = UserMessage(
-                text=f"""Analyse ce document ({filename} - fichier {idx}/{total}) et produis un RAPPORT DE DÉFENSE.
+            return self.file.index(ticket) + 1
+        except ValueError:
+            return 0
 
-RAPPELS:
-1. EXPLIQUE chaque terme médical/technique entre parenthèses
-2. Indique les numéros de pages si possible
-3. TABLEAU RÉCAPITULATIF DES CONTRADICTIONS en fin de rapport
-4. Inclus le BARÈME DES INDEMNISATIONS applicable
-5. Prépare des QUESTIONS STRATÉGIQUES pour l'audience TAT
+    def liberer(self, duree: Optional[float] = None):
+        """Rend une place: elle passe directement à la première demande en attente."""
+        if duree is not None:
+            self.duree_moyenne = duree if self.duree_moyenne is None else 0.8 * self.duree_moyenne + 0.2 * duree
+        while self.file:
+            suivant = self.file.popleft()
+            if not suivant.future.done():
+                suivant.accorde = True
+                suivant.future.set_result(None)
+                self.notifier_positions()
+                return
+        self.actives -= 1
 
-ANONYMISATION - MASQUER uniquement: NAS, RAMQ, Permis, Coordonnées bancaires
-GARDER EN CLAIR: noms, téléphones, adresses""",
-                file_contents=[file_content]
-            )
-            
-            response = await chat.send_message(user_message)
-            return response if response else f"[Analyse de {filename} - Réponse vide]"
-            
-        except Exception as e:
-            logger.error(f"Erreur analyse {filename}: {str(e)[:100]}")
-            if attempt < 2:
-                await asyncio.sleep(10)
+    def abandonner(self, ticket: TicketAdmission):
+        """Demande annulée ou ticket jamais utilisé."""
+        if ticket.accorde:
+            self.liberer()
+        elif ticket in self.file:
+            self.file.remove(ticket)
+            self.notifier_positions()
+
+    def notifier_positions(self):
+        for position, ticket in enumerate(self.file, 1):
+            if ticket.on_position and ticket.derniere_position != position:
+                ticket.derniere_position = position
+                asyncio.create_task(ticket.on_position(position))
+
+    def retry_after(self) -> int:
+        """Délai suggéré avant de réessayer: temps estimé pour vider la file."""
+        if self.duree_moyenne is None:
+            return ANALYSIS_RETRY_AFTER
+        estimation = self.duree_moyenne * (len(self.file) + 1) / self.max_concurrent
+        return max(1, min(ANALYSIS_RETRY_AFTER_MAX, math.ceil(estimation)))
+
+    def etat(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.actives,
+            "queued": len(self.file),
+            "retry_after": self.retry_after(),
+        }
+
+admission_analyses = ControleurAdmission(ANALYSIS_MAX_CONCURRENT, ANALYSIS_MAX_QUEUE)
+
+def reserver_analyse(kind: str, on_position=None) -> TicketAdmission:
+    """Réserve une place d'analyse ou répond 429 avec Retry-After si la file est pleine."""
+    try:
+        return admission_analyses.reserver(kind, on_position)
+    except AdmissionRefusee as e:
+        logger.warning(f"Analyse refusée ({kind}): file d'attente pleine, Retry-After {e.retry_after} s")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Trop d'analyses en cours. Veuillez réessayer dans {e.retry_after} secondes.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+# ===== ORDONNANCEMENT ÉQUITABLE DES SEGMENTS =====
+# Les analyses admises se partagent SEGMENT_MAX_CONCURRENT appels LLM simultanés.
+# Deficit round-robin entre clients: un dossier de 40 segments n'avance qu'à son tour
+# et la lettre d'une page d'un autre client passe entre deux de ses segments.
+SEGMENT_MAX_CONCURRENT = max(1, int(os.environ.get('SEGMENT_MAX_CONCURRENT', '2')))
+FAIR_SHORT_JOB_SEGMENTS = int(os.environ.get('FAIR_SHORT_JOB_SEGMENTS', '3'))  # au-delà, un job est "long"
+FAIR_LONG_JOB_COST = float(os.environ.get('FAIR_LONG_JOB_COST', '2'))  # coût d'un segment d'un job long
+FAIR_QUANTUM = 1.0
+
+# Clé aléatoire par processus: les identifiants clients (IP) ne sont jamais conservés en clair
+CLE_CLIENTS = os.urandom(16)
+# Proxys de confiance devant l'API (ingress): l'adresse du client est la N-ième de X-Forwarded-For
+# en partant de la fin; les entrées plus à gauche sont fournies par le client et ignorées.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1'))
+# Sessions distinctes (X-Client-Id) reconnues par adresse IP: au-delà, inventer des
+# identifiants ne donne pas plus de parts de l'ordonnanceur
+CLIENT_IDS_PER_IP = max(1, int(os.environ.get('CLIENT_IDS_PER_IP', '4')))
+
+def adresse_client(request: Request) -> str:
+    """Adresse IP du client telle que vue par le dernier proxy de confiance."""
+    if TRUSTED_PROXY_HOPS > 0:
+        chaine = [a.strip() for a in request.headers.get("x-forwarded-for", "").split(",") if a.strip()]
+        if len(chaine) >= TRUSTED_PROXY_HOPS:
+            return chaine[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else ""
+
+def identifiant_client(request: Optional[Request]) -> str:
+    """Client à l'origine d'une analyse: adresse IP, subdivisée par X-Client-Id en CLIENT_IDS_PER_IP parts au plus."""
+    valeur = ""
+    if request is not None:
+        valeur = adresse_client(request)
+        session = request.headers.get("x-client-id")
+        if session and CLIENT_IDS_PER_IP > 1:
+            part = int.from_bytes(hashlib.blake2b(session.encode(), key=CLE_CLIENTS, digest_size=4).digest(), "big")
+            valeur += f"#{part % CLIENT_IDS_PER_IP}"
+    return hashlib.blake2b((valeur or "anonyme").encode(), key=CLE_CLIENTS, digest_size=6).hexdigest()
+
+class TravailSegmente:
+    """Analyse découpée en segments, vue par l'ordonnanceur."""
+
+    def __init__(self, client: str, job_id: str, total_segments: int = 1):
+        self.client = client
+        self.job_id = job_id
+        self.total_segments = total_segments
+        self.termines = 0
+
+    @property
+    def restants(self) -> int:
+        return max(1, self.total_segments - self.termines)
+
+    @property
+    def court(self) -> bool:
+        return self.total_segments <= FAIR_SHORT_JOB_SEGMENTS
+
+    def cout(self) -> float:
+        return 1.0 if self.court else FAIR_LONG_JOB_COST
+
+class OrdonnanceurSegments:
+    """Accorde les appels LLM des segments par deficit round-robin entre clients.
+
+    Chaque client en attente reçoit FAIR_QUANTUM de crédit par tour; un segment de
+    job long coûte FAIR_LONG_JOB_COST, ce qui favorise les petits dossiers. Chez un
+    même client, le job auquel il reste le moins de segments passe en premier.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.en_cours = 0
+        self.files = OrderedDict()  # client -> [(travail, future)], dans l'ordre du tourniquet
+        self.deficits = {}
+        self.en_cours_par_client = {}
+
+    async def attendre(self, travail: TravailSegmente):
+        """Attend le tour d'un appel du travail; la place occupée est rendue par rendre()."""
+        future = asyncio.get_running_loop().create_future()
+        demande = (travail, future)
+        self.files.setdefault(travail.client, []).append(demande)
+        self.deficits.setdefault(travail.client, 0.0)
+        self.distribuer()
+        debut = time.perf_counter()
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.rendre(travail)
+            else:
+                self.retirer(demande)
+            raise
+        ATTENTE_SEGMENTS.observe(time.perf_counter() - debut, job_size="short" if travail.court else "long")
+
+    def distribuer(self):
+        while self.en_cours < self.max_concurrent and self.files:
+            client, file = next(iter(self.files.items()))
+            # Demande annulée dont la tâche n'a pas encore pu se retirer: elle ne reçoit pas la place
+            file[:] = [demande for demande in file if not demande[1].done()]
+            if not file:
+                del self.files[client]
+                del self.deficits[client]
                 continue
-            # Retourner un message d'erreur au lieu de lever une exception
-            return f"[Erreur lors de l'analyse de {filename} - Serveurs temporairement indisponibles]"
-    
-    return f"[Erreur lors de l'analyse de {filename}]"
+            file.sort(key=lambda d: d[0].restants)
+            travail, future = file[0]
+            if self.deficits[client] < travail.cout():
+                self.deficits[client] += FAIR_QUANTUM
+                self.files.move_to_end(client)
+                continue
+            file.pop(0)
+            self.deficits[client] -= travail.cout()
+            if not file:
+                # Un client sans segment en attente ne garde pas son crédit
+                del self.files[client]
+                del self.deficits[client]
+            self.en_cours += 1
+            self.en_cours_par_client[client] = self.en_cours_par_client.get(client, 0) + 1
+            future.set_result(None)
+
+    def retirer(self, demande):
+        travail = demande[0]
+        file = self.files.get(travail.client)
+        if file and demande in file:
+            file.remove(demande)
+            if not file:
+                del self.files[travail.client]
+                del self.deficits[travail.client]
+
+    def rendre(self, travail: TravailSegmente):
+        self.en_cours -= 1
+        restant = self.en_cours_par_client.get(travail.client, 1) - 1
+        if restant:
+            self.en_cours_par_client[travail.client] = restant
+        else:
+            self.en_cours_par_client.pop(travail.client, None)
+        self.distribuer()
+
+    def etat_clients(self) -> dict:
+        """{(client, état): nombre de segments} pour les clients présents."""
+        etat = {(client, "queued"): len(file) for client, file in self.files.items()}
+        etat.update({(client, "running"): n for client, n in self.en_cours_par_client.items()})
+        return etat
+
+ordonnanceur_segments = OrdonnanceurSegments(SEGMENT_MAX_CONCURRENT)
+
+class TourSegment:
+    """Place d'un segment dans l'ordonnanceur: prise avant chaque appel LLM, rendue pendant
+    les pauses entre tentatives et avant un découpage (chaque moitié reprend son tour)."""
+
+    def __init__(self, ordonnanceur: OrdonnanceurSegments, travail: TravailSegmente):
+        self.ordonnanceur = ordonnanceur
+        self.travail = travail
+        self.tenu = False
+
+    async def prendre(self):
+        if not self.tenu:
+            await self.ordonnanceur.attendre(self.travail)
+            self.tenu = True
+
+    def rendre(self):
+        if self.tenu:
+            self.tenu = False
+            self.ordonnanceur.rendre(self.travail)
 
 # ===== ROUTES =====
 @api_router.get("/")
 async def root():
     return {"message": "Bienvenue sur L'Éclaireur API", "status": "operational"}
 
+@app.get("/metrics")
+@api_router.get("/metrics")
+async def prometheus_metrics():
+    """Métriques au format texte Prometheus."""
+    return Response(content=metriques.rendre(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "L'Éclaireur"}
+    return {"status": "healthy", "service": "L'Éclaireur", "llm_provider": llm_provider.name, "analysis_mode": ANALYSIS_MODE}
+
+@api_router.get("/analysis-queue")
+async def analysis_queue_state():
+    """Occupation des places d'analyse, de la file d'attente et des appels LLM des segments."""
+    etat = admission_analyses.etat()
+    etat["segments"] = {
+        "max_concurrent": ordonnanceur_segments.max_concurrent,
+        "running": ordonnanceur_segments.en_cours,
+        "queued": sum(len(file) for file in ordonnanceur_segments.files.values()),
+        "tenants": len(set(ordonnanceur_segments.files) | set(ordonnanceur_segments.en_cours_par_client)),
+    }
+    return etat
 
 # Formats acceptés
 ACCEPTED_FORMATS = {
@@ -764,8 +2915,9 @@ def is_accepted_format(filename: str) -> bool:
     ext = get_file_extension(filename)
     return ext in ACCEPTED_FORMATS
 
-def extract_pdfs_from_zip(zip_path: str) -> List[str]:
-    """Extrait tous les fichiers PDF d'un ZIP et retourne leurs chemins temporaires."""
+@chronometre("extraction")
+def extract_pdfs_from_zip(zip_path: str, destination: str = UPLOAD_DIR) -> List[str]:
+    """Extrait tous les fichiers PDF d'un ZIP dans destination et retourne leurs chemins temporaires."""
     extracted_paths = []
     try:
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -774,13 +2926,14 @@ def extract_pdfs_from_zip(zip_path: str) -> List[str]:
                     # Extraire le PDF
                     extracted_name = os.path.basename(file_info.filename)
                     if extracted_name:  # Ignorer les dossiers
-                        temp_path = os.path.join(tempfile.gettempdir(), f"extracted_{uuid.uuid4()}_{extracted_name}")
+                        temp_path = os.path.join(destination, f"extracted_{uuid.uuid4()}_{extracted_name}")
                         with zip_ref.open(file_info) as source, open(temp_path, 'wb') as target:
                             target.write(source.read())
                         extracted_paths.append(temp_path)
                         logger.info(f"PDF extrait du ZIP: {extracted_name}")
         return extracted_paths
     except Exception as e:
+        ECHECS.inc(stage="extraction")
         logger.error(f"Erreur extraction ZIP: {str(e)}")
         # Nettoyer en cas d'erreur
         for path in extracted_paths:
@@ -788,8 +2941,9 @@ def extract_pdfs_from_zip(zip_path: str) -> List[str]:
                 destruction_securisee(path)
         return []
 
-def extract_pdfs_from_rar(rar_path: str) -> List[str]:
-    """Extrait tous les fichiers PDF d'un RAR et retourne leurs chemins temporaires."""
+@chronometre("extraction")
+def extract_pdfs_from_rar(rar_path: str, destination: str = UPLOAD_DIR) -> List[str]:
+    """Extrait tous les fichiers PDF d'un RAR dans destination et retourne leurs chemins temporaires."""
     extracted_paths = []
     try:
         with rarfile.RarFile(rar_path, 'r') as rar_ref:
@@ -798,13 +2952,14 @@ def extract_pdfs_from_rar(rar_path: str) -> List[str]:
                     # Extraire le PDF
                     extracted_name = os.path.basename(file_info.filename)
                     if extracted_name:  # Ignorer les dossiers
-                        temp_path = os.path.join(tempfile.gettempdir(), f"extracted_{uuid.uuid4()}_{extracted_name}")
+                        temp_path = os.path.join(destination, f"extracted_{uuid.uuid4()}_{extracted_name}")
                         with rar_ref.open(file_info) as source, open(temp_path, 'wb') as target:
                             target.write(source.read())
                         extracted_paths.append(temp_path)
                         logger.info(f"PDF extrait du RAR: {extracted_name}")
         return extracted_paths
     except Exception as e:
+        ECHECS.inc(stage="extraction")
         logger.error(f"Erreur extraction RAR: {str(e)}")
         # Nettoyer en cas d'erreur
         for path in extracted_paths:
@@ -812,209 +2967,856 @@ def extract_pdfs_from_rar(rar_path: str) -> List[str]:
                 destruction_securisee(path)
         return []
 
-# ===== ANALYSE ASYNCHRONE =====
-async def run_analysis_background(job_id: str, file_path: str, filename: str, file_size: int, ext: str, consent_ai_learning: bool):
-    """Exécute l'analyse en arrière-plan et met à jour le statut dans la base de données."""
-    chunk_paths = []
-    extracted_pdfs = []
+# ===== SYNTHÈSE MULTI-SEGMENTS (MAP-REDUCE) =====
+# Sections du rapport fusionné, dans l'ordre du gabarit, avec les mots-clés qui les identifient
+# dans les titres "## ..." produits pour chaque segment. Le premier mot-clé trouvé l'emporte.
+SECTIONS_RAPPORT = [
+    ("contradictions", "## 📊 TABLEAU RÉCAPITULATIF - SYNTHÈSE DES CONTRADICTIONS", ("récapitulatif", "synthèse des contradictions")),
+    ("resume", "## 1. 📝 RÉSUMÉ DU DOSSIER", ("résumé",)),
+    ("chronologie", "## 2. 📅 CHRONOLOGIE DÉTAILLÉE", ("chronologie",)),
+    ("preuves", "## 3. 🔬 PREUVES MÉDICALES OBJECTIVES", ("preuves médicales",)),
+    ("medecins", "## 4. 👨‍⚕️ MÉDECINS ET EXPERTS IDENTIFIÉS", ("médecins", "experts")),
+    ("incoherences", "## 5. ⚠️ ANALYSE CRITIQUE - INCOHÉRENCES DÉTECTÉES", ("analyse critique", "incohérences")),
+    ("bareme", "## 6. 💰 BARÈME INDEMNISATIONS APPLICABLE", ("barème",)),
+    ("questions", "## 7. ❓ QUESTIONS STRATÉGIQUES POUR L'AUDIENCE TAT", ("questions",)),
+    ("delais", "## 8. ⏰ DÉLAIS IMPORTANTS", ("délais",)),
+    ("actions", "## 9. 📌 ACTIONS RECOMMANDÉES", ("actions",)),
+    ("avertissement", "## ⚖️ AVERTISSEMENT LÉGAL", ("avertissement",)),
+]
+ORDRE_SECTIONS = [
+    "resume", "chronologie", "preuves", "medecins", "incoherences", "bareme",
+    "questions", "delais", "actions", "contradictions", "avertissement",
+]
+TITRES_SECTIONS = {cle: titre for cle, titre, _ in SECTIONS_RAPPORT}
+
+def identifier_section(titre: str) -> Optional[str]:
+    titre = titre.lower()
+    for cle, _, mots_cles in SECTIONS_RAPPORT:
+        if any(mot in titre for mot in mots_cles):
+            return cle
+    return None
+
+def normaliser_texte(texte: str) -> str:
+    return " ".join(texte.replace("*", "").lower().split())
+
+def cellules(ligne: str) -> List[str]:
+    return [c.strip() for c in ligne.strip().strip("|").split("|")]
+
+def extraire_constats(rapport: str, segment_num: int) -> dict:
+    """Map: réduit le rapport Markdown d'un segment à ses constats structurés.
+
+    Retourne {section: {"header": [...] ou None, "rows": [[...]], "lines": [...]}},
+    plus "notes" pour les segments sans rapport exploitable (erreurs, réponses vides).
+    """
+    constats = {}
+    section = None
+    for ligne in rapport.splitlines():
+        brut = ligne.strip()
+        if brut.startswith("## "):
+            section = identifier_section(brut)
+            continue
+        if section is None or not brut or brut == "---":
+            continue
+        bloc = constats.setdefault(section, {"header": None, "rows": [], "lines": []})
+        if brut.startswith("|"):
+            valeurs = cellules(brut)
+            if all(re.fullmatch(r":?-+:?", v) for v in valeurs if v):
+                continue  # ligne de séparation |---|---|
+            if bloc["header"] is None:
+                bloc["header"] = valeurs
+            elif valeurs != bloc["header"]:
+                bloc["rows"].append(valeurs)
+        elif section == "resume":
+            bloc["lines"].append(f"**Segment {segment_num}** — {brut}" if not bloc["lines"] else brut)
+        else:
+            bloc["lines"].append(brut)
     
+    if not constats:
+        constats["notes"] = {"header": None, "rows": [], "lines": [rapport.strip()[:500]]}
+    return constats
+
+def colonne_medecin(header: Optional[List[str]]) -> int:
+    entete = [normaliser_texte(c) for c in header or []]
+    return next((i for i, titre in enumerate(entete) if "médecin" in titre or "expert" in titre), 0)
+
+def cle_ligne(header: Optional[List[str]], row: List[str], section: Optional[str] = None) -> str:
+    if section == "medecins" and row:
+        # Un médecin revu dans plusieurs segments est une seule ligne, quelle que soit l'écriture du nom
+        i = colonne_medecin(header)
+        nom, prenom = separer_nom(row[i] if i < len(row) else "")
+        if nom:
+            return "medecin:" + cle_medecin(nom, prenom)
+    # La colonne "#" (numérotation) ne sert pas à reconnaître un doublon
+    valeurs = [v for i, v in enumerate(row) if not (header and i < len(header) and header[i] == "#")]
+    return normaliser_texte(" | ".join(valeurs))
+
+def fusionner_cellules(header: Optional[List[str]], gardee: List[str], autre: List[str]) -> List[str]:
+    """Complète une ligne du tableau des médecins avec ce qu'un autre segment en dit."""
+    fixes = {i for i, titre in enumerate(header or []) if titre == "#"} | {colonne_medecin(header)}
+    fusion = list(gardee) + [""] * (len(autre) - len(gardee))
+    for i, valeur in enumerate(autre):
+        if i in fixes or not valeur.strip():
+            continue
+        if not fusion[i].strip():
+            fusion[i] = valeur
+        elif normaliser_texte(valeur) not in normaliser_texte(fusion[i]):
+            fusion[i] = f"{fusion[i]}; {valeur}"
+    return fusion
+
+def fusionner_constats(a: dict, b: dict) -> dict:
+    """Reduce: fusionne deux ensembles de constats en éliminant les doublons."""
+    fusion = {}
+    for section in set(a) | set(b):
+        bloc_a = a.get(section, {"header": None, "rows": [], "lines": []})
+        bloc_b = b.get(section, {"header": None, "rows": [], "lines": []})
+        header = bloc_a["header"] or bloc_b["header"]
+        rows, positions = [], {}
+        for row in bloc_a["rows"] + bloc_b["rows"]:
+            cle = cle_ligne(header, row, section)
+            if cle not in positions:
+                positions[cle] = len(rows)
+                rows.append(row)
+            elif section == "medecins":
+                rows[positions[cle]] = fusionner_cellules(header, rows[positions[cle]], row)
+        lines, vues = [], set()
+        for line in bloc_a["lines"] + bloc_b["lines"]:
+            cle = normaliser_texte(line)
+            if cle not in vues:
+                vues.add(cle)
+                lines.append(line)
+        fusion[section] = {"header": header, "rows": rows, "lines": lines}
+    return fusion
+
+def reduire_constats(constats: List[dict]) -> dict:
+    """Fusion en arbre des constats, deux à deux, dans l'ordre des segments."""
+    niveau = list(constats)
+    while len(niveau) > 1:
+        suivant = [fusionner_constats(niveau[i], niveau[i + 1]) for i in range(0, len(niveau) - 1, 2)]
+        if len(niveau) % 2:
+            suivant.append(niveau[-1])
+        niveau = suivant
+    return niveau[0] if niveau else {}
+
+def cle_date(row: List[str]):
+    """Clé de tri chronologique à partir de la première cellule (JJ/MM/AAAA ou AAAA-MM-JJ)."""
+    premiere = row[0] if row else ""
+    m = re.search(r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})", premiere)
+    if m:
+        return (0, int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    m = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", premiere)
+    if m:
+        return (0, int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    return (1, 0, 0, 0)
+
+def rendre_synthese(constats: dict, total_segments: int) -> str:
+    """Construit le rapport unifié (une seule chronologie, un seul tableau des médecins, etc.)."""
+    parties = [
+        "# 📋 RAPPORT D'ANALYSE DÉFENSE - L'ÉCLAIREUR",
+        f"📄 **ANALYSE COMPLÈTE DU DOCUMENT** ({total_segments} segments fusionnés)",
+    ]
+    for section in ORDRE_SECTIONS:
+        bloc = constats.get(section)
+        if not bloc or not (bloc["rows"] or bloc["lines"]):
+            continue
+        contenu = []
+        header = bloc["header"]
+        rows = bloc["rows"]
+        if section == "chronologie" or section == "preuves":
+            rows = sorted(rows, key=cle_date)
+        if header:
+            if header[0] == "#":
+                rows = [[str(i)] + row[1:] for i, row in enumerate(rows, 1)]
+            contenu.append("| " + " | ".join(header) + " |")
+            contenu.append("|" + "|".join("---" for _ in header) + "|")
+            contenu.extend("| " + " | ".join(row) + " |" for row in rows)
+        if bloc["lines"]:
+            if contenu:
+                contenu.append("")
+            contenu.extend(bloc["lines"])
+        if section in ("contradictions", "avertissement"):
+            parties.append("---")
+        parties.append(TITRES_SECTIONS[section] + "\n" + "\n".join(contenu))
+    
+    notes = constats.get("notes")
+    if notes and notes["lines"]:
+        parties.append("## ⚠️ SEGMENTS NON ANALYSÉS\n" + "\n".join(f"- {line}" for line in notes["lines"]))
+    return "\n\n".join(parties) + "\n"
+
+def concatener_segments(analyses: List[str], total_segments: int) -> str:
+    """Ancienne combinaison: les rapports des segments mis bout à bout."""
+    combined = f"📄 **ANALYSE COMPLÈTE DU DOCUMENT** ({total_segments} segments)\n\n"
+    segments_text = []
+    for i, analysis in enumerate(analyses):
+        analysis_str = str(analysis) if analysis is not None else "[Segment non disponible]"
+        segments_text.append(f"### Segment {i+1}/{total_segments}\n\n{analysis_str}")
+    return combined + "---\n\n".join(segments_text)
+
+def assembler_rapport_partiel(analyses: List[str], total_segments: int) -> str:
+    """Rapport provisoire affiché pendant l'analyse: les segments terminés mis bout à bout."""
+    partial_analysis = f"📄 **ANALYSE EN COURS** ({len(analyses)}/{total_segments} segments complétés)\n\n"
+    partial_analysis += "---\n\n".join([
+        f"### Segment {j+1}/{total_segments}\n\n{str(a) if a else '[Non disponible]'}"
+        for j, a in enumerate(analyses)
+    ])
+    return anonymize_for_report(partial_analysis)
+
+async def synthese_segments(analyses: List[str]) -> str:
+    """Combine les rapports de plusieurs segments en un seul rapport unifié (map puis reduce en arbre)."""
+    total_segments = len(analyses)
+    if total_segments == 1:
+        return str(analyses[0]) if analyses[0] else "[Analyse non disponible]"
+    debut = time.perf_counter()
     try:
-        # Mettre à jour le statut
-        await db.analysis_jobs.update_one(
-            {"job_id": job_id},
-            {"$set": {"status": "in_progress", "message": "Analyse démarrée..."}}
-        )
-        
-        # Si c'est un ZIP ou RAR, extraire les PDFs
-        if ext == '.zip':
-            logger.info(f"[{job_id}] Fichier ZIP détecté, extraction des PDFs...")
-            extracted_pdfs = extract_pdfs_from_zip(file_path)
-            archive_type = "ZIP"
-        elif ext == '.rar':
-            logger.info(f"[{job_id}] Fichier RAR détecté, extraction des PDFs...")
-            extracted_pdfs = extract_pdfs_from_rar(file_path)
-            archive_type = "RAR"
-        else:
-            archive_type = None
+        constats = [extraire_constats(str(a) if a else "[Non disponible]", i) for i, a in enumerate(analyses, 1)]
+        fusion = reduire_constats(constats)
+        if set(fusion) <= {"notes"}:
+            # Aucun segment n'a produit de section reconnaissable
+            return concatener_segments(analyses, total_segments)
+        return rendre_synthese(fusion, total_segments)
+    except Exception as e:
+        ECHECS.inc(stage="synthesis")
+        logger.error(f"Erreur lors de la synthèse des segments: {str(e)}")
+        return concatener_segments(analyses, total_segments)
+    finally:
+        DUREE_ETAPES.observe(time.perf_counter() - debut, stage="synthesis")
+
+# ===== ÉVÉNEMENTS DE PROGRESSION (SSE) =====
+# "memory": bus en mémoire (un seul processus uvicorn)
+# "mongo": change streams MongoDB (plusieurs processus, nécessite un replica set)
+# "poll": relecture du job dans MongoDB (plusieurs processus, sans replica set); imposé en mode
+# distribué quand "memory" est configuré, car les mises à jour y sont publiées par les workers
+ANALYSIS_EVENTS_BACKEND = os.environ.get('ANALYSIS_EVENTS_BACKEND', 'memory')
+SSE_KEEPALIVE_INTERVAL = 15  # secondes
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', '1.0'))  # secondes, backend "poll"
+
+# Champs d'un job transmis aux abonnés (partial_analysis est exclu: seul le nouveau segment est envoyé)
+CHAMPS_EVENEMENT_JOB = (
+    "status", "progress", "current_segment", "total_segments", "message",
+    "report_id", "last_segment", "live_segment", "analysis", "duplicate_pages_removed",
+    "image_bytes_saved", "queue_position", "structured_data",
+)
+
+class AnalysisEventBus:
+    """Diffuse les mises à jour des jobs d'analyse aux abonnés du même processus."""
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[job_id]
+
+    def publish(self, job_id: str, event: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+
+analysis_events = AnalysisEventBus()
+
+def evenement_job(fields: dict) -> dict:
+    """Ne garde que les champs d'un job utiles aux abonnés."""
+    return {k: v for k, v in fields.items() if k in CHAMPS_EVENEMENT_JOB}
+
+async def update_job(job_id: str, fields: dict):
+    """Met à jour un job d'analyse et publie la modification aux abonnés."""
+    with mesurer_etape("mongo_write"):
+        await db.analysis_jobs.update_one({"job_id": job_id}, {"$set": fields})
+    event = evenement_job(fields)
+    if event:
+        analysis_events.publish(job_id, event)
+
+LIVE_SEGMENT_FLUSH_INTERVAL = 1.0  # secondes entre deux écritures MongoDB du segment en cours
+
+class LiveSegmentStream:
+    """Relaie le texte d'un segment en cours d'analyse vers les abonnés du job.
+
+    Seules les lignes complètes sont publiées, après anonymisation: un NAS ou un
+    numéro RAMQ coupé entre deux morceaux ne peut donc pas échapper au masquage.
+    La diffusion s'arrête au marqueur des données structurées (JSON non affiché).
+    Le texte cumulé est aussi écrit dans le job (au plus une fois par
+    LIVE_SEGMENT_FLUSH_INTERVAL) pour les abonnés par change stream et le polling.
+    """
+
+    def __init__(self, job_id: str, index: int):
+        self.job_id = job_id
+        self.index = index
+        self.attempt = None
+        self.text = ""
+        self.pending = ""
+        self.donnees = False
+        self.flushed_at = 0.0
+
+    async def __call__(self, delta: str, attempt: int):
+        if attempt != self.attempt:
+            # Nouvelle tentative: le texte déjà diffusé pour ce segment est abandonné
+            if self.attempt is not None:
+                analysis_events.publish(self.job_id, {"segment_reset": {"index": self.index}})
+            self.attempt = attempt
+            self.text = ""
+            self.pending = ""
+            self.donnees = False
+        if self.donnees:
+            return
         
-        if ext in ['.zip', '.rar']:
-            if not extracted_pdfs:
-                await db.analysis_jobs.update_one(
-                    {"job_id": job_id},
-                    {"$set": {"status": "failed", "message": f"Aucun fichier PDF trouvé dans le {archive_type}"}}
-                )
+        self.pending += delta
+        cut = self.pending.rfind("\n")
+        if cut == -1:
+            return
+        lines, self.pending = self.pending[:cut + 1], self.pending[cut + 1:]
+        marqueur = lines.find(MARQUEUR_DONNEES)
+        if marqueur != -1:
+            lines, self.donnees = lines[:marqueur], True
+            if not lines:
                 return
-            
-            # Pour simplifier, on traite tous les PDFs extraits comme un seul document
-            all_chunk_paths = []
-            for pdf_path in extracted_pdfs:
-                if os.path.getsize(pdf_path) > MAX_CHUNK_SIZE:
-                    all_chunk_paths.extend(split_pdf_into_chunks(pdf_path, MAX_CHUNK_SIZE))
-                else:
-                    all_chunk_paths.append(pdf_path)
-            chunk_paths = all_chunk_paths
-        else:
-            # Segmenter si PDF volumineux
-            if ext == '.pdf' and file_size > MAX_CHUNK_SIZE:
-                logger.info(f"[{job_id}] Fichier volumineux, segmentation en cours...")
-                chunk_paths = split_pdf_into_chunks(file_path, MAX_CHUNK_SIZE)
-            else:
-                chunk_paths = [file_path]
-        
-        total_segments = len(chunk_paths)
-        await db.analysis_jobs.update_one(
-            {"job_id": job_id},
-            {"$set": {"total_segments": total_segments, "message": f"Analyse de {total_segments} segments..."}}
-        )
+        lines = anonymize_for_report(lines)
+        self.text += lines
+        analysis_events.publish(self.job_id, {"segment_delta": {"index": self.index, "delta": lines}})
         
-        # Analyser chaque segment
-        all_analyses = []
-        for i, chunk_path in enumerate(chunk_paths, 1):
-            logger.info(f"[{job_id}] Analyse du segment {i}/{total_segments}...")
-            
-            # Mettre à jour la progression
-            progress = int((i - 1) / total_segments * 100)
+        if time.monotonic() - self.flushed_at >= LIVE_SEGMENT_FLUSH_INTERVAL:
+            self.flushed_at = time.monotonic()
             await db.analysis_jobs.update_one(
-                {"job_id": job_id},
-                {"$set": {
-                    "current_segment": i,
-                    "progress": progress,
-                    "message": f"Analyse du segment {i}/{total_segments}..."
-                }}
+                {"job_id": self.job_id},
+                {"$set": {"live_segment": {"index": self.index, "text": self.text}}}
             )
-            
-            segment_analysis = await analyze_pdf_segment(chunk_path, i, total_segments)
-            if segment_analysis:
-                all_analyses.append(segment_analysis)
-            else:
-                all_analyses.append(f"[Segment {i} - Analyse non disponible]")
-            
-            # Sauvegarder le rapport partiel après chaque segment
-            partial_analysis = f"📄 **ANALYSE EN COURS** ({i}/{total_segments} segments complétés)\n\n"
-            partial_analysis += "---\n\n".join([
-                f"### Segment {j+1}/{total_segments}\n\n{str(a) if a else '[Non disponible]'}" 
-                for j, a in enumerate(all_analyses)
-            ])
-            
-            await db.analysis_jobs.update_one(
-                {"job_id": job_id},
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+async def evenements_memoire(job_id: str, queue: asyncio.Queue, request: Request):
+    """Lit les mises à jour du job depuis le bus en mémoire."""
+    while not await request.is_disconnected():
+        try:
+            yield await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            yield None
+
+async def evenements_relecture(job: dict, request: Request):
+    """Relit le job dans MongoDB et produit les champs modifiés depuis la lecture précédente."""
+    etat = evenement_job(job)
+    silence = 0.0
+    while not await request.is_disconnected():
+        await asyncio.sleep(SSE_POLL_INTERVAL)
+        courant = await db.analysis_jobs.find_one({"job_id": job["job_id"]})
+        if courant is None:
+            yield {"status": "failed", "message": "Job d'analyse introuvable"}
+            return
+        courant = evenement_job(courant)
+        modifies = {k: v for k, v in courant.items() if etat.get(k) != v}
+        etat = courant
+        if modifies:
+            silence = 0.0
+            yield modifies
+            continue
+        silence += SSE_POLL_INTERVAL
+        if silence >= SSE_KEEPALIVE_INTERVAL:
+            silence = 0.0
+            yield None
+
+async def evenements_change_stream(document_id, request: Request):
+    """Lit les mises à jour du job depuis un change stream MongoDB."""
+    pipeline = [{"$match": {"operationType": "update", "documentKey._id": document_id}}]
+    async with db.analysis_jobs.watch(pipeline, max_await_time_ms=SSE_KEEPALIVE_INTERVAL * 1000) as stream:
+        while stream.alive and not await request.is_disconnected():
+            change = await stream.try_next()
+            yield evenement_job(change["updateDescription"]["updatedFields"]) if change else None
+
+# ===== PIPELINE D'ANALYSE =====
+# Moteur unique de /analyze, /analyze-async, /analyze-multiple et des workers:
+# ingest → extract → plan → analyze → reduce → anonymize → persist → destroy.
+# Chaque étape complète le ContexteAnalyse; le suivi (job, rapport partiel) est branché
+# sur le contexte, et la destruction s'exécute toujours, même après une erreur.
+PIPELINE_PLAN_CONCURRENCY = int(os.environ.get('PIPELINE_PLAN_CONCURRENCY', '2'))  # PDF découpés en parallèle par analyse
+PIPELINE_ANALYZE_CONCURRENCY = int(os.environ.get('PIPELINE_ANALYZE_CONCURRENCY', '1'))  # segments en vol par analyse
+
+class AnalyseImpossible(Exception):
+    """Dossier inexploitable (archive sans PDF): erreur du dossier, pas du serveur."""
+
+class DocumentAnalyse:
+    def __init__(self, nom: str, ext: str, chemin: Optional[str] = None):
+        self.nom = nom
+        self.ext = ext
+        self.chemin = chemin  # en clair, le temps de l'extraction et du découpage
+        self.segments = []
+
+class SegmentAnalyse:
+    """Segment chiffré dans le coffre du job; index dans l'analyse, rang dans son document."""
+
+    def __init__(self, document: DocumentAnalyse, blob_id: str, ext: str, index: int = 0, rang: int = 1, sur: int = 1):
+        self.document = document
+        self.blob_id = blob_id
+        self.ext = ext
+        self.index = index
+        self.rang = rang
+        self.sur = sur
+        self.analyse = None
+        self.donnees = None
+
+class SuiviAnalyse:
+    """Notifications du pipeline; sans effet par défaut."""
+
+    async def demarrage(self, ctx):
+        pass
+
+    async def planifie(self, ctx):
+        pass
+
+    def flux(self, ctx, segment):
+        return None
+
+    async def segment_demarre(self, ctx, segment):
+        pass
+
+    async def segment_termine(self, ctx, segment):
+        pass
+
+    async def termine(self, ctx):
+        pass
+
+class SuiviJob(SuiviAnalyse):
+    """Progression dans analysis_jobs: statut, rapport partiel et flux SSE."""
+
+    async def demarrage(self, ctx):
+        await update_job(ctx.job_id, {"status": "in_progress", "message": "Analyse démarrée...", "queue_position": None})
+
+    async def planifie(self, ctx):
+        message = f"Analyse de {ctx.total_segments} segments..."
+        if ctx.duplicate_pages_removed:
+            message += f" ({ctx.duplicate_pages_removed} page(s) en double ignorée(s))"
+        await update_job(ctx.job_id, {
+            "total_segments": ctx.total_segments,
+            "duplicate_pages_removed": ctx.duplicate_pages_removed,
+            "image_bytes_saved": ctx.image_bytes_saved,
+            "report_title": ctx.titre,
+            "message": message
+        })
+
+    def flux(self, ctx, segment):
+        return LiveSegmentStream(ctx.job_id, segment.index)
+
+    async def segment_demarre(self, ctx, segment):
+        logger.info(f"[{ctx.job_id}] Analyse du segment {segment.index}/{ctx.total_segments}...")
+        await update_job(ctx.job_id, {
+            "current_segment": segment.index,
+            "progress": int(len(ctx.analyses_terminees()) / ctx.total_segments * 100),
+            "message": f"Analyse du segment {segment.index}/{ctx.total_segments}..."
+        })
+
+    async def segment_termine(self, ctx, segment):
+        analyses = ctx.analyses_terminees()
+        await update_job(ctx.job_id, {
+            "partial_analysis": assembler_rapport_partiel(analyses, ctx.total_segments),
+            "last_segment": {"index": segment.index, "text": anonymize_for_report(segment.analyse)},
+            "live_segment": None,
+            "progress": int(len(analyses) / ctx.total_segments * 100)
+        })
+
+    async def termine(self, ctx):
+        await update_job(ctx.job_id, {
+            "status": "completed",
+            "progress": 100,
+            "current_segment": ctx.total_segments,
+            "analysis": ctx.report_analysis,
+            "structured_data": ctx.report_data,
+            "report_id": ctx.report_id,
+            "message": f"Analyse terminée ({ctx.total_segments} segments). Rapport disponible 15 minutes.",
+            "duplicate_pages_removed": ctx.duplicate_pages_removed,
+            "image_bytes_saved": ctx.image_bytes_saved,
+            "completed_at": datetime.now(timezone.utc)
+        })
+        logger.info(f"[{ctx.job_id}] Analyse terminée avec succès. Report ID: {ctx.report_id}")
+
+class SuiviRapportPartiel(SuiviAnalyse):
+    """/analyze synchrone: rapport partiel récupérable (temp_reports) si la connexion est perdue."""
+
+    def __init__(self):
+        self.report_id = str(uuid.uuid4())
+
+    async def segment_termine(self, ctx, segment):
+        analyses = ctx.analyses_terminees()
+        with mesurer_etape("mongo_write"):
+            await db.temp_reports.update_one(
+                {"report_id": self.report_id},
                 {"$set": {
-                    "partial_analysis": anonymize_for_report(partial_analysis),
-                    "progress": int(i / total_segments * 100)
-                }}
+                    "report_id": self.report_id,
+                    "filename": ctx.nom,
+                    "analysis": assembler_rapport_partiel(analyses, ctx.total_segments),
+                    "created_at": datetime.now(timezone.utc),
+                    "expires_at": datetime.now(timezone.utc).timestamp() + 900,
+                    "segments": len(analyses),
+                    "total_segments": ctx.total_segments,
+                    "status": "en_cours" if len(analyses) < ctx.total_segments else "termine"
+                }},
+                upsert=True
             )
-        
-        # Combiner les analyses finales
-        if total_segments > 1:
-            combined_analysis = f"📄 **ANALYSE COMPLÈTE DU DOCUMENT** ({total_segments} segments)\n\n"
-            segments_text = []
-            for i, analysis in enumerate(all_analyses):
-                analysis_str = str(analysis) if analysis is not None else "[Segment non disponible]"
-                segments_text.append(f"### Segment {i+1}/{total_segments}\n\n{analysis_str}")
-            combined_analysis += "---\n\n".join(segments_text)
-        else:
-            combined_analysis = str(all_analyses[0]) if all_analyses and all_analyses[0] else "[Analyse non disponible]"
-        
-        # Anonymisation
-        report_analysis = anonymize_for_report(combined_analysis)
-        
-        # Sauvegarder le rapport final
-        report_id = str(uuid.uuid4())
-        expiration = datetime.now(timezone.utc).timestamp() + 900  # 15 minutes
+        logger.info(f"Rapport partiel sauvegardé: {self.report_id} ({len(analyses)}/{ctx.total_segments})")
+
+class ContexteAnalyse:
+    """État d'une analyse transmis d'étape en étape.
+
+    reprise=True pour les tâches des workers: une tâche peut être reprise par un autre
+    worker, ses entrées chiffrées ne sont donc supprimées qu'une fois la tâche terminée.
+    """
+
+    def __init__(self, job_id: str, coffre: CoffreJob, nom: str = "", client: str = "",
+                 consent_ai_learning: bool = False, suivi: Optional[SuiviAnalyse] = None,
+                 rapport_combine: bool = False, reprise: bool = False):
+        self.job_id = job_id
+        self.coffre = coffre
+        self.nom = nom
+        self.client = client
+        self.consent_ai_learning = consent_ai_learning
+        self.suivi = suivi or SuiviAnalyse()
+        self.rapport_combine = rapport_combine
+        self.reprise = reprise
+        self.televersements = []  # (nom, contenu) pas encore chiffrés
+        self.sources = []  # (nom, blob_id)
+        self.documents = []
+        self.titre = None
+        self.travail = None
+        self.espace = None
+        self.duplicate_pages_removed = 0
+        self.image_bytes_saved = 0
+        self.combined_analysis = ""
+        self.report_analysis = ""
+        self.ai_analysis = ""
+        self.donnees = None
+        self.report_data = None
+        self.report_id = None
+        self.destruction_success = True
+
+    @property
+    def segments(self) -> List[SegmentAnalyse]:
+        return [segment for document in self.documents for segment in document.segments]
+
+    @property
+    def total_segments(self) -> int:
+        return len(self.segments)
+
+    def analyses_terminees(self) -> List[str]:
+        return [segment.analyse for segment in self.segments if segment.analyse is not None]
+
+    def espace_travail(self) -> EspaceTravail:
+        if self.espace is None:
+            self.espace = EspaceTravail()
+        return self.espace
+
+    async def consommer(self, blob_id: str):
+        """Supprime une entrée chiffrée devenue inutile (sauf tâche pouvant être reprise)."""
+        if not self.reprise:
+            await self.coffre.supprimer(blob_id)
+
+async def en_parallele(elements: list, traitement, concurrence: int) -> list:
+    """Applique traitement à chaque élément, au plus concurrence à la fois; la première erreur annule le reste."""
+    semaphore = asyncio.Semaphore(max(1, concurrence))
+
+    async def borne(element):
+        async with semaphore:
+            return await traitement(element)
+
+    taches = [asyncio.ensure_future(borne(element)) for element in elements]
+    try:
+        return await asyncio.gather(*taches)
+    except BaseException:
+        for tache in taches:
+            tache.cancel()
+        await asyncio.gather(*taches, return_exceptions=True)
+        raise
+
+async def etape_ingestion(ctx: ContexteAnalyse):
+    """Chiffre les fichiers téléversés: rien n'attend en clair."""
+    for nom, contenu in ctx.televersements:
+        ctx.sources.append((nom, await ctx.coffre.put(contenu)))
+    ctx.televersements = []
+
+def nom_pdf_extrait(chemin: str) -> str:
+    # extract_pdfs_from_* préfixent le nom d'origine par "extracted_<uuid>_"
+    return os.path.basename(chemin).split("_", 2)[-1]
+
+async def etape_extraction(ctx: ContexteAnalyse):
+    """Déchiffre les fichiers dans l'espace de travail et ouvre les archives: un document par PDF."""
+    await ctx.suivi.demarrage(ctx)
+    espace = ctx.espace_travail()
+    loop = asyncio.get_running_loop()
+    archive_type = None
+    for nom, blob_id in ctx.sources:
+        ext = get_file_extension(nom)
+        chemin = espace.fichier(ext)
+        await ctx.coffre.get_file(blob_id, chemin)
+        if ext not in ('.zip', '.rar'):
+            ctx.documents.append(DocumentAnalyse(nom, ext, chemin))
+            continue
+        archive_type = ext[1:].upper()
+        logger.info(f"[{ctx.job_id}] Fichier {archive_type} détecté, extraction des PDFs...")
+        extraire = extract_pdfs_from_zip if ext == '.zip' else extract_pdfs_from_rar
+        pdfs = await loop.run_in_executor(analysis_executor, extraire, chemin, espace.chemin)
+        espace.detruire_fichier(chemin)
+        if not pdfs:
+            raise AnalyseImpossible(f"Aucun fichier PDF trouvé dans le {archive_type}")
+        logger.info(f"[{ctx.job_id}] {len(pdfs)} PDF(s) extraits du {archive_type}")
+        ctx.documents.extend(DocumentAnalyse(nom_pdf_extrait(pdf), '.pdf', pdf) for pdf in pdfs)
+    
+    if ctx.rapport_combine:
+        ctx.titre = (f"# 📋 RAPPORT D'ANALYSE COMBINÉ - L'ÉCLAIREUR\n\n"
+                     f"**{len(ctx.documents)} document(s) analysé(s)**\n\n")
+    elif archive_type:
+        ctx.titre = f"# 📋 ANALYSE DE {len(ctx.documents)} DOCUMENT(S) ({archive_type})\n\n"
+
+async def planifier_document(ctx: ContexteAnalyse, document: DocumentAnalyse):
+    if document.ext == '.pdf':
+        # Dédupliquer, recompresser et segmenter
+        chemins, retirees, economises = await segmenter_pdf(document.chemin)
+        ctx.duplicate_pages_removed += retirees
+        ctx.image_bytes_saved += economises
+    else:
+        chemins = [document.chemin]
+    for rang, chemin in enumerate(chemins, 1):
+        blob_id = await ctx.coffre.put_file(chemin)
+        document.segments.append(SegmentAnalyse(document, blob_id, get_file_extension(chemin), rang=rang, sur=len(chemins)))
+
+async def etape_planification(ctx: ContexteAnalyse):
+    """Découpe chaque document en segments chiffrés, puis efface tout le clair."""
+    logger.info(f"[{ctx.job_id}] Déduplication, recompression et segmentation de {len(ctx.documents)} document(s)...")
+    await en_parallele(ctx.documents, lambda document: planifier_document(ctx, document), PIPELINE_PLAN_CONCURRENCY)
+    for index, segment in enumerate(ctx.segments, 1):
+        segment.index = index
+    for _, blob_id in ctx.sources:
+        await ctx.consommer(blob_id)
+    ctx.destruction_success = ctx.espace_travail().vider() and ctx.destruction_success
+    await ctx.suivi.planifie(ctx)
+
+async def analyser_segment(ctx: ContexteAnalyse, segment: SegmentAnalyse) -> Optional[str]:
+    """Analyse un segment à son tour: il n'est déchiffré qu'une fois son premier tour obtenu."""
+    await ctx.suivi.segment_demarre(ctx, segment)
+    tour = TourSegment(ordonnanceur_segments, ctx.travail)
+    chemin = None
+    try:
+        await tour.prendre()
+        chemin = ctx.espace_travail().fichier(segment.ext)
+        await ctx.coffre.get_file(segment.blob_id, chemin)
+        analyse = await analyze_pdf_segment(chemin, segment.rang, segment.sur, on_chunk=ctx.suivi.flux(ctx, segment),
+                                            tour=tour)
+    finally:
+        tour.rendre()
+        ctx.travail.termines += 1
+        if chemin is not None:
+            ctx.destruction_success = ctx.espace.detruire_fichier(chemin) and ctx.destruction_success
+    await ctx.consommer(segment.blob_id)
+    segment.analyse, segment.donnees = separer_donnees(analyse or f"[Segment {segment.index} - Analyse non disponible]")
+    await ctx.suivi.segment_termine(ctx, segment)
+    return analyse
+
+async def etape_analyse(ctx: ContexteAnalyse):
+    """Analyse les segments, à tour de rôle avec les analyses des autres clients."""
+    ctx.travail = TravailSegmente(ctx.client, ctx.job_id, ctx.total_segments)
+    await en_parallele(ctx.segments, lambda segment: analyser_segment(ctx, segment), PIPELINE_ANALYZE_CONCURRENCY)
+
+async def etape_reduction(ctx: ContexteAnalyse):
+    """Un rapport unifié: synthèse des segments, par document quand il y en a plusieurs."""
+    ctx.donnees = fusionner_donnees([segment.donnees for segment in ctx.segments])
+    if ctx.titre is None:
+        analyses = [segment.analyse for segment in ctx.segments]
+        ctx.combined_analysis = await synthese_segments(analyses) if analyses else "[Analyse non disponible]"
+        return
+    sections = []
+    for document in ctx.documents:
+        analyses = [segment.analyse for segment in document.segments]
+        texte = await synthese_segments(analyses) if analyses else "[Analyse non disponible]"
+        sections.append(f"## 📄 {document.nom}\n\n{texte}")
+    ctx.combined_analysis = ctx.titre + "\n\n---\n\n".join(sections)
+
+async def etape_anonymisation(ctx: ContexteAnalyse):
+    # Anonymisation légère pour le rapport, complète pour l'IA (si consentement)
+    ctx.report_analysis = anonymize_for_report(ctx.combined_analysis)
+    if ctx.donnees is not None:
+        ctx.report_data = anonymiser_donnees(ctx.donnees)
+    if ctx.consent_ai_learning:
+        ctx.ai_analysis = anonymize_for_ai_learning(ctx.combined_analysis)
+        logger.info("Version anonymisée créée pour apprentissage IA")
+
+async def etape_persistance(ctx: ContexteAnalyse):
+    """Rapport temporaire (15 minutes), clôture du suivi, puis médecins cités mis en file."""
+    ctx.report_id = str(uuid.uuid4())
+    with mesurer_etape("mongo_write"):
         await db.temp_reports.insert_one({
-            "report_id": report_id,
-            "filename": filename,
-            "analysis": report_analysis,
+            "report_id": ctx.report_id,
+            "filename": ctx.nom,
+            "analysis": ctx.report_analysis,
             "created_at": datetime.now(timezone.utc),
-            "expires_at": expiration,
-            "segments": total_segments,
+            "expires_at": datetime.now(timezone.utc).timestamp() + 900,
+            "segments": ctx.total_segments,
+            "structured_data": ctx.report_data,
             "status": "termine"
         })
+    await ctx.suivi.termine(ctx)
+    try:
+        # Le rapport est livré: l'enregistrement des médecins se fait en arrière-plan
+        await planifier_extraction_medecins((ctx.report_data or {}).get("medecins", []), ctx.report_analysis, ctx.nom)
+    except Exception as e:
+        ECHECS.inc(stage="medecins_extraction")
+        logger.error(f"[{ctx.job_id}] Mise en file de l'extraction des médecins impossible: {str(e)}")
+
+async def etape_destruction(ctx: ContexteAnalyse):
+    """Fichiers en clair, puis clé du job si ce processus la détient (crypto-effacement)."""
+    if ctx.espace is not None:
+        ctx.destruction_success = ctx.espace.fermer() and ctx.destruction_success
+    if ctx.coffre.proprietaire:
+        await ctx.coffre.detruire()
+
+class PipelineAnalyse:
+    """Étapes nommées exécutées dans l'ordre; les étapes finales s'exécutent toujours."""
+
+    def __init__(self, etapes: list, finales: tuple = ("destroy",)):
+        self.etapes = etapes
+        self.finales = finales
+
+    def remplacer(self, nom: str, fonction) -> "PipelineAnalyse":
+        return PipelineAnalyse([(n, fonction if n == nom else f) for n, f in self.etapes], self.finales)
+
+    async def executer(self, ctx: ContexteAnalyse, seulement: Optional[tuple] = None):
+        etapes = [(nom, fonction) for nom, fonction in self.etapes if seulement is None or nom in seulement]
+        try:
+            for nom, fonction in etapes:
+                if nom not in self.finales:
+                    with mesurer_etape(f"pipeline_{nom}"):
+                        await fonction(ctx)
+        except AnalyseImpossible:
+            raise
+        except Exception:
+            ECHECS.inc(stage="job")
+            raise
+        finally:
+            for nom, fonction in etapes:
+                if nom in self.finales:
+                    with mesurer_etape(f"pipeline_{nom}"):
+                        await fonction(ctx)
+
+PIPELINE_ANALYSE = PipelineAnalyse([
+    ("ingest", etape_ingestion),
+    ("extract", etape_extraction),
+    ("plan", etape_planification),
+    ("analyze", etape_analyse),
+    ("reduce", etape_reduction),
+    ("anonymize", etape_anonymisation),
+    ("persist", etape_persistance),
+    ("destroy", etape_destruction),
+])
+
+# ===== ANALYSE ASYNCHRONE =====
+async def run_analysis_background(ctx: ContexteAnalyse):
+    """Exécute l'analyse en arrière-plan; le statut est suivi dans analysis_jobs."""
+    try:
+        await PIPELINE_ANALYSE.executer(ctx)
+    except AnalyseImpossible as e:
+        await update_job(ctx.job_id, {"status": "failed", "message": str(e)})
+    except Exception as e:
+        logger.error(f"[{ctx.job_id}] Erreur lors de l'analyse: {str(e)}")
+        await update_job(ctx.job_id, {
+            "status": "failed",
+            "message": f"Erreur: {str(e)[:200]}"
+        })
+
+async def run_admitted_analysis(ticket: TicketAdmission, ctx: ContexteAnalyse):
+    """Attend la place réservée dans la file puis exécute l'analyse."""
+    try:
+        async with ticket:
+            await run_analysis_background(ctx)
+    finally:
+        # Job annulé avant d'avoir démarré (arrêt du serveur)
+        await ctx.coffre.detruire()
+
+async def start_background_analysis(contents: bytes, filename: str, consent_ai_learning: bool,
+                                    client: str) -> tuple[str, Optional[int]]:
+    """Chiffre le fichier, crée le job d'analyse et lance son traitement en arrière-plan.
+
+    Retourne l'ID du job et sa position dans la file d'attente (None s'il démarre tout de suite).
+    """
+    if ANALYSIS_MODE == "distributed":
+        return await enqueue_distributed_analysis(contents, filename, consent_ai_learning, client), None
+    
+    file_size = len(contents)
+    
+    # Créer un ID de job unique
+    job_id = str(uuid.uuid4())
+    
+    async def suivre_position(position: int):
+        await update_job(job_id, {"queue_position": position, "message": f"En file d'attente (position {position})..."})
+    
+    # Réserver une place avant d'écrire quoi que ce soit (429 si la file est pleine)
+    ticket = reserver_analyse("async", on_position=suivre_position)
+    queue_position = ticket.position() or None
+    
+    ctx = ContexteAnalyse(job_id, CoffreJob(job_id), filename, client, consent_ai_learning, SuiviJob())
+    ctx.televersements = [(filename, contents)]
+    try:
+        # Conserver le fichier chiffré pendant l'attente
+        with mesurer_etape("upload"):
+            await PIPELINE_ANALYSE.executer(ctx, seulement=("ingest",))
         
-        # Mettre à jour le job comme terminé
-        await db.analysis_jobs.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "completed",
-                "progress": 100,
-                "current_segment": total_segments,
-                "analysis": report_analysis,
-                "report_id": report_id,
-                "message": f"Analyse terminée ({total_segments} segments). Rapport disponible 15 minutes.",
-                "completed_at": datetime.now(timezone.utc)
-            }}
-        )
-        
-        logger.info(f"[{job_id}] Analyse terminée avec succès. Report ID: {report_id}")
-        
-    except Exception as e:
-        logger.error(f"[{job_id}] Erreur lors de l'analyse: {str(e)}")
-        await db.analysis_jobs.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "failed",
-                "message": f"Erreur: {str(e)[:200]}"
-            }}
-        )
-    finally:
-        # Destruction sécurisée
-        for chunk_path in chunk_paths:
-            if os.path.exists(chunk_path):
-                destruction_securisee(chunk_path)
-        for pdf_path in extracted_pdfs:
-            if os.path.exists(pdf_path):
-                destruction_securisee(pdf_path)
-        if os.path.exists(file_path):
-            destruction_securisee(file_path)
+        # Créer l'entrée du job dans la base de données
+        with mesurer_etape("mongo_write"):
+            await db.analysis_jobs.insert_one({
+                "job_id": job_id,
+                "filename": filename,
+                "file_size": file_size,
+                "status": "pending",
+                "progress": 0,
+                "current_segment": 0,
+                "total_segments": 0,
+                "queue_position": queue_position,
+                "message": f"En file d'attente (position {queue_position})..." if queue_position else "Analyse en attente...",
+                "created_at": datetime.now(timezone.utc),
+                "consent_ai_learning": consent_ai_learning
+            })
+    except BaseException:
+        ticket.annuler()
+        await ctx.coffre.detruire()
+        raise
+    
+    # Lancer l'analyse en arrière-plan
+    asyncio.create_task(run_admitted_analysis(ticket, ctx))
+    
+    logger.info(f"Analyse asynchrone lancée: {job_id} pour {filename}"
+                + (f" (file d'attente, position {queue_position})" if queue_position else ""))
+    return job_id, queue_position
 
 @api_router.post("/analyze-async", response_model=AsyncAnalysisResponse)
-async def analyze_document_async(file: UploadFile = File(...), consent_ai_learning: bool = False):
+async def analyze_document_async(request: Request, file: UploadFile = File(...), consent_ai_learning: bool = False):
     """Lance une analyse en arrière-plan et retourne immédiatement un ID de job."""
     
     if not is_accepted_format(file.filename):
         accepted = ", ".join(ACCEPTED_FORMATS.keys())
         raise HTTPException(status_code=400, detail=f"Format non accepté. Formats acceptés: {accepted}")
     
-    contents = await file.read()
+    with mesurer_etape("upload"):
+        contents = await file.read()
     file_size = len(contents)
     max_size = 100 * 1024 * 1024  # 100 Mo
     
     if file_size > max_size:
         raise HTTPException(status_code=400, detail="Le fichier dépasse la limite de 100 Mo")
     
-    # Créer un ID de job unique
-    job_id = str(uuid.uuid4())
-    
-    # Sauvegarder le fichier temporairement
-    ext = get_file_extension(file.filename)
-    tmp_path = os.path.join(tempfile.gettempdir(), f"analysis_{job_id}{ext}")
-    with open(tmp_path, 'wb') as f:
-        f.write(contents)
-    
-    # Créer l'entrée du job dans la base de données
-    await db.analysis_jobs.insert_one({
-        "job_id": job_id,
-        "filename": file.filename,
-        "file_size": file_size,
-        "status": "pending",
-        "progress": 0,
-        "current_segment": 0,
-        "total_segments": 0,
-        "message": "Analyse en attente...",
-        "created_at": datetime.now(timezone.utc),
-        "consent_ai_learning": consent_ai_learning
-    })
-    
-    # Lancer l'analyse en arrière-plan
-    asyncio.create_task(run_analysis_background(job_id, tmp_path, file.filename, file_size, ext, consent_ai_learning))
+    job_id, queue_position = await start_background_analysis(
+        contents, file.filename, consent_ai_learning, identifiant_client(request)
+    )
     
-    logger.info(f"Analyse asynchrone lancée: {job_id} pour {file.filename}")
+    if queue_position:
+        message = f"Analyse en file d'attente (position {queue_position}). Utilisez le lien de statut pour suivre la progression."
+    else:
+        message = "Analyse lancée en arrière-plan. Utilisez le lien de statut pour suivre la progression."
     
     return AsyncAnalysisResponse(
         success=True,
         job_id=job_id,
-        message="Analyse lancée en arrière-plan. Utilisez le lien de statut pour suivre la progression.",
-        status_url=f"/api/analyze-status/{job_id}"
+        message=message,
+        status_url=f"/api/analyze-status/{job_id}",
+        queue_position=queue_position
     )
 
 @api_router.get("/analyze-status/{job_id}", response_model=AnalysisStatusResponse)
@@ -1034,225 +3836,498 @@ async def get_analysis_status(job_id: str):
         filename=job.get("filename", ""),
         analysis=job.get("analysis") if job.get("status") == "completed" else job.get("partial_analysis"),
         message=job.get("message", ""),
-        report_id=job.get("report_id")
+        report_id=job.get("report_id"),
+        duplicate_pages_removed=job.get("duplicate_pages_removed", 0),
+        image_bytes_saved=job.get("image_bytes_saved", 0),
+        queue_position=job.get("queue_position"),
+        structured_data=job.get("structured_data")
+    )
+
+async def flux_evenements_job(job: dict, queue: Optional[asyncio.Queue], request: Request):
+    """Génère le flux SSE d'un job: un état initial puis les mises à jour jusqu'à la fin."""
+    job_id = job["job_id"]
+    try:
+        # État initial: le rapport partiel n'est envoyé qu'une seule fois
+        snapshot = evenement_job(job)
+        snapshot.pop("last_segment", None)
+        snapshot["job_id"] = job_id
+        snapshot["filename"] = job.get("filename", "")
+        snapshot["partial_analysis"] = job.get("partial_analysis")
+        yield format_sse("snapshot", snapshot)
+        if job.get("status") in ("completed", "failed"):
+            return
+        
+        if queue is not None:
+            events = evenements_memoire(job_id, queue, request)
+        elif ANALYSIS_EVENTS_BACKEND == "poll":
+            events = evenements_relecture(job, request)
+        else:
+            events = evenements_change_stream(job["_id"], request)
+        async for event in events:
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            if not event:
+                continue
+            yield format_sse("progress", event)
+            if event.get("status") in ("completed", "failed"):
+                return
+    finally:
+        if queue is not None:
+            analysis_events.unsubscribe(job_id, queue)
+
+@api_router.get("/analyze-events/{job_id}")
+async def stream_analysis_events(job_id: str, request: Request):
+    """Diffuse la progression d'une analyse en Server-Sent Events (remplace le polling de /analyze-status)."""
+    # S'abonner avant de lire l'état initial pour ne manquer aucune mise à jour
+    queue = analysis_events.subscribe(job_id) if ANALYSIS_EVENTS_BACKEND == "memory" else None
+    job = await db.analysis_jobs.find_one({"job_id": job_id})
+    if not job:
+        if queue is not None:
+            analysis_events.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Job d'analyse non trouvé")
+    
+    return StreamingResponse(
+        flux_evenements_job(job, queue, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ===== MODE DISTRIBUÉ (WORKERS DE SEGMENTS) =====
+# "local": l'analyse tourne dans le processus qui a reçu le fichier (défaut).
+# "distributed": l'API chiffre le fichier dans le stockage partagé et met une tâche en file;
+# des workers (python worker.py, sur autant de machines que voulu) réclament les tâches
+# dans MongoDB: préparation (extraction, déduplication, découpage), segments, puis synthèse.
+# Le stockage doit alors être partagé: BLOB_STORE=gridfs, ou un volume commun (BLOB_VOLUME_DIR).
+# La clé de chaque job circule chiffrée par BLOB_ENCRYPTION_KEY; la supprimer détruit le job.
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'local')
+if ANALYSIS_MODE == "distributed" and ANALYSIS_EVENTS_BACKEND == "memory":
+    # Les workers publient dans leur propre processus: le bus en mémoire de l'API resterait muet
+    logger.warning("Mode distribué: événements SSE par relecture des jobs (ANALYSIS_EVENTS_BACKEND=poll)")
+    ANALYSIS_EVENTS_BACKEND = "poll"
+BLOB_ENCRYPTION_KEY = os.environ.get('BLOB_ENCRYPTION_KEY', '')  # 32 octets en base64, identique sur tous les nœuds
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '2'))  # tâches simultanées par worker
+WORKER_LEASE_SECONDS = int(os.environ.get('WORKER_LEASE_SECONDS', '300'))
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', '1.0'))
+WORKER_MAX_ATTEMPTS = int(os.environ.get('WORKER_MAX_ATTEMPTS', '3'))
+DISTRIBUTED_SYNC_TIMEOUT = float(os.environ.get('DISTRIBUTED_SYNC_TIMEOUT', '1800'))  # attente max de /analyze, secondes
+DISTRIBUTED_MAX_QUEUE = int(os.environ.get('DISTRIBUTED_MAX_QUEUE', '50'))  # dossiers en attente avant 429
+
+def cle_maitre() -> AESGCM:
+    if not BLOB_ENCRYPTION_KEY:
+        raise RuntimeError("BLOB_ENCRYPTION_KEY est requis en mode distribué (32 octets encodés en base64)")
+    cle = base64.b64decode(BLOB_ENCRYPTION_KEY)
+    if len(cle) != 32:
+        raise RuntimeError("BLOB_ENCRYPTION_KEY doit faire 32 octets (AES-256)")
+    return AESGCM(cle)
+
+async def deposer_cle_job(coffre: CoffreJob):
+    """Partage la clé du job avec les workers, chiffrée par la clé maître (analysis_keys)."""
+    nonce = os.urandom(12)
+    enveloppe = nonce + cle_maitre().encrypt(nonce, coffre.cle, coffre.job_id.encode())
+    await db.analysis_keys.insert_one({
+        "job_id": coffre.job_id,
+        "key": base64.b64encode(enveloppe).decode(),
+        "created_at": datetime.now(timezone.utc)
+    })
+
+async def ouvrir_coffre(job_id: str) -> CoffreJob:
+    """Coffre d'un job côté worker; échoue si la clé a été détruite (job terminé ou annulé)."""
+    document = await db.analysis_keys.find_one({"job_id": job_id})
+    if not document:
+        raise RuntimeError(f"Clé du job {job_id} détruite")
+    enveloppe = base64.b64decode(document["key"])
+    return CoffreJob(job_id, cle_maitre().decrypt(enveloppe[:12], enveloppe[12:], job_id.encode()))
+
+async def creer_index_taches():
+    await db.analysis_tasks.create_index("task_id", unique=True)
+    await db.analysis_tasks.create_index([("status", 1), ("priority", 1), ("created_at", 1)])
+    await db.analysis_tasks.create_index([("job_id", 1), ("type", 1)])
+    await db.analysis_keys.create_index("job_id", unique=True)
+
+async def mettre_en_file(task_id: str, job_id: str, type_tache: str, priorite: int, **champs) -> bool:
+    """Ajoute une tâche (idempotent: une préparation reprise ne duplique pas ses segments).
+
+    Les petits dossiers passent d'abord: la priorité d'un segment est le nombre de
+    segments de son job. Retourne False si la tâche existait déjà.
+    """
+    resultat = await db.analysis_tasks.update_one(
+        {"task_id": task_id},
+        {"$setOnInsert": {
+            "task_id": task_id,
+            "job_id": job_id,
+            "type": type_tache,
+            "status": "queued",
+            "priority": priorite,
+            "attempts": 0,
+            "created_at": datetime.now(timezone.utc),
+            **champs
+        }},
+        upsert=True
+    )
+    return resultat.upserted_id is not None
+
+async def enqueue_distributed_analysis(contents: bytes, filename: str, consent_ai_learning: bool, client: str) -> str:
+    """Côté API: chiffre le fichier avec une nouvelle clé de job et crée le job et sa tâche de préparation."""
+    en_attente = await db.analysis_tasks.count_documents({"type": "prepare", "status": "queued"})
+    if en_attente >= DISTRIBUTED_MAX_QUEUE:
+        ADMISSIONS_REFUSEES.inc(kind="distributed")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Trop d'analyses en attente. Veuillez réessayer dans {ANALYSIS_RETRY_AFTER} secondes.",
+            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)}
+        )
+
+    job_id = str(uuid.uuid4())
+    # Clé fournie: son cycle de vie appartient aux workers (analysis_keys), pas à ce processus
+    coffre = CoffreJob(job_id, AESGCM.generate_key(bit_length=256))
+    await deposer_cle_job(coffre)
+    with mesurer_etape("upload"):
+        blob_id = await coffre.put(contents)
+
+    with mesurer_etape("mongo_write"):
+        await db.analysis_jobs.insert_one({
+            "job_id": job_id,
+            "filename": filename,
+            "file_size": len(contents),
+            "status": "pending",
+            "progress": 0,
+            "current_segment": 0,
+            "total_segments": 0,
+            "message": "Analyse en attente d'un worker...",
+            "created_at": datetime.now(timezone.utc),
+            "consent_ai_learning": consent_ai_learning
+        })
+    await mettre_en_file(f"{job_id}-prepare", job_id, "prepare", 0, blob_id=blob_id, filename=filename,
+                         ext=get_file_extension(filename), client=client)
+
+    logger.info(f"Analyse distribuée mise en file: {job_id} pour {filename}")
+    return job_id
+
+async def analyse_distribuee_synchrone(contents: bytes, filename: str, consent_ai_learning: bool,
+                                       client: str) -> AnalysisResponse:
+    """/analyze en mode distribué: met le dossier en file et attend que les workers le terminent.
+
+    Au-delà de DISTRIBUTED_SYNC_TIMEOUT, répond 504 avec le job_id: l'analyse continue et se
+    suit par /analyze-status.
+    """
+    job_id = await enqueue_distributed_analysis(contents, filename, consent_ai_learning, client)
+    limite = time.monotonic() + DISTRIBUTED_SYNC_TIMEOUT
+    while True:
+        await asyncio.sleep(WORKER_POLL_INTERVAL)
+        job = await db.analysis_jobs.find_one({"job_id": job_id})
+        if job is None:
+            raise HTTPException(status_code=500, detail="Erreur lors de l'analyse: job d'analyse introuvable")
+        if job.get("status") in ("completed", "failed"):
+            break
+        if time.monotonic() >= limite:
+            logger.warning(f"[{job_id}] /analyze distribué: délai d'attente dépassé, suivi par /analyze-status")
+            raise HTTPException(
+                status_code=504,
+                detail=f"Analyse toujours en cours (job {job_id}). Suivez-la sur /api/analyze-status/{job_id}.",
+                headers={"Location": f"/api/analyze-status/{job_id}", "X-Job-Id": job_id}
+            )
+
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {job.get('message', '')}")
+
+    analysis = job.get("analysis", "")
+    return AnalysisResponse(
+        success=True,
+        filename=filename,
+        file_size=len(contents),
+        analysis=analysis,
+        anonymized_for_ai=anonymize_for_ai_learning(analysis) if consent_ai_learning else "",
+        message=job.get("message", ""),
+        segments_analyzed=job.get("total_segments", 1),
+        duplicate_pages_removed=job.get("duplicate_pages_removed", 0),
+        image_bytes_saved=job.get("image_bytes_saved", 0),
+        destruction_confirmed=True,
+        report_id=job.get("report_id"),
+        structured_data=job.get("structured_data")
+    )
+
+async def reclamer_tache(worker_id: str) -> Optional[dict]:
+    """Réserve la prochaine tâche (ou une tâche dont le worker a disparu) pour WORKER_LEASE_SECONDS."""
+    maintenant = datetime.now(timezone.utc)
+    return await db.analysis_tasks.find_one_and_update(
+        {"$or": [{"status": "queued"}, {"status": "running", "lease_until": {"$lt": maintenant}}]},
+        {
+            "$set": {
+                "status": "running",
+                "worker": worker_id,
+                "lease_until": maintenant + timedelta(seconds=WORKER_LEASE_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("priority", 1), ("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def prolonger_bail(tache: dict, worker_id: str):
+    """Renouvelle la réservation tant que la tâche tourne (un segment peut dépasser le bail)."""
+    while True:
+        await asyncio.sleep(WORKER_LEASE_SECONDS / 3)
+        await db.analysis_tasks.update_one(
+            {"task_id": tache["task_id"], "worker": worker_id, "status": "running"},
+            {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=WORKER_LEASE_SECONDS)}}
+        )
+
+async def terminer_tache(tache: dict, worker_id: str, **champs) -> bool:
+    """Marque la tâche terminée; False si le bail a été perdu et la tâche reprise par un autre worker."""
+    resultat = await db.analysis_tasks.update_one(
+        {"task_id": tache["task_id"], "worker": worker_id, "status": "running"},
+        {"$set": {"status": "done", **champs}}
     )
+    return resultat.modified_count == 1
+
+async def nettoyer_taches_job(job_id: str):
+    """Détruit la clé d'un job terminé ou en échec (crypto-effacement), puis ses blobs et ses tâches."""
+    await db.analysis_keys.delete_one({"job_id": job_id})
+    stockage = obtenir_stockage_blobs()
+    async for tache in db.analysis_tasks.find({"job_id": job_id}):
+        for champ in ("blob_id", "result_blob_id"):
+            if tache.get(champ):
+                await stockage.supprimer(tache[champ])
+    await db.analysis_tasks.delete_many({"job_id": job_id})
+
+async def tache_preparation(tache: dict, worker_id: str):
+    """Récupère le dossier, le découpe et met un segment en file par morceau."""
+    job_id = tache["job_id"]
+    ctx = ContexteAnalyse(job_id, await ouvrir_coffre(job_id), tache["filename"], tache.get("client", ""),
+                          suivi=SuiviJob(), reprise=True)
+    ctx.sources = [(tache["filename"], tache["blob_id"])]
+    try:
+        await PIPELINE_ANALYSE.executer(ctx, seulement=("extract", "plan", "destroy"))
+    except AnalyseImpossible as e:
+        await update_job(job_id, {"status": "failed", "message": str(e)})
+        await terminer_tache(tache, worker_id)
+        await nettoyer_taches_job(job_id)
+        return
+
+    total = ctx.total_segments
+    for numero, document in enumerate(ctx.documents):
+        for segment in document.segments:
+            ajoute = await mettre_en_file(
+                f"{job_id}-segment-{segment.index}", job_id, "segment", total, blob_id=segment.blob_id,
+                index=segment.index, total=total, rang=segment.rang, sur=segment.sur, document=numero,
+                document_name=document.nom, ext=segment.ext, client=ctx.client
+            )
+            if not ajoute:
+                await ctx.coffre.supprimer(segment.blob_id)
+
+    if await terminer_tache(tache, worker_id):
+        await ctx.coffre.supprimer(tache["blob_id"])
+    logger.info(f"[{job_id}] {total} segment(s) mis en file par {worker_id}")
+
+async def enregistrer_segment(tache: dict, worker_id: str, analyse: Optional[str]):
+    """Stocke le résultat chiffré d'un segment et lance la synthèse après le dernier."""
+    job_id = tache["job_id"]
+    coffre = await ouvrir_coffre(job_id)
+    champs = {}
+    if analyse:
+        champs["result_blob_id"] = await coffre.put(analyse.encode("utf-8"))
+    if not await terminer_tache(tache, worker_id, **champs):
+        if analyse:
+            await coffre.supprimer(champs["result_blob_id"])
+        return
+    await coffre.supprimer(tache["blob_id"])
+
+    total = tache["total"]
+    termines = await db.analysis_tasks.count_documents({"job_id": job_id, "type": "segment", "status": "done"})
+    texte = analyse or f"[Segment {tache['index']} - Analyse non disponible]"
+    await update_job(job_id, {
+        "current_segment": termines,
+        "progress": int(termines / total * 100),
+        "message": f"{termines}/{total} segment(s) analysé(s)...",
+        "last_segment": {"index": tache["index"], "text": anonymize_for_report(separer_donnees(texte)[0])}
+    })
+    if termines == total:
+        await mettre_en_file(f"{job_id}-finalize", job_id, "finalize", 0)
+
+def segment_de_tache(tache: dict) -> SegmentAnalyse:
+    document = DocumentAnalyse(tache.get("document_name", ""), tache["ext"])
+    return SegmentAnalyse(document, tache["blob_id"], tache["ext"], tache["index"],
+                          tache.get("rang", tache["index"]), tache.get("sur", tache["total"]))
+
+async def tache_segment(tache: dict, worker_id: str):
+    job_id = tache["job_id"]
+    ctx = ContexteAnalyse(job_id, await ouvrir_coffre(job_id), client=tache.get("client", ""), reprise=True)
+    ctx.travail = TravailSegmente(ctx.client, job_id, tache["total"])
+    try:
+        analyse = await analyser_segment(ctx, segment_de_tache(tache))
+    finally:
+        await etape_destruction(ctx)
+    await enregistrer_segment(tache, worker_id, analyse)
+
+async def tache_synthese(tache: dict, worker_id: str):
+    """Rassemble les segments dans l'ordre des pages, produit le rapport et supprime les blobs."""
+    job_id = tache["job_id"]
+    job = await db.analysis_jobs.find_one({"job_id": job_id})
+    if job and job.get("status") != "completed":
+        ctx = ContexteAnalyse(job_id, await ouvrir_coffre(job_id), job["filename"],
+                              consent_ai_learning=job.get("consent_ai_learning", False), suivi=SuiviJob(), reprise=True)
+        ctx.titre = job.get("report_title")
+        ctx.duplicate_pages_removed = job.get("duplicate_pages_removed", 0)
+        ctx.image_bytes_saved = job.get("image_bytes_saved", 0)
+        documents = {}
+        async for segment_tache in db.analysis_tasks.find({"job_id": job_id, "type": "segment"}).sort("index", 1):
+            segment = segment_de_tache(segment_tache)
+            if segment_tache.get("result_blob_id"):
+                segment.analyse, segment.donnees = separer_donnees(
+                    (await ctx.coffre.get(segment_tache["result_blob_id"])).decode("utf-8"))
+            else:
+                segment.analyse = f"[Segment {segment.index} - Analyse non disponible]"
+            numero = segment_tache.get("document", 0)
+            if numero not in documents:
+                documents[numero] = segment.document
+            segment.document = documents[numero]
+            segment.document.segments.append(segment)
+        ctx.documents = [documents[numero] for numero in sorted(documents)]
+        await PIPELINE_ANALYSE.executer(ctx, seulement=("reduce", "anonymize", "persist", "destroy"))
+    await terminer_tache(tache, worker_id)
+    await nettoyer_taches_job(job_id)
+
+TRAITEMENTS_TACHES = {
+    "prepare": tache_preparation,
+    "segment": tache_segment,
+    "finalize": tache_synthese,
+}
+
+async def abandonner_tache(tache: dict, worker_id: str, raison: str):
+    """Tentatives épuisées: un segment est marqué indisponible, un autre type de tâche fait échouer le job."""
+    logger.error(f"[{tache['job_id']}] Tâche {tache['task_id']} abandonnée: {raison[:200]}")
+    if tache["type"] == "segment":
+        await enregistrer_segment(tache, worker_id, None)
+        return
+    await update_job(tache["job_id"], {"status": "failed", "message": f"Erreur: {raison[:200]}"})
+    await nettoyer_taches_job(tache["job_id"])
+
+async def executer_tache(tache: dict, worker_id: str):
+    bail = asyncio.create_task(prolonger_bail(tache, worker_id))
+    try:
+        if tache["attempts"] > WORKER_MAX_ATTEMPTS:
+            await abandonner_tache(tache, worker_id, "nombre maximal de tentatives atteint")
+        else:
+            await TRAITEMENTS_TACHES[tache["type"]](tache, worker_id)
+    except Exception as e:
+        raison = str(e) or type(e).__name__
+        logger.error(f"[{tache['job_id']}] Échec de la tâche {tache['task_id']} "
+                     f"(tentative {tache['attempts']}/{WORKER_MAX_ATTEMPTS}): {raison[:200]}")
+        ECHECS.inc(stage=f"worker_{tache['type']}")
+        if tache["attempts"] >= WORKER_MAX_ATTEMPTS:
+            await abandonner_tache(tache, worker_id, raison)
+        else:
+            await db.analysis_tasks.update_one(
+                {"task_id": tache["task_id"], "worker": worker_id},
+                {"$set": {"status": "queued", "lease_until": None}}
+            )
+    finally:
+        bail.cancel()
+
+async def boucle_worker(worker_id: str):
+    while True:
+        try:
+            tache = await reclamer_tache(worker_id)
+            if tache is None:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+            with JOBS_ACTIFS.suivre(kind=f"worker_{tache['type']}"):
+                await executer_tache(tache, worker_id)
+        except Exception as e:
+            # MongoDB ou stockage indisponible: la tâche sera reprise à l'expiration du bail
+            logger.error(f"Worker {worker_id}: {str(e)[:200]}")
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+async def executer_worker():
+    """Point d'entrée des workers (worker.py): réclame et exécute les tâches jusqu'à l'arrêt."""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    cle_maitre()
+    executeur_cpu()
+    await creer_index_taches()
+    await creer_index_medecins()
+    logger.info(f"Worker {worker_id} démarré ({WORKER_CONCURRENCY} tâche(s) simultanée(s), stockage {BLOB_STORE})")
+    # Les synthèses des workers alimentent la file d'extraction des médecins: ils la consomment aussi
+    extracteur_medecins.start()
+    try:
+        await asyncio.gather(*(boucle_worker(worker_id) for _ in range(WORKER_CONCURRENCY)))
+    finally:
+        await extracteur_medecins.stop()
+        arreter_executeur_cpu()
+        client.close()
 
 # ===== ANCIEN ENDPOINT (gardé pour compatibilité) =====
 @api_router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_document(file: UploadFile = File(...), consent_ai_learning: bool = False):
-    """Analyse un document et retourne un rapport de défense."""
+async def analyze_document(request: Request, file: UploadFile = File(...), consent_ai_learning: bool = False,
+                           stream: bool = False):
+    """Analyse un document et retourne un rapport de défense.
+
+    Avec stream=true, la réponse est un flux Server-Sent Events: progression,
+    texte du segment en cours au fil de la génération, puis le rapport final.
+    """
     
-    contents = await file.read()
+    with mesurer_etape("upload"):
+        contents = await file.read()
     file_size = len(contents)
     max_size = 100 * 1024 * 1024  # 100 Mo
     
     if file_size > max_size:
         raise HTTPException(status_code=400, detail="Le fichier dépasse la limite de 100 Mo")
     
-    # Acquérir le verrou pour empêcher les analyses parallèles
-    async with analysis_lock:
+    if stream:
+        if not is_accepted_format(file.filename):
+            accepted = ", ".join(ACCEPTED_FORMATS.keys())
+            raise HTTPException(status_code=400, detail=f"Format non accepté. Formats acceptés: {accepted}")
+        job_id, _ = await start_background_analysis(
+            contents, file.filename, consent_ai_learning, identifiant_client(request)
+        )
+        # En mode mongo, le change stream suit le job créé par ce même processus
+        queue = analysis_events.subscribe(job_id) if ANALYSIS_EVENTS_BACKEND == "memory" else None
+        job = await db.analysis_jobs.find_one({"job_id": job_id})
+        return StreamingResponse(
+            flux_evenements_job(job, queue, request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    if ANALYSIS_MODE == "distributed":
+        # L'attente du résultat occupe une place d'analyse, comme une analyse locale
+        async with reserver_analyse("sync"):
+            return await analyse_distribuee_synchrone(contents, file.filename, consent_ai_learning,
+                                                      identifiant_client(request))
+    
+    # Attendre une place d'analyse (429 immédiat si la file d'attente est pleine)
+    async with reserver_analyse("sync"):
         this_analysis_id = str(uuid.uuid4())
-        current_analysis_id = this_analysis_id
         logger.info(f"Début analyse {this_analysis_id}: {file.filename} ({file_size / (1024*1024):.2f} Mo)")
-        
-        chunk_paths = []
-        tmp_path = None
-        extracted_pdfs = []
+        ctx = ContexteAnalyse(this_analysis_id, CoffreJob(this_analysis_id), file.filename, identifiant_client(request),
+                              consent_ai_learning, SuiviRapportPartiel())
+        ctx.televersements = [(file.filename, contents)]
         
         try:
-            # Sauvegarder temporairement
-            ext = get_file_extension(file.filename)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp_file:
-                tmp_file.write(contents)
-                tmp_path = tmp_file.name
-            
-            # Si c'est un ZIP ou RAR, extraire les PDFs
-            if ext == '.zip':
-                logger.info("Fichier ZIP détecté, extraction des PDFs...")
-                extracted_pdfs = extract_pdfs_from_zip(tmp_path)
-                archive_type = "ZIP"
-            elif ext == '.rar':
-                logger.info("Fichier RAR détecté, extraction des PDFs...")
-                extracted_pdfs = extract_pdfs_from_rar(tmp_path)
-                archive_type = "RAR"
-            else:
-                archive_type = None
-            
-            if ext in ['.zip', '.rar']:
-                if not extracted_pdfs:
-                    raise HTTPException(status_code=400, detail=f"Aucun fichier PDF trouvé dans le {archive_type}")
-                logger.info(f"{len(extracted_pdfs)} PDF(s) extraits du {archive_type}")
-                
-                # Analyser chaque PDF extrait
-                all_analyses = []
-                total_files = len(extracted_pdfs)
-                
-                for file_idx, pdf_path in enumerate(extracted_pdfs, 1):
-                    pdf_name = os.path.basename(pdf_path)
-                    pdf_size = os.path.getsize(pdf_path)
-                    logger.info(f"Analyse du PDF {file_idx}/{total_files}: {pdf_name}")
-                    
-                    # Segmenter si nécessaire
-                    if pdf_size > MAX_CHUNK_SIZE:
-                        pdf_chunks = split_pdf_into_chunks(pdf_path, MAX_CHUNK_SIZE)
-                    else:
-                        pdf_chunks = [pdf_path]
-                    
-                    chunk_paths.extend(pdf_chunks)
-                    
-                    # Analyser les segments de ce PDF
-                    pdf_analyses = []
-                    for seg_idx, chunk_path in enumerate(pdf_chunks, 1):
-                        analysis = await analyze_pdf_segment(chunk_path, seg_idx, len(pdf_chunks))
-                        # Filtrer les résultats None
-                        if analysis:
-                            pdf_analyses.append(analysis)
-                        else:
-                            pdf_analyses.append(f"[Segment {seg_idx} - Analyse non disponible]")
-                    
-                    if len(pdf_chunks) > 1:
-                        # S'assurer que tous les éléments sont des chaînes
-                        safe_analyses = [str(a) if a is not None else "[Analyse non disponible]" for a in pdf_analyses]
-                        combined = f"## 📄 {pdf_name}\n\n" + "\n---\n".join(safe_analyses)
-                    else:
-                        first_analysis = str(pdf_analyses[0]) if pdf_analyses and pdf_analyses[0] else '[Analyse non disponible]'
-                        combined = f"## 📄 {pdf_name}\n\n{first_analysis}"
-                    
-                    all_analyses.append(combined)
-                
-                # S'assurer que tous les éléments sont des chaînes avant le join
-                safe_all_analyses = [str(a) if a is not None else "[Analyse non disponible]" for a in all_analyses]
-                combined_analysis = f"# 📋 ANALYSE DE {total_files} DOCUMENT(S) ({archive_type})\n\n"
-                combined_analysis += "\n\n---\n\n".join(safe_all_analyses)
-                total_segments = len(chunk_paths)
-            
-            else:
-                # Traitement normal pour les autres fichiers
-                # Segmenter si PDF volumineux
-                if ext == '.pdf' and file_size > MAX_CHUNK_SIZE:
-                    logger.info(f"Fichier volumineux, segmentation en cours...")
-                    chunk_paths = split_pdf_into_chunks(tmp_path, MAX_CHUNK_SIZE)
-                else:
-                    chunk_paths = [tmp_path]
-                
-                # Créer un ID de rapport pour sauvegarde progressive
-                progress_report_id = str(uuid.uuid4())
-                
-                # Analyser chaque segment et sauvegarder progressivement
-                all_analyses = []
-                total_segments = len(chunk_paths)
-                
-                for i, chunk_path in enumerate(chunk_paths, 1):
-                    logger.info(f"Analyse du segment {i}/{total_segments}...")
-                    segment_analysis = await analyze_pdf_segment(chunk_path, i, total_segments)
-                    # Filtrer les résultats None
-                    if segment_analysis:
-                        all_analyses.append(segment_analysis)
-                    else:
-                        all_analyses.append(f"[Segment {i} - Analyse non disponible]")
-                    
-                    # Sauvegarder le rapport partiel après chaque segment
-                    partial_analysis = f"📄 **ANALYSE EN COURS** ({i}/{total_segments} segments complétés)\n\n"
-                    partial_analysis += "---\n\n".join([
-                        f"### Segment {j+1}/{total_segments}\n\n{str(a) if a else '[Non disponible]'}" 
-                        for j, a in enumerate(all_analyses)
-                    ])
-                    
-                    await db.temp_reports.update_one(
-                        {"report_id": progress_report_id},
-                        {"$set": {
-                            "report_id": progress_report_id,
-                            "filename": file.filename,
-                            "analysis": anonymize_for_report(partial_analysis),
-                            "created_at": datetime.now(timezone.utc),
-                            "expires_at": datetime.now(timezone.utc).timestamp() + 900,
-                            "segments": i,
-                            "total_segments": total_segments,
-                            "status": "en_cours" if i < total_segments else "termine"
-                        }},
-                        upsert=True
-                    )
-                    logger.info(f"Rapport partiel sauvegardé: {progress_report_id} ({i}/{total_segments})")
-                
-                # Combiner les analyses avec protection contre None
-                if total_segments > 1:
-                    combined_analysis = f"📄 **ANALYSE COMPLÈTE DU DOCUMENT** ({total_segments} segments)\n\n"
-                    try:
-                        segments_text = []
-                        for i, analysis in enumerate(all_analyses):
-                            # S'assurer que chaque analyse est une chaîne
-                            analysis_str = str(analysis) if analysis is not None else "[Segment non disponible]"
-                            segments_text.append(f"### Segment {i+1}/{total_segments}\n\n{analysis_str}")
-                        combined_analysis += "---\n\n".join(segments_text)
-                    except Exception as join_error:
-                        logger.error(f"Erreur lors de la combinaison: {str(join_error)}")
-                        combined_analysis += "[Erreur lors de la combinaison des segments]"
-                else:
-                    combined_analysis = str(all_analyses[0]) if all_analyses and all_analyses[0] else "[Analyse non disponible]"
-            
-            # Anonymisation pour le rapport (légère)
-            report_analysis = anonymize_for_report(combined_analysis)
-            
-            # Anonymisation complète pour l'IA (si consentement)
-            ai_analysis = ""
-            if consent_ai_learning:
-                ai_analysis = anonymize_for_ai_learning(combined_analysis)
-                logger.info("Version anonymisée créée pour apprentissage IA")
-            
-            # Extraire les médecins
-            await extract_and_update_medecins(combined_analysis, file.filename)
-            
-            # DESTRUCTION SÉCURISÉE DOD 5220.22-M
-            destruction_success = True
-            for chunk_path in chunk_paths:
-                if os.path.exists(chunk_path):
-                    destruction_success = destruction_securisee(chunk_path) and destruction_success
-            # Détruire les PDFs extraits du ZIP
-            for pdf_path in extracted_pdfs:
-                if os.path.exists(pdf_path):
-                    destruction_success = destruction_securisee(pdf_path) and destruction_success
-            if tmp_path and os.path.exists(tmp_path) and tmp_path not in chunk_paths:
-                destruction_success = destruction_securisee(tmp_path) and destruction_success
-            
-            logger.info(f"Analyse terminée pour: {file.filename} - Destruction sécurisée: {destruction_success}")
-            
-            # Sauvegarder temporairement le rapport (15 minutes) pour permettre récupération
-            report_id = str(uuid.uuid4())
-            expiration = datetime.now(timezone.utc).timestamp() + 900  # 15 minutes
-            await db.temp_reports.insert_one({
-                "report_id": report_id,
-                "filename": file.filename,
-                "analysis": report_analysis,
-                "created_at": datetime.now(timezone.utc),
-                "expires_at": expiration,
-                "segments": total_segments
-            })
-            logger.info(f"Rapport sauvegardé temporairement: {report_id}")
-            
-            return AnalysisResponse(
-                success=True,
-                filename=file.filename,
-                file_size=file_size,
-                analysis=report_analysis,
-                anonymized_for_ai=ai_analysis,
-                message=f"Analyse terminée ({total_segments} segment{'s' if total_segments > 1 else ''}). Rapport disponible 15 minutes.",
-                segments_analyzed=total_segments,
-                destruction_confirmed=destruction_success,
-                report_id=report_id
-            )
-            
+            await PIPELINE_ANALYSE.executer(ctx)
+        except AnalyseImpossible as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.error(f"Erreur lors de l'analyse: {str(e)}")
-            # Destruction sécurisée en cas d'erreur
-            for chunk_path in chunk_paths:
-                if os.path.exists(chunk_path):
-                    destruction_securisee(chunk_path)
-            for pdf_path in extracted_pdfs:
-                if os.path.exists(pdf_path):
-                    destruction_securisee(pdf_path)
-            if tmp_path and os.path.exists(tmp_path):
-                destruction_securisee(tmp_path)
             raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+        
+        logger.info(f"Analyse terminée pour: {file.filename} - Destruction sécurisée: {ctx.destruction_success}")
+        total_segments = ctx.total_segments
+        return AnalysisResponse(
+            success=True,
+            filename=file.filename,
+            file_size=file_size,
+            analysis=ctx.report_analysis,
+            anonymized_for_ai=ctx.ai_analysis,
+            message=f"Analyse terminée ({total_segments} segment{'s' if total_segments > 1 else ''}). Rapport disponible 15 minutes.",
+            segments_analyzed=total_segments,
+            duplicate_pages_removed=ctx.duplicate_pages_removed,
+            image_bytes_saved=ctx.image_bytes_saved,
+            destruction_confirmed=ctx.destruction_success,
+            report_id=ctx.report_id,
+            structured_data=ctx.report_data
+        )
 
 # ===== RÉCUPÉRATION RAPPORT TEMPORAIRE =====
 @api_router.get("/report/{report_id}")
@@ -1274,6 +4349,7 @@ async def get_temporary_report(report_id: str):
         "analysis": report.get("analysis"),
         "segments": report.get("segments"),
         "total_segments": report.get("total_segments"),
+        "structured_data": report.get("structured_data"),
         "status": report.get("status", "inconnu"),
         "created_at": report.get("created_at"),
         "message": "Rapport récupéré avec succès"
@@ -1297,25 +4373,99 @@ async def get_latest_report():
         "analysis": report.get("analysis"),
         "segments": report.get("segments"),
         "total_segments": report.get("total_segments"),
+        "structured_data": report.get("structured_data"),
         "status": report.get("status", "inconnu"),
         "created_at": report.get("created_at"),
         "message": f"Rapport {'en cours' if report.get('status') == 'en_cours' else 'terminé'} - {report.get('segments')}/{report.get('total_segments')} segments"
     }
 
 # ===== COMPTEUR VISITEURS =====
+VISITOR_COUNTER_SHARDS = int(os.environ.get('VISITOR_COUNTER_SHARDS', '8'))
+VISITOR_FLUSH_INTERVAL = float(os.environ.get('VISITOR_FLUSH_INTERVAL', '5'))  # secondes
+
+class VisitorCounter:
+    """Compteur de visiteurs à écriture différée.
+
+    Les incréments sont accumulés en mémoire et écrits périodiquement, en un seul
+    $inc, sur l'un des documents {"type": "visitors_shard"} choisi au hasard.
+    Le total est la somme de ces documents et de l'ancien document {"type": "visitors"}.
+    """
+
+    def __init__(self, shards: int, flush_interval: float):
+        self.shards = max(1, shards)
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.total = None
+        self._in_flight = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def refresh(self):
+        """Relit la somme des documents compteurs (inclut les autres processus)."""
+        async with self._lock:
+            total = 0
+            async for doc in db.stats.find({"type": {"$in": ["visitors", "visitors_shard"]}}, {"_id": 0, "count": 1}):
+                total += doc.get("count", 0)
+            self.total = total
+
+    async def get(self) -> int:
+        if self.total is None:
+            await self.refresh()
+        return self.total + self._in_flight + self.pending
+
+    async def increment(self) -> int:
+        self.pending += 1
+        return await self.get()
+
+    async def flush(self):
+        async with self._lock:
+            count = self.pending
+            if count == 0:
+                return
+            self.pending = 0
+            self._in_flight = count
+            try:
+                await db.stats.find_one_and_update(
+                    {"type": "visitors_shard", "shard": random.randrange(self.shards)},
+                    {"$inc": {"count": count}},
+                    upsert=True
+                )
+                if self.total is not None:
+                    self.total += count
+            except Exception as e:
+                self.pending += count
+                logger.warning(f"Écriture du compteur de visiteurs différée: {str(e)}")
+            finally:
+                self._in_flight = 0
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Erreur du compteur de visiteurs: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+visitor_counter = VisitorCounter(VISITOR_COUNTER_SHARDS, VISITOR_FLUSH_INTERVAL)
+
 @api_router.get("/stats/visitors")
 async def get_visitor_count():
-    stats = await db.stats.find_one({"type": "visitors"})
-    if not stats:
-        await db.stats.insert_one({"type": "visitors", "count": 0})
-        return {"count": 0}
-    return {"count": stats.get("count", 0)}
+    return {"count": await visitor_counter.get()}
 
 @api_router.post("/stats/visitors/increment")
 async def increment_visitor_count():
-    await db.stats.update_one({"type": "visitors"}, {"$inc": {"count": 1}}, upsert=True)
-    stats = await db.stats.find_one({"type": "visitors"})
-    return {"count": stats.get("count", 0)}
+    return {"count": await visitor_counter.increment()}
 
 # ===== DÉCOUPAGE PDF AUTOMATIQUE =====
 SPLIT_TARGET_SIZE = 15 * 1024 * 1024  # 15 Mo par partie (sous la limite Gemini de 20 Mo)
@@ -1329,7 +4479,8 @@ async def split_pdf_for_download(file: UploadFile = File(...)):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Seuls les fichiers PDF sont acceptés")
     
-    contents = await file.read()
+    with mesurer_etape("upload"):
+        contents = await file.read()
     file_size = len(contents)
     
     # Vérifier si le fichier nécessite un découpage
@@ -1337,11 +4488,12 @@ async def split_pdf_for_download(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Ce fichier est assez petit pour être analysé directement (< 15 Mo)")
     
     tmp_path = None
+    espace = EspaceTravail()
     try:
         # Sauvegarder temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        tmp_path = espace.fichier('.pdf')
+        with open(tmp_path, 'wb') as tmp_file:
             tmp_file.write(contents)
-            tmp_path = tmp_file.name
         
         reader = PdfReader(tmp_path)
         total_pages = len(reader.pages)
@@ -1381,8 +4533,7 @@ async def split_pdf_for_download(file: UploadFile = File(...)):
                 logger.info(f"Partie {i+1}/{num_parts} créée: pages {start_page+1}-{end_page}")
         
         # Nettoyer le fichier temporaire
-        if tmp_path and os.path.exists(tmp_path):
-            destruction_securisee(tmp_path)
+        espace.fermer()
         
         # Retourner le ZIP
         zip_buffer.seek(0)
@@ -1399,11 +4550,81 @@ async def split_pdf_for_download(file: UploadFile = File(...)):
         )
         
     except Exception as e:
-        if tmp_path and os.path.exists(tmp_path):
-            destruction_securisee(tmp_path)
+        espace.fermer()
         logger.error(f"Erreur découpage PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors du découpage: {str(e)}")
 
+# ===== PAGINATION PAR CURSEUR =====
+MEDECINS_PAGE_MAX = int(os.environ.get('MEDECINS_PAGE_MAX', '500'))
+CONTRIBUTIONS_PAGE_MAX = int(os.environ.get('CONTRIBUTIONS_PAGE_MAX', '100'))
+TESTIMONIALS_PAGE_MAX = int(os.environ.get('TESTIMONIALS_PAGE_MAX', '100'))
+
+# Champs autorisés pour les projections (?fields=nom,prenom,...)
+CHAMPS_MEDECIN = set(MedecinStats.model_fields)
+# Tableaux qui croissent à chaque analyse, et champs internes (clé d'unicité, rapports déjà comptés)
+CHAMPS_MEDECIN_EXCLUS = ("sources", "rapports_comptes", "cle")
+CHAMPS_CONTRIBUTION = {
+    "id", "medecin_id", "medecin_nom", "medecin_prenom", "type_contribution",
+    "description", "source_reference", "timestamp",
+}
+CHAMPS_TEMOIGNAGE = {"id", "name", "message", "rating", "timestamp"}
+
+def encoder_curseur(valeurs: list) -> str:
+    """Encode la clé de tri du dernier élément en curseur opaque."""
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decoder_curseur(curseur: str) -> list:
+    """Décode un curseur produit par encoder_curseur."""
+    try:
+        padding = "=" * (-len(curseur) % 4)
+        valeurs = json.loads(base64.urlsafe_b64decode(curseur + padding))
+        if not isinstance(valeurs, list) or len(valeurs) != 2:
+            raise ValueError("curseur mal formé")
+        # Les valeurs finissent dans un filtre $or : un objet y serait lu comme un opérateur
+        if any(isinstance(v, bool) or not isinstance(v, (str, int, float, type(None))) for v in valeurs):
+            raise ValueError("valeur de curseur non scalaire")
+        return valeurs
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+def projection_champs(fields: Optional[str], autorises: set, obligatoires: tuple, exclus: tuple = ()) -> dict:
+    """Construit la projection MongoDB pour une liste de champs séparés par des virgules.
+
+    Sans liste, tous les champs sont retournés sauf exclus (tableaux non bornés),
+    qui ne sont lus que s'ils sont demandés explicitement.
+    """
+    if not fields:
+        return {"_id": 0, **{champ: 0 for champ in exclus}}
+    demandes = {champ.strip() for champ in fields.split(",") if champ.strip()}
+    inconnus = demandes - autorises
+    if inconnus:
+        raise HTTPException(status_code=400, detail=f"Champ(s) inconnu(s): {', '.join(sorted(inconnus))}")
+    projection = {"_id": 0}
+    for champ in demandes.union(obligatoires):
+        projection[champ] = 1
+    return projection
+
+async def page_par_curseur(collection, filtre: dict, cle_tri: str, ordre: int, limit: int,
+                           curseur: Optional[str], projection: dict) -> tuple[list, Optional[str]]:
+    """Lit une page triée sur (cle_tri, id) à partir du curseur et retourne (documents, curseur suivant)."""
+    requete = dict(filtre)
+    if curseur:
+        valeur, dernier_id = decoder_curseur(curseur)
+        op = "$gt" if ordre == 1 else "$lt"
+        requete["$or"] = [
+            {cle_tri: {op: valeur}},
+            {cle_tri: valeur, "id": {op: dernier_id}},
+        ]
+    
+    # Lire un document de plus pour savoir s'il existe une page suivante
+    documents = await collection.find(requete, projection).sort([(cle_tri, ordre), ("id", ordre)]).to_list(limit + 1)
+    prochain_curseur = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        dernier = documents[-1]
+        prochain_curseur = encoder_curseur([dernier.get(cle_tri), dernier.get("id")])
+    return documents, prochain_curseur
+
 # ===== TÉMOIGNAGES =====
 class TestimonialCreate(BaseModel):
     name: str = Field(..., min_length=2, max_length=50)
@@ -1428,10 +4649,131 @@ async def create_testimonial(testimonial: TestimonialCreate):
     return {"message": "Témoignage soumis avec succès", "id": doc["id"]}
 
 @api_router.get("/testimonials")
-async def get_testimonials():
-    testimonials = await db.testimonials.find({"approved": True}, {"_id": 0}).sort("timestamp", -1).to_list(20)
+async def get_testimonials(
+    response: Response,
+    limit: int = Query(20, ge=1, le=TESTIMONIALS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    projection = projection_champs(fields, CHAMPS_TEMOIGNAGE, ("id", "timestamp"))
+    testimonials, next_cursor = await page_par_curseur(
+        db.testimonials, {"approved": True}, "timestamp", -1, limit, cursor, projection
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return testimonials
 
+# ===== CACHE DES AGRÉGATS PUBLICS =====
+READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', '60'))  # secondes
+# Intervalle de relecture de la génération partagée (MongoDB): délai maximal avant qu'une
+# écriture faite par un autre processus (worker, autre réplique de l'API) soit visible
+READ_CACHE_SYNC_INTERVAL = float(os.environ.get('READ_CACHE_SYNC_INTERVAL', '2'))
+
+class ReadModelCache:
+    """Cache en mémoire des réponses publiques (médecins, statistiques), avec TTL et ETag.
+
+    Chaque entrée garde le corps JSON déjà sérialisé: une lecture en cache ne touche
+    ni MongoDB ni la sérialisation. Toute écriture sur les médecins ou les contributions
+    appelle invalidate(), qui incrémente un compteur de génération dans db.stats; chaque
+    processus le relit au plus toutes les READ_CACHE_SYNC_INTERVAL secondes. Si MongoDB
+    est injoignable, seules les invalidations locales et le TTL s'appliquent.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._locks = {}  # clé -> [verrou, requêtes en attente], retiré après le dernier calcul
+        self._generation = 0
+        self._generation_partagee = None
+        self._synchronise_a = 0.0
+
+    def _valide(self, entry) -> bool:
+        return entry is not None and entry[2] == self._generation and time.monotonic() < entry[3]
+
+    async def _synchroniser(self):
+        """Relit la génération partagée; une valeur différente de la précédente invalide le cache local."""
+        if time.monotonic() - self._synchronise_a < READ_CACHE_SYNC_INTERVAL:
+            return
+        self._synchronise_a = time.monotonic()
+        try:
+            doc = await db.stats.find_one({"type": "read_model_generation", "name": self.name}, {"_id": 0, "generation": 1})
+        except Exception as e:
+            logger.warning(f"Génération du cache {self.name} illisible, TTL seul: {str(e)[:100]}")
+            return
+        partagee = (doc or {}).get("generation", 0)
+        if self._generation_partagee is not None and partagee != self._generation_partagee:
+            self._generation += 1
+            self._entries.clear()
+        self._generation_partagee = partagee
+
+    def _memoriser(self, key: str, entry: tuple):
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_entries:
+            # Entrées périmées d'abord, puis les plus anciennes: les autres clés restent en cache
+            for cle in [c for c, e in self._entries.items() if not self._valide(e)]:
+                del self._entries[cle]
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = entry
+
+    async def get_or_compute(self, key: str, compute) -> tuple[bytes, str]:
+        await self._synchroniser()
+        entry = self._entries.get(key)
+        if self._valide(entry):
+            REQUETES_CACHE.inc(cache=self.name, result="hit")
+            return entry[0], entry[1]
+        
+        # Un seul calcul par clé même si plusieurs requêtes arrivent en même temps
+        verrou = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        verrou[1] += 1
+        try:
+            async with verrou[0]:
+                entry = self._entries.get(key)
+                if self._valide(entry):
+                    REQUETES_CACHE.inc(cache=self.name, result="hit")
+                    return entry[0], entry[1]
+                REQUETES_CACHE.inc(cache=self.name, result="miss")
+                generation = self._generation
+                value = await compute()
+                body = json.dumps(jsonable_encoder(value), ensure_ascii=False).encode("utf-8")
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                # Ne pas mémoriser un résultat calculé pendant une écriture concurrente
+                if generation == self._generation:
+                    self._memoriser(key, (body, etag, generation, time.monotonic() + self.ttl))
+                return body, etag
+        finally:
+            verrou[1] -= 1
+            if verrou[1] == 0:
+                del self._locks[key]
+
+    async def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+        try:
+            doc = await db.stats.find_one_and_update(
+                {"type": "read_model_generation", "name": self.name},
+                {"$inc": {"generation": 1}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            # Sa propre écriture ne doit pas invalider une seconde fois à la prochaine relecture,
+            # celle d'un autre processus intercalée si
+            if self._generation_partagee is not None and doc and doc.get("generation") == self._generation_partagee + 1:
+                self._generation_partagee = doc["generation"]
+        except Exception as e:
+            logger.warning(f"Invalidation du cache {self.name} limitée à ce processus: {str(e)[:100]}")
+
+medecins_cache = ReadModelCache("medecins", READ_CACHE_TTL)
+
+def reponse_cachee(request: Request, body: bytes, etag: str) -> Response:
+    """Retourne le corps JSON mis en cache, ou 304 si le client a déjà cette version."""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=0, must-revalidate"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # ===== MÉDECINS =====
 DISCLAIMER_MEDECIN = """
 ⚖️ AVIS IMPORTANT - CLAUSE DE NON-RESPONSABILITÉ
@@ -1448,21 +4790,58 @@ https://www.cmq.org/fr/proteger-le-public/suivre-dossier-disciplinaire/decisions
 """
 
 @api_router.get("/medecins")
-async def get_medecins():
-    medecins = await db.medecins.find({}, {"_id": 0}).sort("nom", 1).to_list(500)
-    return {"disclaimer": DISCLAIMER_MEDECIN, "medecins": medecins}
+async def get_medecins(
+    request: Request,
+    limit: int = Query(500, ge=1, le=MEDECINS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    projection = projection_champs(fields, CHAMPS_MEDECIN, ("id", "nom"), CHAMPS_MEDECIN_EXCLUS)
+    
+    async def compute():
+        medecins, next_cursor = await page_par_curseur(db.medecins, {}, "nom", 1, limit, cursor, projection)
+        return {"disclaimer": DISCLAIMER_MEDECIN, "medecins": medecins, "next_cursor": next_cursor}
+    
+    # Seule la première page (la plus consultée) passe par le cache
+    if cursor:
+        return await compute()
+    cle = f"medecins:{limit}:{','.join(sorted(projection))}"
+    body, etag = await medecins_cache.get_or_compute(cle, compute)
+    return reponse_cachee(request, body, etag)
 
 @api_router.get("/medecins/{medecin_id}")
-async def get_medecin(medecin_id: str):
-    medecin = await db.medecins.find_one({"id": medecin_id}, {"_id": 0})
+async def get_medecin(
+    medecin_id: str,
+    limit: int = Query(50, ge=1, le=CONTRIBUTIONS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    medecin_fields: Optional[str] = None,
+    sources_limit: int = Query(0, ge=0, le=CONTRIBUTIONS_PAGE_MAX),
+):
+    """Fiche d'un médecin et ses contributions approuvées (paginées).
+
+    fields s'applique aux contributions, medecin_fields à la fiche. Les sources ne sont
+    retournées que sur demande: les sources_limit plus récentes.
+    """
+    projection_medecin = projection_champs(medecin_fields, CHAMPS_MEDECIN, ("id", "nom"), CHAMPS_MEDECIN_EXCLUS)
+    if sources_limit:
+        projection_medecin.pop("sources", None)
+        projection_medecin["sources"] = {"$slice": -sources_limit}
+    medecin = await db.medecins.find_one({"id": medecin_id}, projection_medecin)
     if not medecin:
         raise HTTPException(status_code=404, detail="Médecin non trouvé")
     
-    contributions = await db.contributions.find(
-        {"medecin_id": medecin_id, "approved": True}, {"_id": 0}
-    ).sort("timestamp", -1).to_list(50)
+    projection = projection_champs(fields, CHAMPS_CONTRIBUTION, ("id", "timestamp"))
+    contributions, next_cursor = await page_par_curseur(
+        db.contributions, {"medecin_id": medecin_id, "approved": True}, "timestamp", -1, limit, cursor, projection
+    )
     
-    return {"disclaimer": DISCLAIMER_MEDECIN, "medecin": medecin, "contributions": contributions}
+    return {
+        "disclaimer": DISCLAIMER_MEDECIN,
+        "medecin": medecin,
+        "contributions": contributions,
+        "next_cursor": next_cursor
+    }
 
 @api_router.get("/medecins/search/{nom}")
 async def search_medecin(nom: str):
@@ -1470,7 +4849,7 @@ async def search_medecin(nom: str):
         {"$or": [
             {"nom": {"$regex": nom, "$options": "i"}},
             {"prenom": {"$regex": nom, "$options": "i"}}
-        ]}, {"_id": 0}
+        ]}, projection_champs(None, CHAMPS_MEDECIN, (), CHAMPS_MEDECIN_EXCLUS)
     ).to_list(20)
     return {"disclaimer": DISCLAIMER_MEDECIN, "medecins": medecins}
 
@@ -1486,25 +4865,8 @@ async def create_contribution(contribution: ContributionCreate):
         if not est_valide:
             raise HTTPException(status_code=400, detail=msg)
     
-    medecin = await db.medecins.find_one({
-        "nom": {"$regex": f"^{contribution.medecin_nom}$", "$options": "i"},
-        "prenom": {"$regex": f"^{contribution.medecin_prenom}$", "$options": "i"}
-    })
-    
-    if not medecin:
-        medecin_id = str(uuid.uuid4())
-        medecin = {
-            "id": medecin_id,
-            "nom": contribution.medecin_nom.upper(),
-            "prenom": contribution.medecin_prenom.title(),
-            "specialite": None, "adresse": None, "ville": None, "diplomes": None,
-            "decisions_pro_employeur": 0, "decisions_pro_employe": 0, "total_decisions": 0,
-            "pourcentage_pro_employeur": 0.0, "pourcentage_pro_employe": 0.0,
-            "sources": [], "derniere_maj": datetime.now(timezone.utc).isoformat()
-        }
-        await db.medecins.insert_one(medecin)
-    else:
-        medecin_id = medecin["id"]
+    medecin_id = (await obtenir_medecin(contribution.medecin_nom.strip().upper(),
+                                        contribution.medecin_prenom.strip().title()))["id"]
     
     contribution_doc = {
         "id": str(uuid.uuid4()),
@@ -1525,20 +4887,9 @@ async def create_contribution(contribution: ContributionCreate):
     elif contribution.type_contribution == "pro_employe":
         inc_fields["decisions_pro_employe"] = 1
     
-    update_ops = {"$set": {"derniere_maj": datetime.now(timezone.utc).isoformat()}, "$inc": inc_fields}
-    if contribution.source_reference:
-        update_ops["$addToSet"] = {"sources": contribution.source_reference}
-    
-    await db.medecins.update_one({"id": medecin_id}, update_ops)
+    await compter_decision(medecin_id, inc_fields, f"contribution:{contribution_doc['id']}", contribution.source_reference)
     
-    medecin_updated = await db.medecins.find_one({"id": medecin_id})
-    if medecin_updated and medecin_updated["total_decisions"] > 0:
-        pct_employeur = (medecin_updated["decisions_pro_employeur"] / medecin_updated["total_decisions"]) * 100
-        pct_employe = (medecin_updated["decisions_pro_employe"] / medecin_updated["total_decisions"]) * 100
-        await db.medecins.update_one({"id": medecin_id}, {"$set": {
-            "pourcentage_pro_employeur": round(pct_employeur, 1),
-            "pourcentage_pro_employe": round(pct_employe, 1)
-        }})
+    await medecins_cache.invalidate()
     
     return {
         "message": "Contribution enregistrée avec succès!",
@@ -1547,35 +4898,276 @@ async def create_contribution(contribution: ContributionCreate):
     }
 
 @api_router.get("/contributions")
-async def get_contributions():
-    contributions = await db.contributions.find({"approved": True}, {"_id": 0}).sort("timestamp", -1).to_list(100)
+async def get_contributions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=CONTRIBUTIONS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    projection = projection_champs(fields, CHAMPS_CONTRIBUTION, ("id", "timestamp"))
+    contributions, next_cursor = await page_par_curseur(
+        db.contributions, {"approved": True}, "timestamp", -1, limit, cursor, projection
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return contributions
 
 @api_router.get("/stats/medecins")
-async def get_medecins_stats():
-    total_medecins = await db.medecins.count_documents({})
-    total_contributions = await db.contributions.count_documents({"approved": True})
-    top_medecins = await db.medecins.find({"total_decisions": {"$gt": 0}}, {"_id": 0}).sort("total_decisions", -1).to_list(10)
+async def get_medecins_stats(request: Request):
+    async def compute():
+        total_medecins = await db.medecins.count_documents({})
+        total_contributions = await db.contributions.count_documents({"approved": True})
+        top_medecins = await db.medecins.find(
+            {"total_decisions": {"$gt": 0}}, projection_champs(None, CHAMPS_MEDECIN, (), CHAMPS_MEDECIN_EXCLUS)
+        ).sort("total_decisions", -1).to_list(10)
+        
+        return {
+            "disclaimer": DISCLAIMER_MEDECIN,
+            "total_medecins_documentes": total_medecins,
+            "total_contributions": total_contributions,
+            "top_medecins_documentes": top_medecins
+        }
     
-    return {
-        "disclaimer": DISCLAIMER_MEDECIN,
-        "total_medecins_documentes": total_medecins,
-        "total_contributions": total_contributions,
-        "top_medecins_documentes": top_medecins
-    }
+    body, etag = await medecins_cache.get_or_compute("stats_medecins", compute)
+    return reponse_cachee(request, body, etag)
 
 # ===== NETTOYAGE =====
+# Ménage en arrière-plan des artéfacts abandonnés (processus tué, worker disparu, erreur de
+# destruction): espaces de travail eclaireur-* et blobs chiffrés dont aucun job vivant ne
+# détient la clé. Seul ce qui est absent du manifeste, n'appartient ni à un autre processus
+# vivant ni à un job en cours, et est plus vieux que JANITOR_MIN_AGE est supprimé, par lots,
+# hors de la boucle d'événements.
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', '900'))  # secondes entre deux passages, 0 = sur demande
+JANITOR_MIN_AGE = int(os.environ.get('JANITOR_MIN_AGE', '3600'))  # âge minimal d'un artéfact orphelin
+JANITOR_BATCH_SIZE = int(os.environ.get('JANITOR_BATCH_SIZE', '50'))
+
+nettoyage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nettoyage")
+
+def detruire_espace_orphelin(chemin: str) -> int:
+    """Détruit un espace de travail abandonné; retourne les octets libérés."""
+    en_memoire = est_en_memoire(chemin)
+    octets = 0
+    for dossier, sous_dossiers, fichiers in os.walk(chemin, topdown=False):
+        for nom in fichiers:
+            fichier = os.path.join(dossier, nom)
+            try:
+                octets += os.path.getsize(fichier)
+                if en_memoire:
+                    os.remove(fichier)
+                else:
+                    destruction_securisee(fichier)
+            except FileNotFoundError:
+                pass
+        for nom in sous_dossiers:
+            os.rmdir(os.path.join(dossier, nom))
+    os.rmdir(chemin)
+    return octets
+
+def processus_vivant(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def espace_d_un_autre_processus(nom: str) -> bool:
+    """Vrai si l'espace appartient à un autre processus encore en vie (absent de notre manifeste)."""
+    parties = nom.split("-", 2)
+    if len(parties) < 3 or not parties[1].isdigit():
+        return False
+    pid = int(parties[1])
+    return pid != os.getpid() and processus_vivant(pid)
+
+def lister_espaces_orphelins(avant: float) -> list:
+    orphelins = []
+    if not os.path.isdir(EPHEMERAL_DIR):
+        return orphelins
+    blobs = os.path.realpath(BLOB_VOLUME_DIR)
+    with os.scandir(EPHEMERAL_DIR) as entrees:
+        for entree in entrees:
+            if not entree.name.startswith("eclaireur-") or not entree.is_dir(follow_symlinks=False):
+                continue
+            if entree.path in manifeste_temporaires.espaces or os.path.realpath(entree.path) == blobs:
+                continue
+            if espace_d_un_autre_processus(entree.name):
+                continue
+            if entree.stat(follow_symlinks=False).st_mtime < avant:
+                orphelins.append(entree.path)
+    return orphelins
+
+class NettoyeurTemporaires:
+    """Passages incrémentaux: un lot à la fois, la boucle d'événements reprend la main entre deux lots."""
+
+    def __init__(self, intervalle: int, age_min: int, taille_lot: int):
+        self.intervalle = intervalle
+        self.age_min = age_min
+        self.taille_lot = max(1, taille_lot)
+        self.progression = None
+        self.dernier_passage = None
+        self.octets_total = 0
+        self._task = None
+        self._passage = None
+
+    def en_cours(self) -> bool:
+        return self._passage is not None and not self._passage.done()
+
+    def lancer(self) -> bool:
+        """Démarre un passage; faux si un passage est déjà en cours."""
+        if self.en_cours():
+            return False
+        self._passage = asyncio.create_task(self.passage())
+        return True
+
+    def _compter(self, type_artefact: str, octets: int):
+        self.progression["removed"] += 1
+        self.progression["bytes_reclaimed"] += octets
+        self.octets_total += octets
+        NETTOYAGE_SUPPRIMES.inc(kind=type_artefact)
+        NETTOYAGE_OCTETS.inc(octets, kind=type_artefact)
+
+    async def _espaces(self, avant: float):
+        loop = asyncio.get_running_loop()
+        orphelins = await loop.run_in_executor(nettoyage_executor, lister_espaces_orphelins, avant)
+        for debut in range(0, len(orphelins), self.taille_lot):
+            for chemin in orphelins[debut:debut + self.taille_lot]:
+                self.progression["scanned"] += 1
+                # Le manifeste est relu: l'espace a pu être repris depuis l'inventaire
+                if chemin in manifeste_temporaires.espaces:
+                    continue
+                try:
+                    octets = await loop.run_in_executor(nettoyage_executor, detruire_espace_orphelin, chemin)
+                    self._compter("workspace", octets)
+                except Exception as e:
+                    self.progression["errors"] += 1
+                    logger.warning(f"Ménage: espace {chemin} non détruit: {str(e)[:100]}")
+            await asyncio.sleep(0)
+
+    async def _blobs_orphelins(self, lot: list):
+        jobs = {blob_id.split(".", 1)[0] for blob_id, _ in lot}
+        vivants = jobs & set(manifeste_temporaires.jobs)
+        # Le manifeste ne connaît que ce processus: un job en cours dans un autre worker garde ses blobs
+        async for job in db.analysis_jobs.find(
+                {"job_id": {"$in": list(jobs - vivants)}, "status": {"$nin": ["completed", "failed"]}}, {"job_id": 1}):
+            vivants.add(job["job_id"])
+        if ANALYSIS_MODE == "distributed":
+            # Un worker peut encore lire les blobs d'un job tant que sa clé existe
+            async for document in db.analysis_keys.find({"job_id": {"$in": list(jobs - vivants)}}, {"job_id": 1}):
+                vivants.add(document["job_id"])
+        stockage = obtenir_stockage_blobs()
+        for blob_id, octets in lot:
+            self.progression["scanned"] += 1
+            if blob_id.split(".", 1)[0] in vivants:
+                continue
+            try:
+                await stockage.supprimer(blob_id)
+                self._compter("blob", octets)
+            except Exception as e:
+                self.progression["errors"] += 1
+                logger.warning(f"Ménage: blob {blob_id} non supprimé: {str(e)[:100]}")
+        await asyncio.sleep(0)
+
+    async def _blobs(self, avant: float):
+        lot = []
+        async for blob in obtenir_stockage_blobs().inventaire(avant):
+            lot.append(blob)
+            if len(lot) >= self.taille_lot:
+                await self._blobs_orphelins(lot)
+                lot = []
+        if lot:
+            await self._blobs_orphelins(lot)
+
+    async def _cles(self, avant: float):
+        """Mode distribué: clés et tâches des jobs terminés dont la synthèse n'a pas fait le ménage."""
+        limite = datetime.fromtimestamp(avant, timezone.utc)
+        curseur = db.analysis_keys.find({"created_at": {"$lt": limite}}, {"job_id": 1})
+        while True:
+            lot = await curseur.to_list(self.taille_lot)
+            if not lot:
+                break
+            ids = [document["job_id"] for document in lot]
+            actifs = {job["job_id"] async for job in db.analysis_jobs.find(
+                {"job_id": {"$in": ids}, "status": {"$nin": ["completed", "failed"]}}, {"job_id": 1})}
+            for job_id in ids:
+                self.progression["scanned"] += 1
+                if job_id in actifs:
+                    continue
+                await nettoyer_taches_job(job_id)
+                self._compter("key", 0)
+            await asyncio.sleep(0)
+
+    async def passage(self):
+        avant = time.time() - self.age_min
+        self.progression = {
+            "running": True, "phase": None, "scanned": 0, "removed": 0, "bytes_reclaimed": 0, "errors": 0,
+            "started_at": datetime.now(timezone.utc).isoformat(), "finished_at": None,
+        }
+        phases = [("workspaces", self._espaces), ("blobs", self._blobs)]
+        if ANALYSIS_MODE == "distributed":
+            phases.append(("keys", self._cles))
+        try:
+            for phase, traitement in phases:
+                self.progression["phase"] = phase
+                try:
+                    await traitement(avant)
+                except Exception as e:
+                    self.progression["errors"] += 1
+                    logger.warning(f"Ménage ({phase}) interrompu: {str(e)[:200]}")
+        finally:
+            self.progression.update(running=False, phase=None, finished_at=datetime.now(timezone.utc).isoformat())
+            self.dernier_passage = self.progression
+        if self.progression["removed"]:
+            logger.info(f"Ménage: {self.progression['removed']} artéfact(s) orphelin(s) supprimé(s), "
+                        f"{self.progression['bytes_reclaimed']} octet(s) libéré(s)")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.intervalle)
+            if self.lancer():
+                try:
+                    await self._passage
+                except Exception as e:
+                    logger.warning(f"Erreur du ménage: {str(e)}")
+
+    def start(self):
+        if self._task is None and self.intervalle > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.en_cours():
+            self._passage.cancel()
+
+    def etat(self) -> dict:
+        return {
+            "interval_seconds": self.intervalle,
+            "min_age_seconds": self.age_min,
+            "batch_size": self.taille_lot,
+            "running": self.en_cours(),
+            "current": self.progression if self.en_cours() else None,
+            "last_run": self.dernier_passage,
+            "total_bytes_reclaimed": self.octets_total,
+            "manifest": manifeste_temporaires.etat(),
+        }
+
+nettoyeur_temporaires = NettoyeurTemporaires(JANITOR_INTERVAL, JANITOR_MIN_AGE, JANITOR_BATCH_SIZE)
+
 @api_router.delete("/nettoyer")
 async def nettoyer_fichiers_temporaires():
-    """Nettoie tous les fichiers temporaires de manière sécurisée."""
-    fichiers_supprimes = 0
-    for nom_fichier in os.listdir(UPLOAD_DIR):
-        if nom_fichier.endswith('.pdf'):
-            chemin = os.path.join(UPLOAD_DIR, nom_fichier)
-            if os.path.isfile(chemin):
-                destruction_securisee(chemin)
-                fichiers_supprimes += 1
-    return {"status": "nettoyé", "message": f"{fichiers_supprimes} fichier(s) supprimé(s)"}
+    """Lance un passage du ménage sans attendre sa fin; la progression est sur GET /nettoyer."""
+    lance = nettoyeur_temporaires.lancer()
+    return {
+        "status": "lancé" if lance else "en cours",
+        "message": "Ménage des fichiers temporaires orphelins lancé" if lance else "Un ménage est déjà en cours",
+        "janitor": nettoyeur_temporaires.etat(),
+    }
+
+@api_router.get("/nettoyer")
+async def progression_nettoyage():
+    return nettoyeur_temporaires.etat()
 
 # Include router and CORS
 app.include_router(api_router)
@@ -1586,8 +5178,45 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+@app.on_event("startup")
+async def create_indexes():
+    """Index utilisés par la pagination par curseur."""
+    try:
+        await db.medecins.create_index([("nom", 1), ("id", 1)])
+        await db.contributions.create_index([("approved", 1), ("timestamp", -1), ("id", -1)])
+        await db.contributions.create_index([("medecin_id", 1), ("approved", 1), ("timestamp", -1), ("id", -1)])
+        await db.testimonials.create_index([("approved", 1), ("timestamp", -1), ("id", -1)])
+        await creer_index_medecins()
+        if ANALYSIS_MODE == "distributed":
+            await creer_index_taches()
+    except Exception as e:
+        logger.warning(f"Création des index impossible: {str(e)}")
+
+@app.on_event("startup")
+async def start_visitor_counter():
+    visitor_counter.start()
+
+@app.on_event("startup")
+async def start_janitor():
+    nettoyeur_temporaires.start()
+
+@app.on_event("startup")
+async def start_medecins_extraction():
+    extracteur_medecins.start()
+
+@app.on_event("startup")
+async def start_cpu_executor():
+    executeur_cpu()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Écrire les visites encore en mémoire avant de fermer la connexion
+    await visitor_counter.stop()
+    await nettoyeur_temporaires.stop()
+    await extracteur_medecins.stop()
+    nettoyage_executor.shutdown(wait=False, cancel_futures=True)
+    arreter_executeur_cpu()
     client.close()
@@ -0,0 +1,14 @@
+"""Worker de segments pour le mode distribué (ANALYSIS_MODE=distributed).
+
+Utilise les mêmes variables d'environnement que l'API (MONGO_URL, DB_NAME,
+BLOB_STORE, BLOB_ENCRYPTION_KEY...). Lancer autant de workers que voulu, sur
+une ou plusieurs machines:
+
+    python worker.py
+"""
+import asyncio
+
+from server import executer_worker
+
+if __name__ == "__main__":
+    asyncio.run(executer_worker())
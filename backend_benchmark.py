@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+L'Éclaireur End-to-End Benchmark Suite
+Drives the analysis pipeline (/analyze, /analyze-async, /analyze-multiple, /split-pdf)
+with synthetic dossiers against a local app running the stub LLM provider.
+
+Usage:
+    python backend_benchmark.py                          # starts backend/server.py locally
+    python backend_benchmark.py --quick --runs 1         # smaller dossiers
+    python backend_benchmark.py --base-url http://localhost:8001 --server-pid 1234
+    python backend_benchmark.py --output bench.json --compare previous.json
+
+The local app is started with LLM_PROVIDER=stub and MONGO_URL (default
+mongodb://localhost:27017, database eclaireur_benchmark), so no tokens are spent.
+Client-side timings are complemented by the server's own stage durations, read
+from /api/metrics before and after each scenario.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from PIL import Image
+from PyPDF2 import PdfReader, PdfWriter
+
+REPORT_SCHEMA = 1
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ===== SYNTHETIC DOSSIERS =====
+
+MEDECINS = ["TREMBLAY", "GAGNON", "ROY", "COTE", "BOUCHARD", "GAUTHIER", "MORIN", "LAVOIE"]
+EXAMENS = ["IRM lombaire", "Radiographie cervicale", "EMG", "Scintigraphie osseuse", "Echographie epaule"]
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_page_pdf(lines):
+    """Single-page PDF with a real text layer (Helvetica, ASCII only)."""
+    ops = ["BT /F1 10 Tf 40 760 Td 12 TL"]
+    ops += [f"({_escape_pdf_text(line)}) Tj T*" for line in lines]
+    ops.append("ET")
+    content = "\n".join(ops)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        "/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+def scanned_page_pdf(rng, dpi):
+    """Single-page PDF holding only a noisy grayscale image, like a scanned form."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    noise = bytes(rng.randint(180, 255) if rng.random() > 0.05 else rng.randint(0, 80) for _ in range(width * height // 16))
+    image = Image.frombytes("L", (width // 4, height // 4), noise).resize((width, height))
+    out = io.BytesIO()
+    image.save(out, "PDF", resolution=dpi)
+    return out.getvalue()
+
+
+def dossier_lines(rng, page_number):
+    medecin = rng.choice(MEDECINS)
+    lines = [
+        f"DOSSIER CNESST - PAGE {page_number}",
+        f"Date: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2019, 2024)}",
+        f"Dr {medecin}, expertise medicale",
+        f"NAS: {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+        f"Examen: {rng.choice(EXAMENS)} - resultat: hernie discale L{rng.randint(3, 5)}-S1",
+    ]
+    while len(lines) < 55:
+        lines.append(
+            f"Le travailleur rapporte une douleur {rng.randint(3, 9)}/10 depuis l'evenement du "
+            f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}, suivi en physiotherapie ({rng.randint(1, 40)} seances)."
+        )
+    return lines
+
+
+def generate_pdf(path, pages, scanned_ratio, seed, dpi=150):
+    """Writes a dossier of `pages` pages, a `scanned_ratio` share of them being image-only."""
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    scanned_cache = []
+    for number in range(1, pages + 1):
+        if rng.random() < scanned_ratio:
+            # A handful of distinct scans keeps generation fast on large dossiers
+            if len(scanned_cache) < 4:
+                scanned_cache.append(scanned_page_pdf(rng, dpi))
+            data = rng.choice(scanned_cache)
+        else:
+            data = text_page_pdf(dossier_lines(rng, number))
+        writer.add_page(PdfReader(io.BytesIO(data)).pages[0])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def generate_bundle(path, kind, members, workdir):
+    """Packs PDFs into a ZIP or RAR archive. RAR needs the `rar` binary."""
+    if kind == "zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for member in members:
+                archive.write(member, os.path.basename(member))
+        return path
+    if shutil.which("rar") is None:
+        return None
+    subprocess.run(["rar", "a", "-ep", "-idq", path] + members, check=True, cwd=workdir)
+    return path
+
+
+# ===== SERVER AND MEMORY SAMPLING =====
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid):
+    """pid and all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """Samples the resident memory of the server process tree in the background."""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reset(self):
+        self.peak = 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            total = sum(_rss_bytes(p) for p in _process_tree(self.pid))
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.pid and os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+class LocalServer:
+    """Runs backend/server.py under uvicorn with the stub LLM provider."""
+
+    def __init__(self, args):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(
+            os.environ,
+            LLM_PROVIDER="stub",
+            LLM_STUB_LATENCY=str(args.llm_latency),
+            LLM_STUB_ERROR_RATE=str(args.llm_error_rate),
+            LLM_STUB_OUTPUT_CHARS=str(args.llm_output_chars),
+            MONGO_URL=args.mongo_url,
+            DB_NAME=args.db_name,
+        )
+        self.process = None
+
+    def __enter__(self):
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(self.port)],
+            cwd=os.path.join(ROOT_DIR, "backend"), env=self.env, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError(f"Server exited during startup:\n{self.log.read().decode(errors='replace')[-2000:]}")
+            try:
+                if requests.get(f"{self.base_url}/api/health", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("Server did not become healthy within 60s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+# ===== BENCHMARK =====
+
+def scrape_server_stages(api_url):
+    """Cumulative server-side durations from /api/metrics: {series: (seconds, count)}.
+
+    Series are the pipeline stages plus the LLM phases (llm_<kind>_<phase>).
+    Returns None when the app does not expose metrics.
+    """
+    try:
+        response = requests.get(f"{api_url}/metrics", timeout=10)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    totals = {}
+    for line in response.text.splitlines():
+        for metric in ("eclaireur_stage_duration_seconds", "eclaireur_llm_call_duration_seconds"):
+            for suffix, index in (("_sum{", 0), ("_count{", 1)):
+                if not line.startswith(metric + suffix):
+                    continue
+                labels, value = line[len(metric) + len(suffix):].rsplit("} ", 1)
+                pairs = dict(part.split("=", 1) for part in labels.split(","))
+                pairs = {k: v.strip('"') for k, v in pairs.items()}
+                series = pairs["stage"] if "stage" in pairs else f"llm_{pairs['kind']}_{pairs['phase']}"
+                entry = totals.setdefault(series, [0.0, 0])
+                entry[index] = float(value)
+    return totals
+
+
+def _summary(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "min": round(ordered[0], 4),
+        "p50": round(statistics.median(ordered), 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "max": round(ordered[-1], 4),
+        "mean": round(statistics.fmean(ordered), 4),
+    }
+
+
+class LEclaireurBenchmark:
+    def __init__(self, base_url, sampler, runs, concurrency, poll_interval=0.25):
+        self.api_url = f"{base_url}/api"
+        self.sampler = sampler
+        self.runs = runs
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.results = []
+
+    def _post_files(self, endpoint, paths, field="file", params=None):
+        handles = [open(p, "rb") for p in paths]
+        try:
+            files = [(field, (os.path.basename(p), h, "application/octet-stream")) for p, h in zip(paths, handles)]
+            start = time.perf_counter()
+            response = requests.post(f"{self.api_url}{endpoint}", files=files, params=params, timeout=3600)
+            return response, time.perf_counter() - start
+        finally:
+            for h in handles:
+                h.close()
+
+    def run_sync(self, endpoint, paths, field="file"):
+        response, elapsed = self._post_files(endpoint, paths, field)
+        outcome = {"ok": response.status_code == 200, "status_code": response.status_code,
+                   "stages": {"request": elapsed}, "total": elapsed}
+        if not outcome["ok"]:
+            outcome["error"] = response.text[:200]
+        return outcome
+
+    def run_async(self, paths):
+        start = time.perf_counter()
+        response, submit = self._post_files("/analyze-async", paths)
+        if response.status_code != 200:
+            return {"ok": False, "status_code": response.status_code, "stages": {"submit": submit},
+                    "total": submit, "error": response.text[:200]}
+        job_id = response.json()["job_id"]
+        segment_started, segments, current, status = time.perf_counter(), [], 0, {}
+        first_progress = None
+        while True:
+            time.sleep(self.poll_interval)
+            status = requests.get(f"{self.api_url}/analyze-status/{job_id}", timeout=30).json()
+            now = time.perf_counter()
+            if first_progress is None and status.get("current_segment", 0) > 0:
+                first_progress = now - start
+            if status.get("current_segment", 0) != current:
+                if current:
+                    segments.append(now - segment_started)
+                current, segment_started = status.get("current_segment", 0), now
+            if status.get("status") in ("completed", "failed"):
+                if current:
+                    segments.append(now - segment_started)
+                break
+        total = time.perf_counter() - start
+        stages = {"submit": submit, "processing": total - submit}
+        if first_progress is not None:
+            stages["time_to_first_segment"] = first_progress
+        return {
+            "ok": status.get("status") == "completed",
+            "status_code": 200,
+            "error": status.get("message") if status.get("status") != "completed" else None,
+            "stages": stages,
+            "segment_durations": segments,
+            "total_segments": status.get("total_segments", 0),
+            "total": total,
+        }
+
+    def run_scenario(self, name, endpoint, paths, pages, runner):
+        if self.sampler:
+            self.sampler.reset()
+        size = sum(os.path.getsize(p) for p in paths)
+        iterations = self.runs * self.concurrency
+        server_before = scrape_server_stages(self.api_url)
+        print(f"⏱  {name}: {pages} pages, {size / (1024 * 1024):.1f} MB x {iterations} ...", flush=True)
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(lambda _: self._safe(runner), range(iterations)))
+        wall = time.perf_counter() - wall_start
+        server_after = scrape_server_stages(self.api_url) if server_before is not None else None
+
+        succeeded = [o for o in outcomes if o["ok"]]
+        stage_names = sorted({stage for o in succeeded for stage in o["stages"]})
+        result = {
+            "name": name,
+            "endpoint": endpoint,
+            "dossier": {"files": len(paths), "pages": pages, "bytes": size},
+            "iterations": iterations,
+            "concurrency": self.concurrency,
+            "errors": len(outcomes) - len(succeeded),
+            "status_codes": sorted({o["status_code"] for o in outcomes}),
+            "failures": sorted({o["error"] for o in outcomes if not o["ok"] and o.get("error")})[:3],
+            "latency_s": _summary([o["total"] for o in succeeded]),
+            "stages_s": {stage: _summary([o["stages"][stage] for o in succeeded if stage in o["stages"]])
+                         for stage in stage_names},
+            "throughput": {
+                "dossiers_per_min": round(len(succeeded) / wall * 60, 3),
+                "pages_per_s": round(len(succeeded) * pages / wall, 3),
+                "mb_per_s": round(len(succeeded) * size / (1024 * 1024) / wall, 3),
+            },
+            "wall_s": round(wall, 3),
+            "peak_rss_mb": round(self.sampler.peak / (1024 * 1024), 1) if self.sampler else None,
+        }
+        if server_after is not None:
+            # Totals over the whole scenario, all iterations included
+            result["server_stages"] = {
+                series: {
+                    "seconds": round(seconds - server_before.get(series, (0.0, 0))[0], 4),
+                    "count": int(count - server_before.get(series, (0.0, 0))[1]),
+                }
+                for series, (seconds, count) in sorted(server_after.items())
+                if count - server_before.get(series, (0.0, 0))[1] > 0
+            }
+        segment_durations = [d for o in succeeded for d in o.get("segment_durations", [])]
+        if segment_durations:
+            result["segments"] = {
+                "count": max(o.get("total_segments", 0) for o in succeeded),
+                "duration_s": _summary(segment_durations),
+            }
+        mark = "✅" if not result["errors"] else "❌"
+        p50 = f"{result['latency_s']['p50']}s" if result["latency_s"] else "n/a"
+        print(f"{mark} {name} - p50 {p50}, {result['throughput']['pages_per_s']} pages/s, "
+              f"peak RSS {result['peak_rss_mb']} MB, errors {result['errors']}")
+        self.results.append(result)
+        return result
+
+    @staticmethod
+    def _safe(runner):
+        try:
+            return runner()
+        except Exception as e:
+            return {"ok": False, "status_code": 0, "stages": {}, "total": 0, "error": str(e)}
+
+
+def build_dossiers(workdir, quick):
+    """Returns the scenario matrix: (name, endpoint, files, pages, kind)."""
+    scale = 0.25 if quick else 1.0
+
+    def pages(n):
+        return max(2, int(n * scale))
+
+    text = generate_pdf(os.path.join(workdir, "text.pdf"), pages(40), 0.0, seed=1)
+    mixed = generate_pdf(os.path.join(workdir, "mixed.pdf"), pages(80), 0.5, seed=2)
+    large = generate_pdf(os.path.join(workdir, "large_scanned.pdf"), pages(160), 0.9, seed=3)
+    # /split-pdf refuses files under 15 MB: this one stays above it even with --quick
+    split_pages = max(pages(160), 60)
+    split = generate_pdf(os.path.join(workdir, "split.pdf"), split_pages, 1.0, seed=4)
+    members = [generate_pdf(os.path.join(workdir, f"member_{i}.pdf"), pages(30), 0.3, seed=10 + i) for i in range(3)]
+    zip_bundle = generate_bundle(os.path.join(workdir, "bundle.zip"), "zip", members, workdir)
+    rar_bundle = generate_bundle(os.path.join(workdir, "bundle.rar"), "rar", members, workdir)
+
+    scenarios = [
+        ("analyze_text", "/analyze", [text], pages(40), "sync"),
+        ("analyze_mixed", "/analyze", [mixed], pages(80), "sync"),
+        ("analyze_async_mixed", "/analyze-async", [mixed], pages(80), "async"),
+        ("analyze_async_large_scanned", "/analyze-async", [large], pages(160), "async"),
+        ("analyze_async_zip", "/analyze-async", [zip_bundle], 3 * pages(30), "async"),
+        ("analyze_multiple", "/analyze-multiple", members, 3 * pages(30), "multiple"),
+        ("split_pdf_large", "/split-pdf", [split], split_pages, "sync"),
+    ]
+    if rar_bundle:
+        scenarios.insert(5, ("analyze_async_rar", "/analyze-async", [rar_bundle], 3 * pages(30), "async"))
+    else:
+        print("ℹ️  rar binary not found - RAR scenario skipped")
+    return scenarios
+
+
+def compare_reports(current, baseline, tolerance):
+    """Prints deltas against a previous report. Returns the list of regressions."""
+    previous = {s["name"]: s for s in baseline.get("scenarios", [])}
+    regressions = []
+    print("\n📊 Comparison with baseline")
+    for scenario in current["scenarios"]:
+        before = previous.get(scenario["name"])
+        if not before or not before.get("latency_s") or not scenario.get("latency_s"):
+            continue
+        checks = [
+            ("p50 latency", before["latency_s"]["p50"], scenario["latency_s"]["p50"], True),
+            ("pages/s", before["throughput"]["pages_per_s"], scenario["throughput"]["pages_per_s"], False),
+            ("peak RSS", before.get("peak_rss_mb"), scenario.get("peak_rss_mb"), True),
+        ]
+        for label, old, new, lower_is_better in checks:
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            worse = delta > tolerance if lower_is_better else delta < -tolerance
+            print(f"  {'❌' if worse else '  '} {scenario['name']:<30} {label:<12} {old:>10} -> {new:<10} ({delta:+.1%})")
+            if worse:
+                regressions.append({"scenario": scenario["name"], "metric": label, "before": old, "after": new})
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args, base_url, server_pid):
+    sampler = RssSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    workdir = tempfile.mkdtemp(prefix="eclaireur-bench-")
+    try:
+        print(f"🧪 Generating synthetic dossiers in {workdir}")
+        scenarios = build_dossiers(workdir, args.quick)
+        bench = LEclaireurBenchmark(base_url, sampler, args.runs, args.concurrency)
+        for name, endpoint, paths, pages, kind in scenarios:
+            if args.only and not any(token in name for token in args.only):
+                continue
+            if kind == "async":
+                runner = lambda p=paths: bench.run_async(p)
+            elif kind == "multiple":
+                runner = lambda p=paths: bench.run_sync("/analyze-multiple", p, field="files")
+            else:
+                runner = lambda e=endpoint, p=paths: bench.run_sync(e, p)
+            bench.run_scenario(name, endpoint, paths, pages, runner)
+    finally:
+        if sampler:
+            sampler.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "schema": REPORT_SCHEMA,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {
+            "base_url": base_url, "runs": args.runs, "concurrency": args.concurrency, "quick": args.quick,
+            "llm_latency": args.llm_latency, "llm_error_rate": args.llm_error_rate,
+            "llm_output_chars": args.llm_output_chars,
+        },
+        "scenarios": bench.results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="L'Éclaireur end-to-end benchmark")
+    parser.add_argument("--base-url", help="Target an already running app instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the running app, for peak RSS with --base-url")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="eclaireur_benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="Iterations per scenario and per worker")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel clients per scenario")
+    parser.add_argument("--quick", action="store_true", help="Dossiers at a quarter of the default size")
+    parser.add_argument("--only", nargs="*", help="Run scenarios whose name contains one of these tokens")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub LLM latency per call (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-output-chars", type=int, default=6000)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--compare", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression before failing")
+    args = parser.parse_args()
+
+    print("🚀 Starting L'Éclaireur benchmark")
+    if args.base_url:
+        report = run_benchmarks(args, args.base_url.rstrip("/"), args.server_pid)
+    else:
+        with LocalServer(args) as server:
+            report = run_benchmarks(args, server.base_url, server.process.pid)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Report written to {args.output}")
+
+    failed = [s["name"] for s in report["scenarios"] if s["errors"]]
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_reports(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    if failed:
+        print(f"\n❌ Scenarios with errors: {', '.join(failed)}")
+        return 1
+    print("\n✅ Benchmark completed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+L'Éclaireur Micro-Benchmark Suite
+Times the CPU hot functions of backend/server.py over input-size sweeps and fails
+when a case exceeds its regression threshold.
+
+Usage:
+    python backend_microbench.py                        # all cases, absolute thresholds
+    python backend_microbench.py --only anonymize       # cases whose name contains "anonymize"
+    python backend_microbench.py --output micro.json --baseline previous.json --tolerance 0.2
+
+Each case has an absolute ceiling (THRESHOLDS, median seconds per call, generous so
+it holds on slow CI machines). With --baseline, the median must also stay within
+--tolerance of the previous run on the same machine.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "eclaireur_microbench")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+
+import server  # noqa: E402
+from backend_benchmark import generate_pdf  # noqa: E402
+
+logging.getLogger("server").setLevel(logging.WARNING)
+
+# Median seconds per call. Sized at several times the typical value on a laptop.
+THRESHOLDS = {
+    "anonymize_for_report[10KB]": 0.01,
+    "anonymize_for_report[100KB]": 0.1,
+    "anonymize_for_report[1MB]": 1.0,
+    "anonymize_for_ai_learning[10KB]": 0.02,
+    "anonymize_for_ai_learning[100KB]": 0.2,
+    "anonymize_for_ai_learning[1MB]": 2.0,
+    "moderer_contenu[200B]": 0.0005,
+    "moderer_contenu[2KB]": 0.003,
+    "moderer_contenu[20KB]": 0.03,
+    "split_pdf_into_chunks[20p]": 1.0,
+    "split_pdf_into_chunks[100p]": 4.0,
+    "split_pdf_into_chunks[300p]": 12.0,
+    "destruction_securisee[64KB]": 0.1,
+    "destruction_securisee[1MB]": 0.3,
+    "destruction_securisee[8MB]": 1.5,
+    "extract_pdfs_from_zip[1]": 0.2,
+    "extract_pdfs_from_zip[5]": 0.5,
+    "extract_pdfs_from_zip[20]": 2.0,
+    "assembler_rapport_partiel[5]": 0.05,
+    "assembler_rapport_partiel[20]": 0.2,
+    "assembler_rapport_partiel[80]": 0.8,
+    "separer_donnees[sidecar]": 0.005,
+    "separer_donnees[table]": 0.01,
+}
+
+
+# ===== REALISTIC INPUTS =====
+
+def dossier_text(size, seed=0):
+    """Report-like text mixing the identifiers the anonymizers look for."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = rng.choice([
+            f"Le {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2023, Dr Marc Tremblay note une douleur lombaire.",
+            f"NAS: {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)} - RAMQ TREM 1234 5678",
+            f"Téléphone: 514-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}, courriel travailleur{rng.randint(1, 99)}@exemple.ca",
+            f"Adresse: {rng.randint(1, 9999)} rue Saint-Denis, Montréal H2X 1K4",
+            "| 12/03/2023 | IRM lombaire | hernie discale (disque déplacé) L4-L5 | p.12 |",
+            "Le travailleur rapporte une limitation fonctionnelle persistante malgré la physiothérapie.",
+        ])
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def moderation_text(size, seed=0):
+    """Clean testimonial text full of words that embed forbidden terms (contestation, consultation).
+
+    Nothing matches, so the whole text is scanned: the worst case.
+    """
+    rng = random.Random(seed)
+    words = ["le", "médecin", "expert", "a", "conclu", "sans", "examiner", "l'IRM", "du", "dossier",
+             "travailleur", "rapport", "évaluation", "bureau", "contestation", "physiothérapie"]
+    text = []
+    total = 0
+    while total < size:
+        word = rng.choice(words)
+        text.append(word)
+        total += len(word) + 1
+    return " ".join(text)[:size]
+
+
+# ===== TIMING =====
+
+def measure(func, setup=None, teardown=None, min_rounds=5, min_time=0.5, max_rounds=200):
+    """Runs func until min_rounds and min_time are both reached. setup/teardown are not timed."""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_rounds and (len(timings) < min_rounds or time.perf_counter() - started < min_time):
+        arg = setup() if setup else None
+        begin = time.perf_counter()
+        result = func(arg) if setup else func()
+        timings.append(time.perf_counter() - begin)
+        if teardown:
+            teardown(arg, result)
+    return timings
+
+
+class LEclaireurMicroBenchmark:
+    def __init__(self, workdir, only=None):
+        self.workdir = workdir
+        self.only = only
+        self.results = []
+
+    def case(self, name, func, setup=None, teardown=None, **kwargs):
+        if self.only and not any(token in name for token in self.only):
+            return
+        timings = measure(func, setup, teardown, **kwargs)
+        median = statistics.median(timings)
+        threshold = THRESHOLDS.get(name)
+        result = {
+            "name": name,
+            "rounds": len(timings),
+            "min_s": round(min(timings), 6),
+            "median_s": round(median, 6),
+            "mean_s": round(statistics.fmean(timings), 6),
+            "stdev_s": round(statistics.stdev(timings), 6) if len(timings) > 1 else 0.0,
+            "threshold_s": threshold,
+            "within_threshold": threshold is None or median <= threshold,
+        }
+        mark = "✅" if result["within_threshold"] else "❌"
+        print(f"{mark} {name:<38} median {median * 1000:10.3f} ms  (min {result['min_s'] * 1000:.3f} ms, "
+              f"{len(timings)} rounds, threshold {threshold * 1000 if threshold else '-'} ms)")
+        self.results.append(result)
+
+    def bench_anonymization(self):
+        for label, size in (("10KB", 10_000), ("100KB", 100_000), ("1MB", 1_000_000)):
+            text = dossier_text(size)
+            self.case(f"anonymize_for_report[{label}]", lambda t=text: server.anonymize_for_report(t))
+            self.case(f"anonymize_for_ai_learning[{label}]", lambda t=text: server.anonymize_for_ai_learning(t))
+
+    def bench_moderation(self):
+        for label, size in (("200B", 200), ("2KB", 2_000), ("20KB", 20_000)):
+            text = moderation_text(size)
+            self.case(f"moderer_contenu[{label}]", lambda t=text: server.moderer_contenu(t))
+
+    def bench_split(self):
+        for pages in (20, 100, 300):
+            name = f"split_pdf_into_chunks[{pages}p]"
+            if self.only and not any(token in name for token in self.only):
+                continue
+            path = generate_pdf(os.path.join(self.workdir, f"split_{pages}.pdf"), pages, 0.5, seed=pages)
+
+            def cleanup(_, chunks, source=path):
+                for chunk in chunks:
+                    if chunk != source and os.path.exists(chunk):
+                        os.remove(chunk)
+
+            self.case(name, lambda _, p=path: server.split_pdf_into_chunks(p), setup=lambda: None,
+                      teardown=cleanup, min_rounds=3, min_time=0)
+
+    def bench_destruction(self):
+        for label, size in (("64KB", 64 * 1024), ("1MB", 1024 * 1024), ("8MB", 8 * 1024 * 1024)):
+            payload = os.urandom(size)
+
+            def create(data=payload):
+                path = os.path.join(self.workdir, f"destroy_{time.perf_counter_ns()}.bin")
+                with open(path, "wb") as f:
+                    f.write(data)
+                return path
+
+            self.case(f"destruction_securisee[{label}]", server.destruction_securisee, setup=create,
+                      min_rounds=5, min_time=0.2)
+
+    def bench_zip_extraction(self):
+        member = generate_pdf(os.path.join(self.workdir, "member.pdf"), 12, 0.3, seed=7)
+        for count in (1, 5, 20):
+            name = f"extract_pdfs_from_zip[{count}]"
+            if self.only and not any(token in name for token in self.only):
+                continue
+            archive = os.path.join(self.workdir, f"bundle_{count}.zip")
+            with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+                for i in range(count):
+                    z.write(member, f"dossier/piece_{i}.pdf")
+
+            def cleanup(_, paths):
+                for path in paths:
+                    os.remove(path)
+
+            self.case(name, lambda _, a=archive: server.extract_pdfs_from_zip(a), setup=lambda: None,
+                      teardown=cleanup, min_rounds=3)
+
+    def stub_report(self):
+        """Synthetic segment answer: Markdown report followed by the structured JSON sidecar."""
+        return server.llm_provider.rapport_synthetique(random.Random(0), server.StubProvider.MEDECINS[:4]) \
+            if isinstance(server.llm_provider, server.StubProvider) else dossier_text(6000)
+
+    def bench_partial_report(self):
+        segment = server.separer_donnees(self.stub_report())[0]
+        for count in (5, 20, 80):
+            analyses = [segment] * count
+            self.case(f"assembler_rapport_partiel[{count}]",
+                      lambda a=analyses, n=count: server.assembler_rapport_partiel(a, n))
+
+    def bench_structured_data(self):
+        answer = self.stub_report()
+        markdown = server.separer_donnees(answer)[0]
+        self.case("separer_donnees[sidecar]", lambda: server.separer_donnees(answer))
+        # No sidecar: médecins are read back from the Markdown table
+        self.case("separer_donnees[table]", lambda: server.separer_donnees(markdown))
+
+    def run_all(self):
+        self.bench_anonymization()
+        self.bench_moderation()
+        self.bench_split()
+        self.bench_destruction()
+        self.bench_zip_extraction()
+        self.bench_partial_report()
+        self.bench_structured_data()
+        return self.results
+
+
+def compare(results, baseline, tolerance):
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"\n📊 Comparison with baseline (tolerance {tolerance:.0%})")
+    for result in results:
+        before = previous.get(result["name"])
+        if not before:
+            continue
+        delta = (result["median_s"] - before["median_s"]) / before["median_s"]
+        worse = delta > tolerance
+        print(f"  {'❌' if worse else '  '} {result['name']:<38} {before['median_s'] * 1000:10.3f} ms -> "
+              f"{result['median_s'] * 1000:10.3f} ms ({delta:+.1%})")
+        if worse:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="L'Éclaireur micro-benchmarks")
+    parser.add_argument("--only", nargs="*", help="Run cases whose name contains one of these tokens")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    print("🚀 Starting L'Éclaireur micro-benchmarks")
+    with tempfile.TemporaryDirectory(prefix="eclaireur-micro-") as workdir:
+        # Chunks and extracted files land in the temp dir, like in production
+        results = LEclaireurMicroBenchmark(workdir, args.only).run_all()
+    server.arreter_executeur_cpu()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+    failed = [r["name"] for r in results if not r["within_threshold"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed += compare(results, json.load(f), args.tolerance)
+    if failed:
+        print(f"\n❌ {len(failed)} case(s) over threshold: {', '.join(sorted(set(failed)))}")
+        return 1
+    print(f"\n✅ {len(results)} cases within thresholds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,9 @@
 """
 L'Éclaireur Backend API Testing Suite
 Tests all backend endpoints for the Quebec workers' compensation tool
+
+    python backend_test.py          # API tests against the deployed backend
+    python backend_test.py --unit   # in-process checks of backend/server.py (stub LLM, no network)
 """
 
 import requests
@@ -10,6 +13,12 @@ import json
 from datetime import datetime
 import tempfile
 import os
+import re
+import asyncio
+import base64
+import shutil
+import subprocess
+import time
 
 class LEclaireurAPITester:
     def __init__(self, base_url="https://decompile-main.preview.emergentagent.com"):
@@ -237,7 +246,10 @@ class LEclaireurAPITester:
         # Analysis endpoint structure test
         self.test_analyze_endpoint_structure()
         
-        # Print summary
+        return self.print_summary()
+    
+    def print_summary(self):
+        """Print the results and return True if every test passed"""
         print("=" * 60)
         print(f"📊 Test Results: {self.tests_passed}/{self.tests_run} passed")
         
@@ -251,9 +263,668 @@ class LEclaireurAPITester:
         
         return self.tests_passed == self.tests_run
 
+class LEclaireurUnitTester(LEclaireurAPITester):
+    """In-process checks of backend building blocks (moderation, admission, scheduling, pagination, parsing)"""
+    
+    def __init__(self):
+        super().__init__()
+        # Importing server connects to nothing: Motor is lazy and the stub provider makes no network call
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "eclaireur_test")
+        os.environ.setdefault("LLM_PROVIDER", "stub")
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+        import server
+        self.server = server
+        self.tests_skipped = 0
+    
+    def skip_test(self, name, reason):
+        """Report a check that cannot run in this environment"""
+        self.tests_skipped += 1
+        print(f"⏭️  {name} - SKIPPED: {reason}")
+    
+    def run_with_database(self, name, scenario):
+        """Run an async scenario against an in-memory MongoDB (mongomock-motor); scenario returns an error or None"""
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            self.skip_test(name, "mongomock-motor not installed")
+            return None
+        server = self.server
+        precedente = server.db
+        server.db = AsyncMongoMockClient()["eclaireur_test"]
+        try:
+            erreur = asyncio.run(scenario())
+            self.log_test(name, erreur is None, erreur or "")
+            return erreur is None
+        except Exception as e:
+            self.log_test(name, False, f"Exception: {type(e).__name__}: {str(e)}")
+            return False
+        finally:
+            server.db = precedente
+    
+    def test_segment_bisection(self):
+        """Test that oversized or slow segments are analysed by page-range halves, and other errors are not"""
+        from backend_benchmark import generate_pdf
+        server = self.server
+        
+        classes = [
+            (Exception("413 Request Entity Too Large"), "taille"),
+            (Exception("400 INVALID_ARGUMENT: request payload exceeds the maximum size"), "taille"),
+            (Exception("429 RESOURCE_EXHAUSTED: quota exceeded"), "temporaire"),
+            (Exception("Resource has been exhausted (e.g. check quota)."), "temporaire"),
+            (TimeoutError(), "delai"),
+            (Exception("504 Deadline Exceeded"), "delai"),
+            (Exception("503 Service Unavailable"), "temporaire"),
+            (ValueError("réponse illisible"), "autre"),
+        ]
+        for erreur, attendu in classes:
+            if server.nature_erreur(erreur) != attendu:
+                self.log_test("Segment Bisection", False, f"{erreur!r}: {server.nature_erreur(erreur)}, expected {attendu}")
+                return False
+        
+        appels = []
+        panne = {"mode": None}
+        preparer = server.StubChat._preparer
+        
+        async def preparer_fragile(chat, message):
+            pages = [int(n) for n in re.findall(r"=== PAGE (\d+)", message.text)]
+            appels.append(pages)
+            if panne["mode"] == "quota":
+                raise Exception("429 RESOURCE_EXHAUSTED: quota exceeded")
+            if len(pages) > 2:
+                if panne["mode"] == "taille":
+                    raise Exception("400 INVALID_ARGUMENT: request payload exceeds the maximum size")
+                await asyncio.sleep(1)  # "delai": only small segments answer in time
+            return await preparer(chat, message)
+        
+        async def analyser(mode, profondeur_max=3, delai=0.4):
+            panne["mode"] = mode
+            appels.clear()
+            server.SEGMENT_SPLIT_MAX_DEPTH = profondeur_max
+            return await server.analyze_pdf_segment(chemin, 1, 1, max_retries=2, delai=delai)
+        
+        async def scenario():
+            # Each refused range is cut in two, keeping the original page numbers, until the halves pass
+            rapport = await analyser("taille")
+            feuilles = [pages for pages in appels if len(pages) <= 2]
+            if appels[:3] != [list(range(1, 9)), [1, 2, 3, 4], [1, 2]] or sum(feuilles, []) != list(range(1, 9)):
+                return f"Unexpected split on size: {appels}"
+            if "Erreur" in rapport or server.MARQUEUR_DONNEES not in rapport:
+                return f"Halves not stitched back: {rapport[:200]}"
+            # A timeout splits right away instead of retrying the same range
+            rapport = await analyser("delai")
+            if appels.count(list(range(1, 9))) != 1 or "Erreur" in rapport:
+                return f"Timeout retried the whole range: {appels}"
+            # Failure paths: split depth exhausted, and quota errors that must not multiply calls
+            rapport = await analyser("taille", profondeur_max=1)
+            if "Erreur lors de l'analyse" not in rapport or max(len(pages) for pages in appels) != 8:
+                return f"Exhausted depth did not fail the segment: {appels}"
+            rapport = await analyser("quota")
+            if any(pages != list(range(1, 9)) for pages in appels) or "Erreur lors de l'analyse" not in rapport:
+                return f"Quota error split the segment: {appels}"
+            if [f for f in os.listdir(racine) if "_moitie_" in f]:
+                return f"Halves left on disk: {os.listdir(racine)}"
+            return None
+        
+        racine = tempfile.mkdtemp()
+        chemin = generate_pdf(os.path.join(racine, "dossier.pdf"), 8, 0.0, seed=5)
+        precedent = (server.SEGMENT_SPLIT_MAX_DEPTH, server.attendre_avant_retry, server.llm_provider.latency,
+                     server.llm_provider.jitter, server.llm_provider.error_rate)
+        server.StubChat._preparer = preparer_fragile
+        server.attendre_avant_retry = lambda kind, secondes: asyncio.sleep(0)
+        server.llm_provider.latency = server.llm_provider.jitter = server.llm_provider.error_rate = 0
+        try:
+            erreur = asyncio.run(scenario())
+            self.log_test("Segment Bisection", erreur is None, erreur or "")
+            return erreur is None
+        except Exception as e:
+            self.log_test("Segment Bisection", False, f"Exception: {type(e).__name__}: {str(e)}")
+        finally:
+            server.StubChat._preparer = preparer
+            (server.SEGMENT_SPLIT_MAX_DEPTH, server.attendre_avant_retry, server.llm_provider.latency,
+             server.llm_provider.jitter, server.llm_provider.error_rate) = precedent
+            server.arreter_executeur_cpu()
+            shutil.rmtree(racine, ignore_errors=True)
+        return False
+    
+    def test_crypto_shredding(self):
+        """Test that job blobs are bound to their job and unreadable once the job key is destroyed"""
+        from cryptography.exceptions import InvalidTag
+        server = self.server
+        
+        async def scenario():
+            racine = tempfile.mkdtemp()
+            precedent = (server.stockage_blobs, server.BLOB_ENCRYPTION_KEY)
+            stockage = server.StockageVolume(racine)
+            server.stockage_blobs = stockage
+            server.BLOB_ENCRYPTION_KEY = base64.b64encode(os.urandom(32)).decode()
+            try:
+                coffre = server.CoffreJob("job-a")
+                if "job-a" not in server.manifeste_temporaires.jobs:
+                    return "Owned job missing from the manifest"
+                blob_id = await coffre.put(b"NAS 123 456 789")
+                with open(stockage.chemin(blob_id), "rb") as f:
+                    if b"NAS 123" in f.read():
+                        return "Blob stored in clear"
+                if await coffre.get(blob_id) != b"NAS 123 456 789":
+                    return "Round trip failed"
+                
+                # A blob copied under another job or blob id does not decrypt, even with the same key
+                shutil.copy(stockage.chemin(blob_id), stockage.chemin("job-b.copie"))
+                shutil.copy(stockage.chemin(blob_id), stockage.chemin("job-a.copie"))
+                for autre, copie in ((server.CoffreJob("job-b", coffre.cle), "job-b.copie"), (coffre, "job-a.copie")):
+                    try:
+                        await autre.get(copie)
+                        return f"Relabelled blob {copie} decrypted"
+                    except InvalidTag:
+                        pass
+                
+                # Workers open the job through the wrapped key until it is destroyed
+                await server.deposer_cle_job(coffre)
+                if await (await server.ouvrir_coffre("job-a")).get(blob_id) != b"NAS 123 456 789":
+                    return "Worker could not read the job"
+                await server.nettoyer_taches_job("job-a")
+                try:
+                    await server.ouvrir_coffre("job-a")
+                    return "Destroyed key still opened the job"
+                except RuntimeError:
+                    pass
+                
+                # A storage failure during destruction still forgets the key
+                supprimer = stockage.supprimer
+                async def supprimer_en_panne(blob_id):
+                    raise OSError("volume indisponible")
+                stockage.supprimer = supprimer_en_panne
+                await coffre.detruire()
+                stockage.supprimer = supprimer
+                if coffre.cle is not None or "job-a" in server.manifeste_temporaires.jobs:
+                    return "Key kept after destruction"
+                try:
+                    await coffre.get(blob_id)
+                    return "Destroyed job still readable"
+                except RuntimeError:
+                    pass
+                await coffre.detruire()  # idempotent
+                
+                # Without a master key, distributed mode refuses to wrap job keys
+                server.BLOB_ENCRYPTION_KEY = ""
+                try:
+                    await server.deposer_cle_job(server.CoffreJob("job-c", os.urandom(32)))
+                    return "Job key shared without a master key"
+                except RuntimeError:
+                    pass
+                return None
+            finally:
+                server.manifeste_temporaires.retirer_job("job-a")
+                server.stockage_blobs, server.BLOB_ENCRYPTION_KEY = precedent
+                shutil.rmtree(racine, ignore_errors=True)
+        
+        return self.run_with_database("Crypto Shredding", scenario)
+    
+    def test_janitor_protection(self):
+        """Test that the janitor only removes old artefacts no live process or job still owns"""
+        server = self.server
+        
+        async def scenario():
+            racine = tempfile.mkdtemp()
+            precedent = (server.EPHEMERAL_DIR, server.BLOB_VOLUME_DIR, server.stockage_blobs)
+            server.EPHEMERAL_DIR = racine
+            server.BLOB_VOLUME_DIR = os.path.join(racine, "blobs")
+            stockage = server.StockageVolume(server.BLOB_VOLUME_DIR)
+            server.stockage_blobs = stockage
+            
+            # A pid that was alive once and is not anymore
+            termine = subprocess.Popen([sys.executable, "-c", "pass"])
+            termine.wait()
+            espaces = {
+                "autre_worker": f"eclaireur-{os.getppid()}-a1",
+                "worker_mort": f"eclaireur-{termine.pid}-b2",
+                "ancien_format": "eclaireur-c3",
+                "manifeste": f"eclaireur-{os.getpid()}-d4",
+            }
+            for nom in espaces.values():
+                os.makedirs(os.path.join(racine, nom))
+                with open(os.path.join(racine, nom, "page.pdf"), "wb") as f:
+                    f.write(b"x" * 10)
+            server.manifeste_temporaires.ajouter_espace(os.path.join(racine, espaces["manifeste"]))
+            
+            await server.db.analysis_jobs.insert_many([
+                {"job_id": "actif", "status": "processing"},
+                {"job_id": "termine", "status": "completed"},
+            ])
+            server.manifeste_temporaires.ajouter_job("local")
+            for job_id in ("actif", "termine", "inconnu", "local", "illisible"):
+                await stockage.ecrire(f"{job_id}.0", b"chiffre")
+            
+            ancien = time.time() - 7200
+            for dossier in (racine, server.BLOB_VOLUME_DIR):
+                for nom in os.listdir(dossier):
+                    os.utime(os.path.join(dossier, nom), (ancien, ancien))
+            
+            # A storage failure is counted and does not stop the pass
+            supprimer = stockage.supprimer
+            async def supprimer_partiel(blob_id):
+                if blob_id.startswith("illisible."):
+                    raise OSError("volume en lecture seule")
+                await supprimer(blob_id)
+            stockage.supprimer = supprimer_partiel
+            
+            try:
+                nettoyeur = server.NettoyeurTemporaires(0, 3600, 2)
+                await nettoyeur.passage()
+                restants = sorted(os.listdir(racine))
+                blobs = sorted(os.listdir(server.BLOB_VOLUME_DIR))
+                attendus = sorted(["blobs", espaces["autre_worker"], espaces["manifeste"]])
+                if restants != attendus:
+                    return f"Workspaces left: {restants}, expected {attendus}"
+                if blobs != ["actif.0.bin", "illisible.0.bin", "local.0.bin"]:
+                    return f"Blobs left: {blobs}"
+                progression = nettoyeur.dernier_passage
+                if (progression["removed"], progression["errors"]) != (4, 1):
+                    return f"Unexpected progress: {progression}"
+                return None
+            finally:
+                server.manifeste_temporaires.retirer_espace(os.path.join(racine, espaces["manifeste"]))
+                server.manifeste_temporaires.retirer_job("local")
+                server.EPHEMERAL_DIR, server.BLOB_VOLUME_DIR, server.stockage_blobs = precedent
+                shutil.rmtree(racine, ignore_errors=True)
+        
+        return self.run_with_database("Janitor Protection", scenario)
+    
+    def test_medecins_extraction_retry(self):
+        """Test that a report's decisions are counted once across crashes, retries and concurrent extractors"""
+        server = self.server
+        
+        async def scenario():
+            db = server.db
+            await server.creer_index_medecins()
+            roy = {"nom": "ROY", "prenom": "Sophie", "conclusion_favorable_a": "employe"}
+            # Two extractors see the same doctor at the same time, spelled differently
+            await asyncio.gather(
+                server.appliquer_medecins([roy], "r1.pdf", "h1"),
+                server.appliquer_medecins([{**roy, "nom": "Roy", "prenom": "SOPHIE"}], "r2.pdf", "h2"),
+            )
+            if await db.medecins.count_documents({}) != 1:
+                return f"Duplicate doctors: {await db.medecins.count_documents({})}"
+            
+            # Crash after the decision row is written, before the counters are updated
+            compter = server.compter_decision
+            async def panne(*args, **kwargs):
+                raise RuntimeError("panne simulée")
+            server.compter_decision = panne
+            try:
+                await server.appliquer_medecins([roy], "r3.pdf", "h3")
+                return "Simulated crash did not raise"
+            except RuntimeError:
+                pass
+            finally:
+                server.compter_decision = compter
+            await server.appliquer_medecins([roy], "r3.pdf", "h3")  # retry completes the count
+            await server.appliquer_medecins([roy], "r3.pdf", "h3")  # second retry changes nothing
+            
+            medecin = await db.medecins.find_one({})
+            if (medecin["total_decisions"], medecin["decisions_pro_employe"], medecin["pourcentage_pro_employe"]) != (3, 3, 100.0):
+                return f"Counters not idempotent: {medecin}"
+            return None
+        
+        return self.run_with_database("Medecins Extraction Retry", scenario)
+    
+    def test_moderation_engine(self):
+        """Test MoteurModeration word boundaries, prefixes and accent folding"""
+        try:
+            moteur = self.server.MoteurModeration(["con", "bâtard*", "fils de pute"])
+            cases = [
+                ("constat médical", None),            # word inside a longer word
+                ("abâtard", None),                    # match must start on a word boundary
+                ("Quel CON!", "CON"),                 # case and punctuation
+                ("l'con", "con"),
+                ("des BATARDS", "BATARDS"),           # accent folding, free ending covers the whole word
+                ("fils   de\nPUTE", "fils   de\nPUTE"),  # multi-word term across collapsed whitespace
+            ]
+            for texte, attendu in cases:
+                trouves = moteur.rechercher(texte, premier_seulement=True)
+                extrait = trouves[0]["extrait"] if trouves else None
+                if extrait != attendu:
+                    self.log_test("Moderation Engine", False, f"{texte!r}: expected {attendu!r}, got {extrait!r}")
+                    return False
+            
+            # The rejection message must not reveal the matched term
+            est_valide, message = self.server.moderer_contenu("Ce médecin est un con")
+            if est_valide or "con" in message.lower().replace("contenu", ""):
+                self.log_test("Moderation Engine", False, f"Unexpected rejection: {est_valide}, {message!r}")
+                return False
+            # Clean text and an empty dictionary never reject
+            if not self.server.moderer_contenu("Le médecin a conclu à une consolidation")[0]:
+                self.log_test("Moderation Engine", False, "Clean text rejected")
+                return False
+            if self.server.MoteurModeration([]).rechercher("Quel con", premier_seulement=True):
+                self.log_test("Moderation Engine", False, "Empty dictionary matched")
+                return False
+            self.log_test("Moderation Engine", True)
+            return True
+        except Exception as e:
+            self.log_test("Moderation Engine", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_admission_controller(self):
+        """Test ControleurAdmission hand-off to the queue and the 429 path"""
+        server = self.server
+        
+        async def scenario():
+            controleur = server.ControleurAdmission(max_concurrent=1, max_queue=1)
+            premier = controleur.reserver("sync")
+            second = controleur.reserver("sync")
+            if not premier.accorde or second.accorde or second.position() != 1:
+                return f"Unexpected grant: {controleur.etat()}"
+            try:
+                controleur.reserver("sync")
+                return "Third request was not refused with a full queue"
+            except server.AdmissionRefusee as e:
+                if e.retry_after < 1:
+                    return f"Retry-After too small: {e.retry_after}"
+            
+            async with premier:
+                pass
+            # The freed slot goes straight to the waiting request
+            if not second.future.done() or controleur.actives != 1 or controleur.file:
+                return f"No hand-off: {controleur.etat()}"
+            async with second:
+                pass
+            if controleur.actives != 0:
+                return f"Slot leaked: {controleur.etat()}"
+            
+            # A queued request abandoned before its turn is skipped, and an error inside the block frees the slot
+            premier = controleur.reserver("sync")
+            abandonne = controleur.reserver("sync")
+            abandonne.annuler()
+            try:
+                async with premier:
+                    raise RuntimeError("échec de l'analyse")
+            except RuntimeError:
+                pass
+            if controleur.actives != 0 or controleur.file:
+                return f"Abandoned ticket or failed block leaked a slot: {controleur.etat()}"
+            
+            # Endpoint helper: a full queue becomes 429 with Retry-After
+            precedent = server.admission_analyses
+            server.admission_analyses = server.ControleurAdmission(max_concurrent=0, max_queue=0)
+            try:
+                server.reserver_analyse("sync")
+                return "reserver_analyse did not refuse"
+            except server.HTTPException as e:
+                if e.status_code != 429 or not e.headers.get("Retry-After"):
+                    return f"Unexpected refusal: {e.status_code} {e.headers}"
+            finally:
+                server.admission_analyses = precedent
+            return None
+        
+        try:
+            erreur = asyncio.run(scenario())
+            self.log_test("Admission Controller", erreur is None, erreur or "")
+            return erreur is None
+        except Exception as e:
+            self.log_test("Admission Controller", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_segment_scheduler(self):
+        """Test deficit round-robin ordering in OrdonnanceurSegments"""
+        server = self.server
+        
+        async def ordre(travaux):
+            ordonnanceur = server.OrdonnanceurSegments(1)
+            occupant = server.TravailSegmente("occupant", "job-0", 1)
+            await ordonnanceur.attendre(occupant)
+            servis = []
+            
+            async def segment(travail):
+                await ordonnanceur.attendre(travail)
+                servis.append(travail.client)
+                await asyncio.sleep(0)
+                ordonnanceur.rendre(travail)
+            
+            taches = [asyncio.create_task(segment(t)) for t in travaux]
+            await asyncio.sleep(0)
+            ordonnanceur.rendre(occupant)
+            await asyncio.gather(*taches)
+            if ordonnanceur.en_cours or ordonnanceur.files:
+                raise AssertionError(f"Scheduler not drained: {ordonnanceur.en_cours}, {dict(ordonnanceur.files)}")
+            return servis
+        
+        async def annulation():
+            # The slot is released after a waiting task is cancelled but before it could withdraw
+            ordonnanceur = server.OrdonnanceurSegments(1)
+            a = server.TravailSegmente("A", "job-a", 1)
+            b = server.TravailSegmente("B", "job-b", 1)
+            await ordonnanceur.attendre(a)
+            attente = asyncio.create_task(ordonnanceur.attendre(b))
+            await asyncio.sleep(0)
+            attente.cancel()
+            ordonnanceur.rendre(a)
+            try:
+                await attente
+                return "Cancelled wait was granted the slot"
+            except asyncio.CancelledError:
+                pass
+            if ordonnanceur.en_cours or ordonnanceur.files:
+                return f"Slot leaked after cancellation: en_cours={ordonnanceur.en_cours}"
+            c = server.TravailSegmente("C", "job-c", 1)
+            await asyncio.wait_for(ordonnanceur.attendre(c), 1)
+            ordonnanceur.rendre(c)
+            return None
+        
+        try:
+            # A one-segment job overtakes a long job queued before it
+            long_job = server.TravailSegmente("A", "job-a", 10)
+            court = server.TravailSegmente("B", "job-b", 1)
+            servis = asyncio.run(ordre([long_job, long_job, long_job, court]))
+            if servis != ["B", "A", "A", "A"]:
+                self.log_test("Segment Scheduler", False, f"Short job not first: {servis}")
+                return False
+            # Two clients with short jobs alternate
+            a = server.TravailSegmente("A", "job-a", 3)
+            b = server.TravailSegmente("B", "job-b", 3)
+            servis = asyncio.run(ordre([a, a, a, b, b, b]))
+            if servis != ["A", "B", "A", "B", "A", "B"]:
+                self.log_test("Segment Scheduler", False, f"Clients not alternating: {servis}")
+                return False
+            erreur = asyncio.run(annulation())
+            if erreur:
+                self.log_test("Segment Scheduler", False, erreur)
+                return False
+            self.log_test("Segment Scheduler", True)
+            return True
+        except Exception as e:
+            self.log_test("Segment Scheduler", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_cursor_pagination(self):
+        """Test cursor encoding and a full walk with page_par_curseur"""
+        server = self.server
+        
+        class Collection:
+            """Just enough of a Motor collection for the (sort key, id) range queries"""
+            def __init__(self, documents):
+                self.documents = documents
+            
+            def find(self, requete, projection):
+                def garde(doc):
+                    for branche in requete.get("$or", [{}]):
+                        if all(self.compare(doc[k], v) for k, v in branche.items()):
+                            return True
+                    return False
+                self.resultat = [dict(d) for d in self.documents if garde(d)]
+                return self
+            
+            @staticmethod
+            def compare(valeur, condition):
+                if not isinstance(condition, dict):
+                    return valeur == condition
+                op, borne = next(iter(condition.items()))
+                return valeur > borne if op == "$gt" else valeur < borne
+            
+            def sort(self, cles):
+                for cle, ordre in reversed(cles):
+                    self.resultat.sort(key=lambda d: d[cle], reverse=ordre == -1)
+                return self
+            
+            async def to_list(self, n):
+                return self.resultat[:n]
+        
+        try:
+            valeurs = ["2024-05-01T10:00:00+00:00", "é-1"]
+            curseur = server.encoder_curseur(valeurs)
+            if server.decoder_curseur(curseur) != valeurs or "=" in curseur:
+                self.log_test("Cursor Pagination", False, f"Round trip failed: {curseur}")
+                return False
+            for invalide in ["!!!", server.encoder_curseur([1, 2, 3]), server.encoder_curseur({"a": 1}),
+                             server.encoder_curseur([{"$ne": None}, {"$gt": ""}]),
+                             server.encoder_curseur(["2024-01-01", ["t1"]]), server.encoder_curseur([True, "t1"])]:
+                try:
+                    server.decoder_curseur(invalide)
+                    self.log_test("Cursor Pagination", False, f"Invalid cursor accepted: {invalide}")
+                    return False
+                except server.HTTPException as e:
+                    if e.status_code != 400:
+                        self.log_test("Cursor Pagination", False, f"Invalid cursor status: {e.status_code}")
+                        return False
+            
+            # Ties on the sort key are broken by id: every document is seen exactly once
+            documents = [{"id": f"t{i}", "timestamp": f"2024-01-0{1 + i // 3}"} for i in range(8)]
+            collection = Collection(documents)
+            
+            async def parcourir():
+                vus, curseur = [], None
+                while True:
+                    page, curseur = await server.page_par_curseur(
+                        collection, {}, "timestamp", -1, 3, curseur, {"_id": 0}
+                    )
+                    vus.extend(d["id"] for d in page)
+                    if not curseur:
+                        return vus
+            
+            vus = asyncio.run(parcourir())
+            attendu = [d["id"] for d in sorted(documents, key=lambda d: (d["timestamp"], d["id"]), reverse=True)]
+            if vus != attendu:
+                self.log_test("Cursor Pagination", False, f"Walk returned {vus}, expected {attendu}")
+                return False
+            self.log_test("Cursor Pagination", True)
+            return True
+        except Exception as e:
+            self.log_test("Cursor Pagination", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_structured_data_parsing(self):
+        """Test lire_json_tolerant and separer_donnees on imperfect model output"""
+        server = self.server
+        try:
+            cases = [
+                ('Voici:\n```json\n{"a": [1, 2,],}\n```', {"a": [1, 2]}),  # fences, prose, trailing commas
+                ('{“a”: 1}', {"a": 1}),                                    # typographic quotes
+                ("pas de données", None),
+                ("{cassé", None),
+            ]
+            for texte, attendu in cases:
+                obtenu = server.lire_json_tolerant(texte)
+                if obtenu != attendu:
+                    self.log_test("Structured Data Parsing", False, f"{texte!r}: got {obtenu!r}")
+                    return False
+            
+            marqueur = server.MARQUEUR_DONNEES
+            reponse = ("# Rapport\ntexte\n" + marqueur +
+                       '\n```json\n{"medecins": [{"nom": "ROY"}, "x"], "dates": "non"}\n```')
+            rapport, donnees = server.separer_donnees(reponse)
+            if rapport != "# Rapport\ntexte" or donnees["medecins"] != [{"nom": "ROY"}] or donnees["dates"] != []:
+                self.log_test("Structured Data Parsing", False, f"Marker split: {rapport!r}, {donnees}")
+                return False
+            # Forgotten marker: a final ```json block with the physicians is still taken
+            rapport, donnees = server.separer_donnees('# Rapport\n```json\n{"medecins": [{"nom": "ROY"}]}\n```')
+            if rapport != "# Rapport" or donnees["medecins"] != [{"nom": "ROY"}]:
+                self.log_test("Structured Data Parsing", False, f"Fallback block: {rapport!r}, {donnees}")
+                return False
+            # Unreadable JSON: the report is kept, the data is empty but complete
+            rapport, donnees = server.separer_donnees("# Rapport\n" + marqueur + "{pas du json")
+            if rapport != "# Rapport" or set(donnees) != set(server.CHAMPS_DONNEES) or any(donnees.values()):
+                self.log_test("Structured Data Parsing", False, f"Broken JSON: {rapport!r}, {donnees}")
+                return False
+            self.log_test("Structured Data Parsing", True)
+            return True
+        except Exception as e:
+            self.log_test("Structured Data Parsing", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_report_reduction(self):
+        """Test that segment findings merge physicians by name and keep other rows intact"""
+        server = self.server
+        
+        def segment(numero, lignes_medecins, lignes_chronologie):
+            return server.extraire_constats("\n".join([
+                "## 4. 👨‍⚕️ MÉDECINS ET EXPERTS IDENTIFIÉS",
+                "| # | Médecin | Spécialité | Mandat | Conclusion |",
+                "|---|---|---|---|---|",
+                *lignes_medecins,
+                "## 2. 📅 CHRONOLOGIE",
+                "| Date | Événement |",
+                "|---|---|",
+                *lignes_chronologie,
+            ]), numero)
+        
+        try:
+            constats = server.reduire_constats([
+                segment(1, ["| 1 | Dr Louise TREMBLAY | Orthopédie | BEM | |"], ["| 01/02/2024 | Accident |"]),
+                segment(2, ["| 1 | Dre TREMBLAY, Louise | orthopédie | | Favorable à l'employeur |",
+                            "| 2 | Dr Marc TREMBLAY | Psychiatrie | Employeur | |"],
+                        ["| 01/02/2024 | Accident |", "| 01/02/2024 | Consultation |"]),
+                segment(3, ["| 1 | Dr L. Gagnon | | | |", "| 2 | Dr Louise Tremblay | | CNESST | |"], []),
+            ])
+            medecins = constats["medecins"]["rows"]
+            attendus = [
+                ["1", "Dr Louise TREMBLAY", "Orthopédie", "BEM; CNESST", "Favorable à l'employeur"],
+                ["2", "Dr Marc TREMBLAY", "Psychiatrie", "Employeur", ""],
+                ["1", "Dr L. Gagnon", "", "", ""],
+            ]
+            if medecins != attendus:
+                self.log_test("Report Reduction", False, f"Physicians: {medecins}")
+                return False
+            # Rows outside the physicians table are still deduplicated on their whole text only
+            chronologie = constats["chronologie"]["rows"]
+            if chronologie != [["01/02/2024", "Accident"], ["01/02/2024", "Consultation"]]:
+                self.log_test("Report Reduction", False, f"Timeline: {chronologie}")
+                return False
+            # A row without a readable name is kept as is, never merged into another one
+            anonymes = server.reduire_constats([segment(1, ["| 1 | * | Orthopédie | | |"], []),
+                                                segment(2, ["| 1 | * | Psychiatrie | | |"], [])])
+            if len(anonymes["medecins"]["rows"]) != 2:
+                self.log_test("Report Reduction", False, f"Unnamed rows: {anonymes['medecins']['rows']}")
+                return False
+            self.log_test("Report Reduction", True)
+            return True
+        except Exception as e:
+            self.log_test("Report Reduction", False, f"Exception: {str(e)}")
+        return False
+    
+    def run_all_tests(self):
+        """Run all in-process checks"""
+        print("🚀 Starting L'Éclaireur Backend Unit Checks")
+        print("=" * 60)
+        
+        self.test_moderation_engine()
+        self.test_admission_controller()
+        self.test_segment_scheduler()
+        self.test_cursor_pagination()
+        self.test_structured_data_parsing()
+        self.test_segment_bisection()
+        self.test_report_reduction()
+        self.test_medecins_extraction_retry()
+        self.test_crypto_shredding()
+        self.test_janitor_protection()
+        
+        if self.tests_skipped:
+            print(f"⏭️  {self.tests_skipped} check(s) skipped")
+        return self.print_summary()
+
 def main():
     """Main test execution"""
-    tester = LEclaireurAPITester()
+    tester = LEclaireurUnitTester() if "--unit" in sys.argv[1:] else LEclaireurAPITester()
     
     try:
         success = tester.run_all_tests()
@@ -8,6 +8,69 @@ import { saveAs } from "file-saver";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Identifiant de session: le serveur répartit les analyses équitablement entre utilisateurs
+const getClientId = () => {
+  let id = sessionStorage.getItem("eclaireur_client_id");
+  if (!id) {
+    id = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    sessionStorage.setItem("eclaireur_client_id", id);
+  }
+  return id;
+};
+axios.defaults.headers.common["X-Client-Id"] = getClientId();
+
+// Suivre une analyse asynchrone via Server-Sent Events (au lieu du polling)
+const followAnalysisEvents = (jobId, signal, onUpdate) => new Promise((resolve, reject) => {
+  const source = new EventSource(`${API}/analyze-events/${jobId}`);
+  const state = {};
+  const segments = {};
+  const live = {}; // texte en cours de réception, par segment
+  let received = false;
+
+  const partialAnalysis = () => {
+    const indexes = Object.keys(segments).map(Number).sort((a, b) => a - b);
+    if (indexes.length === 0) return state.partial_analysis;
+    return indexes.map(i => `### Segment ${i}/${state.total_segments}\n\n${segments[i]}`).join("---\n\n");
+  };
+
+  const liveText = () => Object.keys(live).map(Number).sort((a, b) => a - b)
+    .map(i => `### Segment ${i}/${state.total_segments || "?"} (en cours)\n\n${live[i]}`).join("\n");
+
+  const apply = (event) => {
+    received = true;
+    const { segment_delta, segment_reset, live_segment, ...data } = JSON.parse(event.data);
+    // Flux en mémoire: morceaux successifs; nouvelle tentative: le texte du segment est abandonné
+    if (segment_delta) live[segment_delta.index] = (live[segment_delta.index] || "") + segment_delta.delta;
+    if (segment_reset) delete live[segment_reset.index];
+    // Change stream et relecture: texte cumulé du segment en cours
+    if (live_segment && !(live_segment.index in segments)) live[live_segment.index] = live_segment.text;
+    if (data.last_segment) {
+      segments[data.last_segment.index] = data.last_segment.text;
+      delete live[data.last_segment.index];
+    }
+    Object.assign(state, data, { live_text: liveText() });
+    onUpdate(state);
+    if (state.status === "completed" || state.status === "failed") {
+      source.close();
+      resolve({ ...state, analysis: state.status === "completed" ? state.analysis : partialAnalysis() });
+    }
+  };
+
+  source.addEventListener("snapshot", apply);
+  source.addEventListener("progress", apply);
+  source.onerror = () => {
+    // Le navigateur se reconnecte seul; abandonner seulement si le flux n'a jamais fonctionné
+    if (!received || source.readyState === EventSource.CLOSED) {
+      source.close();
+      reject(new Error("Flux de progression indisponible"));
+    }
+  };
+  signal.addEventListener("abort", () => {
+    source.close();
+    reject(Object.assign(new Error("canceled"), { name: "CanceledError" }));
+  });
+});
+
 // ===== COMPOSANT POPUP MENTIONS LÉGALES =====
 const LegalPopup = ({ onAccept }) => {
   const [consent1, setConsent1] = useState(false);
@@ -715,6 +778,7 @@ const AnalysisPage = ({ onBackHome, consentAiLearning }) => {
   const [showDestructionPopup, setShowDestructionPopup] = useState(false);
   const [abortController, setAbortController] = useState(null);
   const [progress, setProgress] = useState(0);
+  const [liveText, setLiveText] = useState("");
   const [showLatencyPopup, setShowLatencyPopup] = useState(false);
   const [analysisId, setAnalysisId] = useState(null);
   const [showLargeFileWarning, setShowLargeFileWarning] = useState(false);
@@ -841,6 +905,7 @@ const AnalysisPage = ({ onBackHome, consentAiLearning }) => {
     setError(null);
     setResult(null);
     setProgress(0);
+    setLiveText("");
     
     // Créer un AbortController pour permettre l'annulation
     const controller = new AbortController();
@@ -867,9 +932,45 @@ const AnalysisPage = ({ onBackHome, consentAiLearning }) => {
         const jobId = startResponse.data.job_id;
         console.log("Analyse lancée, job_id:", jobId);
         
-        // Polling pour suivre la progression
+        // Suivre la progression en temps réel (SSE), sinon revenir au polling
         let completed = false;
         let attempts = 0;
+        const handleFinalStatus = (status) => {
+          if (status.status === "completed") {
+            setProgress(100);
+            setResult({
+              success: true,
+              analysis: status.analysis,
+              filename: status.filename,
+              report_id: status.report_id,
+              message: status.message
+            });
+          } else if (status.analysis) {
+            // Échec: récupérer le rapport partiel
+            setResult({
+              success: true,
+              analysis: status.analysis,
+              filename: status.filename,
+              message: "Analyse partielle récupérée"
+            });
+          } else {
+            setError(`Erreur: ${status.message}`);
+          }
+        };
+        
+        try {
+          const finalStatus = await followAnalysisEvents(jobId, controller.signal, (status) => {
+            setProgress(status.progress || 0);
+            setLiveText(status.live_text || "");
+          });
+          setLiveText("");
+          completed = true;
+          handleFinalStatus(finalStatus);
+        } catch (sseError) {
+          if (sseError.name === "CanceledError") throw sseError;
+          console.log("SSE indisponible, retour au polling:", sseError.message);
+        }
+        
         const maxAttempts = 2400; // 2 heures max de polling (2400 * 3s = 7200s)
         
         while (!completed && attempts < maxAttempts) {
@@ -884,29 +985,9 @@ const AnalysisPage = ({ onBackHome, consentAiLearning }) => {
             const status = statusResponse.data;
             setProgress(status.progress || 0);
             
-            if (status.status === "completed") {
-              completed = true;
-              setProgress(100);
-              setResult({
-                success: true,
-                analysis: status.analysis,
-                filename: status.filename,
-                report_id: status.report_id,
-                message: status.message
-              });
-            } else if (status.status === "failed") {
+            if (status.status === "completed" || status.status === "failed") {
               completed = true;
-              // Essayer de récupérer le rapport partiel
-              if (status.analysis) {
-                setResult({
-                  success: true,
-                  analysis: status.analysis,
-                  filename: status.filename,
-                  message: "Analyse partielle récupérée"
-                });
-              } else {
-                setError(`Erreur: ${status.message}`);
-              }
+              handleFinalStatus(status);
             }
             // Afficher le popup de latence si ça prend du temps
             if (attempts > 20 && !showLatencyPopup && status.status === "in_progress") {
@@ -1248,6 +1329,9 @@ const AnalysisPage = ({ onBackHome, consentAiLearning }) => {
               <div className="progress-bar" style={{ width: `${progress}%` }}></div>
             </div>
             <p className="loading-subtext">Les gros documents sont segmentés. <strong>Cela peut prendre plusieurs minutes.</strong></p>
+            {liveText && (
+              <pre className="live-segment-text" data-testid="live-segment-text">{liveText}</pre>
+            )}
           </div>
         )}
 